@@ -0,0 +1,211 @@
+"""
+Vectorized versions of L2Aggregator and TapeAggregator for historical rebuilds.
+
+Both functions take columnar arrays in event order and return one DataFrame row
+per finalized bucket with the same columns and values as the streaming classes
+(`z_*` columns are NaN where the streaming path omits them). As in the live
+loop, buckets are runs of equal bucket starts (`bucket_ms` wide, one second by
+default) and the last bucket is only emitted with `finalize_last=True`.
+"""
+import numpy as np
+import pandas as pd
+
+from app.core.rolling import NOISE_VAR_RATIO, buckets_per, per_bucket_alpha
+from app.core.time_utils import DEFAULT_BUCKET_MS
+from app.binance.aggregators import l2_aggregator as l2
+from app.binance.aggregators import tape_aggregator as tape
+
+
+def _buckets(event_ms, finalize_last, bucket_ms=DEFAULT_BUCKET_MS):
+    """
+    Runs of equal buckets, like the streaming bucket switch.
+
+    Returns the emitted bucket starts (as time_utils.bucket_ts) plus start/end
+    indices of all runs, so reductions over `starts` never leak the unfinalized
+    tail into a bucket.
+    """
+    idx = np.asarray(event_ms, dtype=np.int64) // bucket_ms
+    if len(idx) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(idx)) + 1))
+    ends = np.concatenate((starts[1:], [len(idx)]))
+    n = len(starts) if finalize_last else len(starts) - 1
+    start_ms = idx[starts[:n]] * bucket_ms
+    ts = start_ms // 1000 if bucket_ms % 1000 == 0 else start_ms / 1000
+    return ts, starts, ends
+
+
+def _ema(x, alpha):
+    return pd.Series(x).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+
+def _pos_ratio(flags, window):
+    return pd.Series(flags, dtype=np.float64).rolling(window, min_periods=1).mean().to_numpy()
+
+
+def _window_sum(x, window):
+    """Exact per-window sums (no running add/subtract drift), NaN until the window is full."""
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        out[window - 1:] = np.lib.stride_tricks.sliding_window_view(x, window).sum(axis=1)
+    return out
+
+
+def _zscore(x, window):
+    """Rolling population z-score matching RollingStats, NaN during warm-up."""
+    s = pd.Series(x)
+    min_periods = max(5, window // 10)
+    roll = s.rolling(window, min_periods=min_periods)
+    mu = roll.mean().to_numpy().copy()
+    var = roll.var(ddof=0).to_numpy().copy()
+    scale = s.abs().rolling(window, min_periods=min_periods).max().to_numpy()
+
+    # near-flat windows are recomputed exactly, same as the streaming noise guard
+    for i in np.flatnonzero(var <= NOISE_VAR_RATIO * scale * scale):
+        w = x[max(0, i - window + 1):i + 1]
+        mu[i] = w.mean()
+        var[i] = ((w - mu[i]) ** 2).mean()
+
+    sigma = np.sqrt(np.maximum(var, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(sigma > 0, (x - mu) / sigma, 0.0)
+    z[np.isnan(mu)] = np.nan
+    return z
+
+
+def _add_zscores(df, windows, bucket_ms):
+    for k, window in windows.items():
+        df[f"z_{k}"] = _zscore(df[k].to_numpy(dtype=np.float64), buckets_per(window, bucket_ms))
+    return df
+
+
+def tape_metrics(event_ms, price, qty, is_buyer_maker, finalize_last=False, bucket_ms=DEFAULT_BUCKET_MS):
+    """
+    Per-bucket TapeAggregator metrics from trade columns.
+
+    event_ms: trade time `T` in milliseconds
+    price, qty: trade price and size
+    is_buyer_maker: Binance `m` flag (True means the aggressor sold)
+    """
+    price = np.asarray(price, dtype=np.float64)
+    qty = np.asarray(qty, dtype=np.float64)
+    is_sell = np.asarray(is_buyer_maker, dtype=bool)
+
+    ts, starts, ends = _buckets(event_ms, finalize_last, bucket_ms)
+    if len(ts) == 0:
+        return pd.DataFrame()
+
+    per_sec = 1000 / bucket_ms
+    n_buckets = len(ts)
+    buy = np.add.reduceat(np.where(is_sell, 0.0, qty), starts)[:n_buckets]
+    sell = np.add.reduceat(np.where(is_sell, qty, 0.0), starts)[:n_buckets]
+    last_price = price[ends[:n_buckets] - 1]
+    total = buy + sell
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        afi = np.where(total > 0, (buy - sell) / total, 0.0)
+
+    cvd = np.cumsum(buy - sell)
+    ew_cvd = _ema(cvd, 2 / (buckets_per(tape.EW_CVD_WINDOW, bucket_ms) + 1))
+    cvd_slope = np.concatenate(([0.0], np.diff(ew_cvd))) * per_sec
+
+    vol_per_sec = total * per_sec
+    fast = _ema(vol_per_sec, 2 / (buckets_per(tape.VOL_FAST_WINDOW, bucket_ms) + 1))
+    slow = _ema(vol_per_sec, 2 / (buckets_per(tape.VOL_SLOW_WINDOW, bucket_ms) + 1))
+    vol_accel = fast - slow
+
+    pos_window = buckets_per(tape.POS_RATIO_WINDOW, bucket_ms)
+    n = buckets_per(tape.EFF_WINDOW, bucket_ms)
+    dp = np.full(n_buckets, np.nan)
+    dp[n - 1:] = last_price[n - 1:] - last_price[:n_buckets - n + 1]
+    buy_sum = _window_sum(buy, n)
+    sell_sum = _window_sum(sell, n)
+    vol_sum = buy_sum + sell_sum
+    full = ~np.isnan(dp)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        price_eff = np.where(full & (vol_sum > 0), dp / vol_sum, 0.0)
+        buy_eff = np.where(full & (buy_sum > 0), np.maximum(dp, 0) / buy_sum, 0.0)
+        sell_eff = np.where(full & (sell_sum > 0), np.maximum(-dp, 0) / sell_sum, 0.0)
+
+    df = pd.DataFrame({
+        "ts": ts,
+        "price": last_price,
+        "buy_vol": buy,
+        "sell_vol": sell,
+        "total_vol": total,
+        "vol_per_sec": vol_per_sec,
+        "vol_accel": vol_accel,
+        "afi": afi,
+        "ew_afi": _ema(afi, per_bucket_alpha(tape.EW_AFI_ALPHA, bucket_ms)),
+        "cvd": cvd,
+        "cvd_slope": cvd_slope,
+        "price_eff": price_eff,
+        "buy_eff": buy_eff,
+        "sell_eff": sell_eff,
+        "afi_pos_ratio": _pos_ratio(afi > 0, pos_window),
+        "cvd_slope_pos_ratio": _pos_ratio(cvd_slope > 0, pos_window),
+    })
+    return _add_zscores(df, tape.Z_WINDOWS, bucket_ms)
+
+
+def l2_metrics(event_ms, bid_px, bid_qty, ask_px, ask_qty, levels_used=10, finalize_last=False,
+               bucket_ms=DEFAULT_BUCKET_MS):
+    """
+    Per-bucket L2Aggregator metrics from top-of-book snapshots.
+
+    event_ms: depth event time `E` in milliseconds, one row per snapshot
+    bid_px, bid_qty, ask_px, ask_qty: (snapshots, levels) arrays ordered from the
+        touch, NaN where a side has fewer levels. Snapshots with an empty side are
+        skipped, as in `update_l2`.
+    """
+    bid_px = np.asarray(bid_px, dtype=np.float64)[:, :levels_used]
+    bid_qty = np.asarray(bid_qty, dtype=np.float64)[:, :levels_used]
+    ask_px = np.asarray(ask_px, dtype=np.float64)[:, :levels_used]
+    ask_qty = np.asarray(ask_qty, dtype=np.float64)[:, :levels_used]
+
+    ts, starts, ends = _buckets(event_ms, finalize_last, bucket_ms)
+    if len(ts) == 0:
+        return pd.DataFrame()
+
+    # last non-empty snapshot of each bucket, if any
+    n_buckets = len(ts)
+    valid = ~np.isnan(bid_px[:, 0]) & ~np.isnan(ask_px[:, 0])
+    last_valid = np.maximum.accumulate(np.where(valid, np.arange(len(valid)), -1))
+    rows = last_valid[ends[:n_buckets] - 1]
+    has_snapshot = rows >= starts[:n_buckets]
+    rows = np.where(has_snapshot, rows, 0)
+
+    bp, bq, ap, aq = bid_px[rows], bid_qty[rows], ask_px[rows], ask_qty[rows]
+    mid = ((bp[:, 0] + ap[:, 0]) / 2)[:, None]
+    floor = mid * 1e-4
+
+    bid = np.where(has_snapshot, np.nansum(bq, axis=1), 0.0)
+    ask = np.where(has_snapshot, np.nansum(aq, axis=1), 0.0)
+    w_bid = np.where(has_snapshot, np.nansum(bq / np.maximum(np.abs(mid - bp), floor), axis=1), 0.0)
+    w_ask = np.where(has_snapshot, np.nansum(aq / np.maximum(np.abs(ap - mid), floor), axis=1), 0.0)
+
+    total = bid + ask
+    w_total = w_bid + w_ask
+    with np.errstate(divide="ignore", invalid="ignore"):
+        obi = np.where(total > 0, (bid - ask) / total, 0.0)
+        weighted_obi = np.where(w_total > 0, (w_bid - w_ask) / w_total, 0.0)
+        bid_delta = np.concatenate(([0.0], np.where(bid[:-1] > 0, (bid[1:] - bid[:-1]) / bid[:-1], 0.0)))
+        ask_delta = np.concatenate(([0.0], np.where(ask[:-1] > 0, (ask[1:] - ask[:-1]) / ask[:-1], 0.0)))
+
+    df = pd.DataFrame({
+        "ts": ts,
+        "bid_liq": bid,
+        "ask_liq": ask,
+        "obi": obi,
+        "ew_obi": _ema(obi, per_bucket_alpha(l2.EW_OBI_ALPHA, bucket_ms)),
+        "bid_liq_delta": bid_delta,
+        "ask_liq_delta": ask_delta,
+        "weighted_obi": weighted_obi,
+        "obi_pos_ratio": _pos_ratio(obi > 0, buckets_per(l2.POS_RATIO_WINDOW, bucket_ms)),
+        "bid_liq_increasing_ratio": _pos_ratio(bid_delta > 0, buckets_per(l2.POS_RATIO_WINDOW, bucket_ms)),
+        "ask_liq_decreasing_ratio": _pos_ratio(ask_delta < 0, buckets_per(l2.POS_RATIO_WINDOW, bucket_ms)),
+    })
+    return _add_zscores(df, l2.Z_WINDOWS, bucket_ms)
@@ -1,15 +1,30 @@
 import time
-import math
-from collections import deque
 from dataclasses import dataclass
 
+from app.core.rolling import RollingStats, RollingRatio, buckets_per, per_bucket_alpha
+from app.core.checkpoint import state_float
+from app.core.time_utils import bucket_ts, DEFAULT_BUCKET_MS
+
+# windows are in seconds and alphas per second, converted to buckets for sub-second widths
+POS_RATIO_WINDOW = 20
+EW_OBI_ALPHA = 0.2
+
+# normalization windows (seconds)
+Z_WINDOWS = {
+    "bid_liq": 300,
+    "ask_liq": 300,
+    "weighted_obi": 300,
+    "bid_liq_delta": 180,
+    "ask_liq_delta": 180,
+}
+
 
 @dataclass
 class L2Bucket:
     """
-    Contains aggregated information about volume price in one second.
+    Contains aggregated information about volume price in one bucket (one second by default).
     """
-    ts: int
+    ts: float
     bid_liq: float = 0.0
     ask_liq: float = 0.0
     weighted_bid_liq: float = 0.0
@@ -43,34 +58,32 @@ class L2Aggregator:
         - OBI Pos Ratio(OBI Positive Ratio): ratio of positive OBI in the last n seconds.
         - Bid Liq Increasing Ratio(Bid Liquidity Increasing Ratio): ratio of increasing bid liquidity in the last n seconds.
         - Ask Liq Decreasing Ratio(Bid Liquidity Decreasing Ratio): ratio of decreasing ask liquidity in the last n seconds.
+
+    bucket_ms: bucket width, ts passed to update_l2 must be bucket starts (time_utils.bucket_ts).
     """
-    def __init__(self, levels_used=10):
+    def __init__(self, levels_used=10, bucket_ms=DEFAULT_BUCKET_MS):
         self.levels_used = levels_used
+        self.bucket_ms = bucket_ms
         self.current_bucket = None
 
         self.prev_bid_liq = None
         self.prev_ask_liq = None
 
-        self.ew_obi = EMA(0.2)
+        self.ew_obi = EMA(per_bucket_alpha(EW_OBI_ALPHA, bucket_ms))
 
-        self.obi_hist = deque(maxlen=20)
-        self.ask_liq_delta_hist = deque(maxlen=20)
-        self.bid_liq_delta_hist = deque(maxlen=20)
+        pos_window = buckets_per(POS_RATIO_WINDOW, bucket_ms)
+        self.obi_hist = RollingRatio(pos_window)
+        self.ask_liq_delta_hist = RollingRatio(pos_window)
+        self.bid_liq_delta_hist = RollingRatio(pos_window)
 
         # normalization windows (seconds)
-        self.z_windows = {
-            "bid_liq": 300,
-            "ask_liq": 300,
-            "weighted_obi": 300,
-            "bid_liq_delta": 180,
-            "ask_liq_delta": 180,
-        }
+        self.z_windows = dict(Z_WINDOWS)
 
-        self.z_hist = {k: deque(maxlen=v) for k, v in self.z_windows.items()}
+        self.z_hist = {k: RollingStats(buckets_per(v, bucket_ms)) for k, v in self.z_windows.items()}
 
     def update_l2(self, bids, asks, ts=None):
-        # get time timestamp in seconds from the l2 snapshot
-        ts = ts if ts is not None else int(time.time())
+        # get time timestamp of the bucket from the l2 snapshot
+        ts = ts if ts is not None else bucket_ts(time.time() * 1000, self.bucket_ms)
         finalized = None
 
         if self.current_bucket is None or ts != self.current_bucket.ts:
@@ -84,22 +97,39 @@ class L2Aggregator:
         if not bids or not asks:
             return finalized
 
+        b = self.current_bucket
+        b.bid_liq, b.ask_liq, b.weighted_bid_liq, b.weighted_ask_liq = self.liquidity(bids, asks)
+
+        return finalized
+
+    def liquidity(self, bids, asks):
+        """(bid_liq, ask_liq, weighted_bid_liq, weighted_ask_liq) of non-empty top levels."""
         # define mid price
         mid = (bids[0][0] + asks[0][0]) / 2
 
-        # aupdate liquidity
-        self.current_bucket.bid_liq = sum(q for _, q in bids[:self.levels_used])
-        self.current_bucket.ask_liq = sum(q for _, q in asks[:self.levels_used])
+        # liquidity
+        bid_liq = sum(q for _, q in bids[:self.levels_used])
+        ask_liq = sum(q for _, q in asks[:self.levels_used])
 
-        # update weighted liquidity
-        self.current_bucket.weighted_bid_liq = sum(
+        # weighted liquidity
+        weighted_bid_liq = sum(
             q / max(abs(mid - p), mid * 1e-4) for p, q in bids[:self.levels_used]
         )
-        self.current_bucket.weighted_ask_liq = sum(
+        weighted_ask_liq = sum(
             q / max(abs(p - mid), mid * 1e-4) for p, q in asks[:self.levels_used]
         )
+        return bid_liq, ask_liq, weighted_bid_liq, weighted_ask_liq
 
-        return finalized
+    def close_bucket(self, ts, liquidity=None):
+        """
+        Finalize the bucket at ts from liquidity set once, instead of per snapshot (conflated modes).
+
+        liquidity: tuple as returned by `liquidity()`, None for an empty book.
+        """
+        b = L2Bucket(ts=ts)
+        if liquidity is not None:
+            b.bid_liq, b.ask_liq, b.weighted_bid_liq, b.weighted_ask_liq = liquidity
+        return self._finalize_bucket(b)
 
     def _finalize_bucket(self, b: L2Bucket):
         bid = b.bid_liq
@@ -109,8 +139,9 @@ class L2Aggregator:
         obi = (bid - ask) / total if total > 0 else 0.0
         ew_obi_val = self.ew_obi.update(obi)
 
-        bid_delta = 0.0 if self.prev_bid_liq is None else (bid - self.prev_bid_liq) / self.prev_bid_liq
-        ask_delta = 0.0 if self.prev_ask_liq is None else (ask - self.prev_ask_liq) / self.prev_ask_liq
+        # no delta after a bucket without liquidity (only empty snapshots)
+        bid_delta = 0.0 if not self.prev_bid_liq else (bid - self.prev_bid_liq) / self.prev_bid_liq
+        ask_delta = 0.0 if not self.prev_ask_liq else (ask - self.prev_ask_liq) / self.prev_ask_liq
 
         self.prev_bid_liq = bid
         self.prev_ask_liq = ask
@@ -133,24 +164,62 @@ class L2Aggregator:
             "bid_liq_delta": bid_delta,
             "ask_liq_delta": ask_delta,
             "weighted_obi": weighted_obi,
-            "obi_pos_ratio": sum(self.obi_hist) / len(self.obi_hist),
-            "bid_liq_increasing_ratio": sum(self.bid_liq_delta_hist) / len(self.bid_liq_delta_hist),
-            "ask_liq_decreasing_ratio": sum(self.ask_liq_delta_hist) / len(self.ask_liq_delta_hist),
+            "obi_pos_ratio": self.obi_hist.ratio(),
+            "bid_liq_increasing_ratio": self.bid_liq_delta_hist.ratio(),
+            "ask_liq_decreasing_ratio": self.ask_liq_delta_hist.ratio(),
         }
 
         self._normalize(metrics)
         return metrics
 
+    def state_dict(self):
+        """
+        JSON-serializable history behind the metrics (EMA, previous liquidity, ratio and
+        z-score windows) for checkpoints. The open bucket is not included, it would be
+        stale by the time the state is restored.
+        """
+        return {
+            "bucket_ms": self.bucket_ms,
+            "prev_bid_liq": self.prev_bid_liq,
+            "prev_ask_liq": self.prev_ask_liq,
+            "ew_obi": self.ew_obi.value,
+            "obi_hist": self.obi_hist.state_dict(),
+            "bid_liq_delta_hist": self.bid_liq_delta_hist.state_dict(),
+            "ask_liq_delta_hist": self.ask_liq_delta_hist.state_dict(),
+            "z_hist": {k: hist.state_dict() for k, hist in self.z_hist.items()},
+        }
+
+    def load_state(self, state):
+        """
+        Restore a state_dict(). All or nothing: every field is parsed into new objects first and
+        assigned once all of them are valid, a missing or malformed field leaves the aggregator as it was.
+        """
+        if state["bucket_ms"] != self.bucket_ms:
+            raise ValueError(f"state has bucket_ms {state['bucket_ms']}, aggregator uses {self.bucket_ms}")
+        scalars = {name: state_float(state[name]) for name in ("prev_bid_liq", "prev_ask_liq", "ew_obi")}
+        ratios = {}
+        for name in ("obi_hist", "bid_liq_delta_hist", "ask_liq_delta_hist"):
+            ratios[name] = RollingRatio(getattr(self, name).window)
+            ratios[name].load_state(state[name])
+        z_hist = dict(self.z_hist)
+        for k, hist in self.z_hist.items():
+            if k in state["z_hist"]:
+                z_hist[k] = RollingStats(hist.window)
+                z_hist[k].load_state(state["z_hist"][k])
+
+        self.prev_bid_liq = scalars["prev_bid_liq"]
+        self.prev_ask_liq = scalars["prev_ask_liq"]
+        self.ew_obi.value = scalars["ew_obi"]
+        for name, hist in ratios.items():
+            setattr(self, name, hist)
+        self.z_hist = z_hist
+
     def _normalize(self, metrics):
-        for k, window in self.z_windows.items():
+        for k in self.z_windows:
             v = metrics.get(k)
             if v is None:
                 continue
             hist = self.z_hist[k]
             hist.append(v)
-            if len(hist) >= max(5, window // 10):
-                mu = sum(hist) / len(hist)
-                sigma = math.sqrt(sum((x - mu) ** 2 for x in hist) / len(hist))
-                metrics[f"z_{k}"] = (v - mu) / sigma if sigma > 0 else 0.0
-            else:
-                pass
+            if len(hist) >= max(5, hist.window // 10):
+                metrics[f"z_{k}"] = hist.zscore(v)
@@ -1,15 +1,40 @@
 import time
-import math
 from collections import deque
 from dataclasses import dataclass
 
+from app.core.rolling import RollingStats, RollingRatio, buckets_per, per_bucket_alpha
+from app.core.checkpoint import state_float
+from app.core.time_utils import bucket_ts, DEFAULT_BUCKET_MS
+
+# windows are in seconds and alphas per second, converted to buckets for sub-second widths
+POS_RATIO_WINDOW = 20
+EFF_WINDOW = 10
+EW_AFI_ALPHA = 0.2
+EW_CVD_WINDOW = 40
+VOL_FAST_WINDOW = 5
+VOL_SLOW_WINDOW = 20
+
+# normalization windows (seconds)
+Z_WINDOWS = {
+    "afi": 180,
+    "cvd_slope": 120,
+    "vol_accel": 120,
+    "vol_per_sec": 120,
+    "total_vol": 120,
+    "buy_vol": 120,
+    "sell_vol": 120,
+    "price_eff": 60,
+    "buy_eff": 60,
+    "sell_eff": 60,
+}
+
 
 @dataclass
 class Bucket:
     """
-    Contains aggregated information about volume price in one second.
+    Contains aggregated information about volume price in one bucket (one second by default).
     """
-    ts: int
+    ts: float
     buy_vol: float = 0.0
     sell_vol: float = 0.0
     last_price: float = 0.0
@@ -44,44 +69,41 @@ class TapeAggregator:
         - Sell Eff(Sell Efficiency): how price moved relative to sell volume in the last n seconds, if it moved down.
         - AFI Pos Ratio(AFI Positive Ratio): ratio of positive AFI in the last n seconds.
         - CVD Slope Pos Ratio(CVD Slope Positive Ratio): ratio of positive AFI in the last n seconds.
+
+    bucket_ms: bucket width, ts passed to update_trade must be bucket starts (time_utils.bucket_ts).
+        vol_per_sec and cvd_slope are rates per second whatever the width.
     """
-    def __init__(self):
+    def __init__(self, bucket_ms=DEFAULT_BUCKET_MS):
+        self.bucket_ms = bucket_ms
+        self.per_sec = 1000 / bucket_ms
         self.current_bucket = None
 
         self.cvd = 0.0
         self.ew_afi = None
-        self.ew_cvd = EMA(40)
+        self.ew_afi_alpha = per_bucket_alpha(EW_AFI_ALPHA, bucket_ms)
+        self.ew_cvd = EMA(buckets_per(EW_CVD_WINDOW, bucket_ms))
         self.prev_ew_cvd = None
 
-        self.vol_fast = EMA(5)
-        self.vol_slow = EMA(20)
+        self.vol_fast = EMA(buckets_per(VOL_FAST_WINDOW, bucket_ms))
+        self.vol_slow = EMA(buckets_per(VOL_SLOW_WINDOW, bucket_ms))
 
-        self.price_hist = deque(maxlen=10)
-        self.buy_hist = deque(maxlen=10)
-        self.sell_hist = deque(maxlen=10)
+        eff_window = buckets_per(EFF_WINDOW, bucket_ms)
+        self.price_hist = deque(maxlen=eff_window)
+        self.buy_hist = deque(maxlen=eff_window)
+        self.sell_hist = deque(maxlen=eff_window)
 
-        self.afi_hist = deque(maxlen=20)
-        self.cvd_slope_hist = deque(maxlen=20)
+        pos_window = buckets_per(POS_RATIO_WINDOW, bucket_ms)
+        self.afi_hist = RollingRatio(pos_window)
+        self.cvd_slope_hist = RollingRatio(pos_window)
 
         # normalization windows (seconds)
-        self.z_windows = {
-            "afi": 180,
-            "cvd_slope": 120,
-            "vol_accel": 120,
-            "vol_per_sec": 120,
-            "total_vol": 120,
-            "buy_vol": 120,
-            "sell_vol": 120,
-            "price_eff": 60,
-            "buy_eff": 60,
-            "sell_eff": 60,
-        }
+        self.z_windows = dict(Z_WINDOWS)
 
-        self.z_hist = {k: deque(maxlen=v) for k, v in self.z_windows.items()}
+        self.z_hist = {k: RollingStats(buckets_per(v, bucket_ms)) for k, v in self.z_windows.items()}
 
     def update_trade(self, price, size, side, ts=None):
-        # get time timestamp in seconds from the trade
-        ts = ts if ts is not None else int(time.time())
+        # get time timestamp of the bucket from the trade
+        ts = ts if ts is not None else bucket_ts(time.time() * 1000, self.bucket_ms)
         finalized = None
 
         if self.current_bucket is None or ts != self.current_bucket.ts:
@@ -102,20 +124,32 @@ class TapeAggregator:
 
         return finalized
 
+    def close_until(self, ts):
+        """
+        Finalize the open bucket if it starts at or before ts, e.g. when the other sources
+        moved past it and no further trade will come to close it. Returns its metrics or None.
+        """
+        b = self.current_bucket
+        if b is None or b.ts > ts:
+            return None
+        self.current_bucket = None
+        return self._finalize_bucket(b)
+
     def _finalize_bucket(self, b: Bucket):
         buy = b.buy_vol
         sell = b.sell_vol
         total = buy + sell
 
         afi = (buy - sell) / total if total > 0 else 0.0
-        self.ew_afi = afi if self.ew_afi is None else 0.2 * afi + 0.8 * self.ew_afi
+        alpha = self.ew_afi_alpha
+        self.ew_afi = afi if self.ew_afi is None else alpha * afi + (1 - alpha) * self.ew_afi
 
         self.cvd += buy - sell
         ew_cvd_val = self.ew_cvd.update(self.cvd)
-        cvd_slope = 0.0 if self.prev_ew_cvd is None else ew_cvd_val - self.prev_ew_cvd
+        cvd_slope = 0.0 if self.prev_ew_cvd is None else (ew_cvd_val - self.prev_ew_cvd) * self.per_sec
         self.prev_ew_cvd = ew_cvd_val
 
-        vol_per_sec = total
+        vol_per_sec = total * self.per_sec
         fast = self.vol_fast.update(vol_per_sec)
         slow = self.vol_slow.update(vol_per_sec)
         vol_accel = fast - slow
@@ -153,23 +187,76 @@ class TapeAggregator:
             "price_eff": price_eff,
             "buy_eff": buy_eff,
             "sell_eff": sell_eff,
-            "afi_pos_ratio": sum(self.afi_hist) / len(self.afi_hist),
-            "cvd_slope_pos_ratio": sum(self.cvd_slope_hist) / len(self.cvd_slope_hist),
+            "afi_pos_ratio": self.afi_hist.ratio(),
+            "cvd_slope_pos_ratio": self.cvd_slope_hist.ratio(),
         }
 
         self._normalize(metrics)
         return metrics
 
+    def state_dict(self):
+        """
+        JSON-serializable history behind the metrics (cvd, EMAs, efficiency, ratio and
+        z-score windows) for checkpoints. The open bucket is not included, it would be
+        stale by the time the state is restored.
+        """
+        return {
+            "bucket_ms": self.bucket_ms,
+            "cvd": self.cvd,
+            "ew_afi": self.ew_afi,
+            "ew_cvd": self.ew_cvd.value,
+            "prev_ew_cvd": self.prev_ew_cvd,
+            "vol_fast": self.vol_fast.value,
+            "vol_slow": self.vol_slow.value,
+            "price_hist": list(self.price_hist),
+            "buy_hist": list(self.buy_hist),
+            "sell_hist": list(self.sell_hist),
+            "afi_hist": self.afi_hist.state_dict(),
+            "cvd_slope_hist": self.cvd_slope_hist.state_dict(),
+            "z_hist": {k: hist.state_dict() for k, hist in self.z_hist.items()},
+        }
+
+    def load_state(self, state):
+        """
+        Restore a state_dict(). All or nothing: every field is parsed into new objects first and
+        assigned once all of them are valid, a missing or malformed field leaves the aggregator as it was.
+        """
+        if state["bucket_ms"] != self.bucket_ms:
+            raise ValueError(f"state has bucket_ms {state['bucket_ms']}, aggregator uses {self.bucket_ms}")
+        cvd = float(state["cvd"])
+        scalars = {
+            name: state_float(state[name]) for name in ("ew_afi", "ew_cvd", "prev_ew_cvd", "vol_fast", "vol_slow")
+        }
+        hists = {
+            name: deque((float(v) for v in state[name]), maxlen=getattr(self, name).maxlen)
+            for name in ("price_hist", "buy_hist", "sell_hist")
+        }
+        ratios = {}
+        for name in ("afi_hist", "cvd_slope_hist"):
+            ratios[name] = RollingRatio(getattr(self, name).window)
+            ratios[name].load_state(state[name])
+        z_hist = dict(self.z_hist)
+        for k, hist in self.z_hist.items():
+            if k in state["z_hist"]:
+                z_hist[k] = RollingStats(hist.window)
+                z_hist[k].load_state(state["z_hist"][k])
+
+        self.cvd = cvd
+        self.ew_afi = scalars["ew_afi"]
+        self.ew_cvd.value = scalars["ew_cvd"]
+        self.prev_ew_cvd = scalars["prev_ew_cvd"]
+        self.vol_fast.value = scalars["vol_fast"]
+        self.vol_slow.value = scalars["vol_slow"]
+        for name, hist in {**hists, **ratios}.items():
+            setattr(self, name, hist)
+        self.z_hist = z_hist
+
     def _normalize(self, metrics):
-        for k, window in self.z_windows.items():
+        for k in self.z_windows:
             v = metrics.get(k)
             if v is None:
                 continue
             hist = self.z_hist[k]
             hist.append(v)
-            if len(hist) >= max(5, window // 10):
-                mu = sum(hist) / len(hist)
-                sigma = math.sqrt(sum((x - mu) ** 2 for x in hist) / len(hist))
-                metrics[f"z_{k}"] = (v - mu) / sigma if sigma > 0 else 0.0
-            else:
-                pass
+            if len(hist) >= max(5, hist.window // 10):
+                metrics[f"z_{k}"] = hist.zscore(v)
@@ -0,0 +1,84 @@
+import time
+import asyncio
+import logging
+import websockets
+
+from app.core.replay import STREAM_BINANCE_COMBINED
+from app.core.decoding import DEFAULT_DECODER
+from app.core.metrics import StreamMetrics
+
+MAX_MESSAGE_SIZE = 2 * 1024 * 1024  # 2 MB
+RECONNECT_DELAY = 5  # seconds
+
+
+def depth_stream(symbol):
+    return f"{symbol}@depth@100ms"
+
+
+def trade_stream(symbol):
+    return f"{symbol}@trade"
+
+
+class CombinedStreamListener:
+    """
+    Single Binance connection for depth and trade streams of many symbols.
+
+    Subscribes through /stream?streams=... and routes each {"stream", "data"} frame to
+    the handle_message of the per-symbol L2Listener / TapeListener.
+
+    base_url: e.g. 'wss://stream.binance.com:9443'
+    l2_listeners / tape_listeners: {symbol: listener}, e.g. {'btcusdt': L2Listener(...)}
+    """
+    def __init__(self, base_url, l2_listeners, tape_listeners, logger=None, capture=None, decoder=DEFAULT_DECODER,
+                 metrics=None):
+        self.routes = {}
+        for symbol, listener in l2_listeners.items():
+            self.routes[depth_stream(symbol)] = listener.handle_message
+        for symbol, listener in tape_listeners.items():
+            self.routes[trade_stream(symbol)] = listener.handle_message
+
+        self.ws = f"{base_url}/stream?streams={'/'.join(self.routes)}"
+        self.logger = logger or logging.getLogger(__name__)
+        self.capture = capture
+        self.decoder = decoder
+        # frame count, envelope decode time and reconnects; per-stream series live in the listeners
+        self.stream_metrics = StreamMetrics(metrics, "binance_combined") if metrics is not None else None
+
+    async def start_listening(self):
+        while True:
+            try:
+                async with websockets.connect(self.ws, max_size=MAX_MESSAGE_SIZE) as ws:
+                    self.logger.info(f"CombinedStreamListener connected ({len(self.routes)} streams)")
+                    async for msg in ws:
+                        if self.capture:
+                            self.capture.record(STREAM_BINANCE_COMBINED, msg)
+                        await self.handle_message(msg)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.stream_metrics is not None:
+                    self.stream_metrics.reconnects.inc()
+                self.logger.warning(
+                    f"CombinedStreamListener disconnected: {e}. Reconnecting in {RECONNECT_DELAY}s..."
+                )
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    async def handle_message(self, msg):
+        """Route one combined-stream frame to the listener of its stream."""
+        try:
+            sm = self.stream_metrics
+            if sm is not None:
+                received_at, started = time.time(), time.perf_counter()
+            stream, data = self.decoder.envelope(msg)
+            if sm is not None:
+                sm.received(received_at, started)
+        except (KeyError, TypeError, ValueError) as e:
+            self.logger.warning(f"CombinedStreamListener malformed message: {e}")
+            return
+
+        handler = self.routes.get(stream)
+        if handler is None:
+            self.logger.warning(f"CombinedStreamListener unexpected stream {stream}")
+            return
+        await handler(data)
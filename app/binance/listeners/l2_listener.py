@@ -1,23 +1,62 @@
-import json
+import time
 import asyncio
 import logging
 import websockets
-from collections import defaultdict
+
+from app.core.replay import STREAM_DEPTH
+from app.core.decoding import DEFAULT_DECODER
+from app.core.time_utils import bucket_ts
+from app.core.order_book import BookSide, DEFAULT_MAX_LEVELS
+from app.core.metrics import StreamMetrics
 
 MAX_MESSAGE_SIZE = 2 * 1024 * 1024  # 2 MB
 RECONNECT_DELAY = 5  # seconds
 
+# how the book is turned into per-bucket liquidity
+L2_MODE_SNAPSHOT = "snapshot"  # top levels after every diff, the last one in a bucket wins
+L2_MODE_CONFLATED = "conflated"  # diffs only, top levels once per bucket (same output as snapshot)
+L2_MODE_TWAL = "twal"  # time-weighted average of the top-level liquidity over the bucket
+L2_MODES = (L2_MODE_SNAPSHOT, L2_MODE_CONFLATED, L2_MODE_TWAL)
+
 
 class L2Listener:
-    def __init__(self, ws, levels_used, writer, aggregator, data_manager, logger=None):
+    """
+    Keeps the Binance book from depth diffs and feeds its top levels to the aggregator.
+
+    mode:
+        - snapshot: top levels are extracted and summed after every diff.
+        - conflated: diffs are only applied to the book; top levels are extracted once, when
+          the first diff of the next bucket arrives, from the book as the bucket left it.
+        - twal: liquidity is integrated over event time and averaged per bucket. Top levels
+          are only re-read when a diff touches them.
+
+    writer: per-stream output of the bucket metrics, None skips it (the DataManager still gets them).
+    """
+    def __init__(self, ws, levels_used, writer, aggregator, data_manager, logger=None,
+                 max_book_levels=DEFAULT_MAX_LEVELS, capture=None, decoder=DEFAULT_DECODER,
+                 mode=L2_MODE_SNAPSHOT, metrics=None):
+        if mode not in L2_MODES:
+            raise ValueError(f"Unknown L2 mode: {mode}")
         self.writer = writer
         self.ws = ws
         self.aggregator = aggregator
         self.levels_used = levels_used
         self.data_manager = data_manager
-        self.bids = defaultdict(float)
-        self.asks = defaultdict(float)
+        self.bids = BookSide(descending=True, max_levels=max_book_levels)
+        self.asks = BookSide(descending=False, max_levels=max_book_levels)
         self.logger = logger or logging.getLogger(__name__)
+        self.capture = capture
+        self.decoder = decoder
+        self.mode = mode
+        self.stream_metrics = StreamMetrics(metrics, "binance_depth") if metrics is not None else None
+
+        # conflated / twal: bucket being filled
+        self._bucket_ts = None
+        # twal: current liquidity, event time it was taken at, and its integral over the bucket
+        self._liq = None
+        self._liq_ms = None
+        self._liq_sum = [0.0, 0.0, 0.0, 0.0]
+        self._liq_span = 0.0
 
     async def start_listening(self):
         while True:
@@ -25,42 +64,113 @@ class L2Listener:
                 async with websockets.connect(self.ws, max_size=MAX_MESSAGE_SIZE) as ws:
                     self.logger.info("L2Listener connected")
                     async for msg in ws:
-                        try:
-                            data = json.loads(msg)
-                            ts = int(data["E"] / 1000)
-
-                            for p, q in data["b"]:
-                                p, q = float(p), float(q)
-                                if q == 0:
-                                    self.bids.pop(p, None)
-                                else:
-                                    self.bids[p] = q
-
-                            for p, q in data["a"]:
-                                p, q = float(p), float(q)
-                                if q == 0:
-                                    self.asks.pop(p, None)
-                                else:
-                                    self.asks[p] = q
-
-                            top_bids = get_top_levels(self.bids, reverse=True, n=self.levels_used)
-                            top_asks = get_top_levels(self.asks, reverse=False, n=self.levels_used)
-
-                            metrics = self.aggregator.update_l2(top_bids, top_asks, ts)
-                            if metrics:
-                                await self.data_manager.get_l2_data(metrics)
-                                await self.writer.write(metrics)
-
-                        except (KeyError, TypeError, ValueError) as e:
-                            self.logger.warning(f"L2Listener malformed message: {e}")
+                        if self.capture:
+                            self.capture.record(STREAM_DEPTH, msg)
+                        await self.handle_message(msg)
 
             except asyncio.CancelledError:
                 raise
             except Exception as e:
+                if self.stream_metrics is not None:
+                    self.stream_metrics.reconnects.inc()
                 self.logger.warning(f"L2Listener disconnected: {e}. Reconnecting in {RECONNECT_DELAY}s...")
                 await asyncio.sleep(RECONNECT_DELAY)
 
+    async def handle_message(self, msg):
+        """Apply one raw depth diff to the book and feed the top levels to the aggregator."""
+        try:
+            sm = self.stream_metrics
+            if sm is not None:
+                received_at, started = time.time(), time.perf_counter()
+            data = self.decoder.depth(msg)
+            if sm is not None:
+                sm.received(received_at, started, data.E)
+            # bucket width is configured on the aggregator
+            ts = bucket_ts(data.E, self.aggregator.bucket_ms)
+
+            if self.mode == L2_MODE_SNAPSHOT:
+                self._apply(data)
+
+                top_bids = self.bids.top(self.levels_used)
+                top_asks = self.asks.top(self.levels_used)
+
+                await self._emit(self.aggregator.update_l2(top_bids, top_asks, ts))
+                return
+
+            if self._bucket_ts is not None and ts != self._bucket_ts:
+                await self._emit(self._close_bucket())
+            self._bucket_ts = ts
+
+            if self.mode == L2_MODE_CONFLATED:
+                self._apply(data)
+                return
+
+            self._integrate(data.E, ts)
+            if self._apply(data, track_top=True) or self._liq is None:
+                self._liq = self._top_liquidity()
+
+        except (KeyError, TypeError, ValueError) as e:
+            self.logger.warning(f"L2Listener malformed message: {e}")
+
+    def _apply(self, data, track_top=False):
+        """Apply the diff, with track_top report whether any of it touched the top levels."""
+        bids, asks, n = self.bids, self.asks, self.levels_used
+        touched = False
+
+        for p, q in data.b:
+            if track_top and not touched:
+                touched = bids.in_top(p, n)
+            bids.update(p, q)
+
+        for p, q in data.a:
+            if track_top and not touched:
+                touched = asks.in_top(p, n)
+            asks.update(p, q)
+
+        return touched
+
+    def _top_liquidity(self):
+        if not self.bids or not self.asks:
+            return None
+        return self.aggregator.liquidity(self.bids.top(self.levels_used), self.asks.top(self.levels_used))
+
+    def _integrate(self, event_ms, ts):
+        """Add the liquidity held since the last diff, up to event_ms, to the bucket's integral."""
+        if self._liq_ms is None or self._liq_ms < ts * 1000:
+            # first diff of the bucket, the previous state held from the bucket start
+            self._liq_ms = ts * 1000
+        span = event_ms - self._liq_ms
+        if span > 0 and self._liq is not None:
+            for i, v in enumerate(self._liq):
+                self._liq_sum[i] += v * span
+            self._liq_span += span
+        self._liq_ms = max(self._liq_ms, event_ms)
+
+    def _close_bucket(self):
+        ts = self._bucket_ts
+        if self.mode == L2_MODE_CONFLATED:
+            return self.aggregator.close_bucket(ts, self._top_liquidity())
+
+        # the last state held until the end of the bucket
+        self._integrate(ts * 1000 + self.aggregator.bucket_ms, ts)
+        if self._liq_span > 0:
+            liquidity = tuple(v / self._liq_span for v in self._liq_sum)
+        else:
+            liquidity = self._liq
+        self._liq_sum = [0.0, 0.0, 0.0, 0.0]
+        self._liq_span = 0.0
+        return self.aggregator.close_bucket(ts, liquidity)
+
+    async def _emit(self, metrics):
+        if metrics:
+            if self.stream_metrics is not None:
+                self.stream_metrics.finalized(metrics["ts"])
+            await self.data_manager.get_l2_data(metrics)
+            if self.writer is not None:
+                await self.writer.write(metrics)
+
 
 def get_top_levels(book, reverse=False, n=10):
+        """Full-sort top N extraction from a {price: qty} dict, kept for benchmarks and ad-hoc use."""
         levels = sorted(book.items(), key=lambda x: x[0], reverse=reverse)
         return [(p, q) for p, q in levels[:n] if q > 0]
\ No newline at end of file
@@ -1,19 +1,28 @@
-import json
+import time
 import asyncio
 import logging
 import websockets
 
+from app.core.replay import STREAM_TRADE
+from app.core.decoding import DEFAULT_DECODER
+from app.core.time_utils import bucket_ts
+from app.core.metrics import StreamMetrics
+
 MAX_MESSAGE_SIZE = 2 * 1024 * 1024  # 2 MB
 RECONNECT_DELAY = 5  # seconds
 
 
 class TapeListener:
-    def __init__(self, ws, writer, aggregator, data_manager, logger=None):
+    def __init__(self, ws, writer, aggregator, data_manager, logger=None, capture=None, decoder=DEFAULT_DECODER,
+                 metrics=None):
         self.ws = ws
         self.writer = writer
         self.aggregator = aggregator
         self.data_manager = data_manager
         self.logger = logger or logging.getLogger(__name__)
+        self.capture = capture
+        self.decoder = decoder
+        self.stream_metrics = StreamMetrics(metrics, "binance_trade") if metrics is not None else None
 
     async def start_listening(self):
         while True:
@@ -21,24 +30,50 @@ class TapeListener:
                 async with websockets.connect(self.ws, max_size=MAX_MESSAGE_SIZE) as ws:
                     self.logger.info("TapeListener connected")
                     async for msg in ws:
-                        try:
-                            data = json.loads(msg)
-
-                            price = float(data["p"])
-                            size = float(data["q"])
-                            side = "sell" if data["m"] else "buy"
-                            ts = int(data["T"] / 1000)
-
-                            metrics = self.aggregator.update_trade(price, size, side, ts)
-                            if metrics:
-                                await self.data_manager.get_tape_data(metrics)
-                                await self.writer.write(metrics)
-
-                        except (KeyError, TypeError, ValueError) as e:
-                            self.logger.warning(f"TapeListener malformed message: {e}")
+                        if self.capture:
+                            self.capture.record(STREAM_TRADE, msg)
+                        await self.handle_message(msg)
 
             except asyncio.CancelledError:
                 raise
             except Exception as e:
+                if self.stream_metrics is not None:
+                    self.stream_metrics.reconnects.inc()
                 self.logger.warning(f"TapeListener disconnected: {e}. Reconnecting in {RECONNECT_DELAY}s...")
                 await asyncio.sleep(RECONNECT_DELAY)
+
+    async def handle_message(self, msg):
+        """Feed one raw trade message to the aggregator."""
+        try:
+            sm = self.stream_metrics
+            if sm is not None:
+                received_at, started = time.time(), time.perf_counter()
+            data = self.decoder.trade(msg)
+            if sm is not None:
+                sm.received(received_at, started, data.T)
+
+            price = data.p
+            size = data.q
+            side = "sell" if data.m else "buy"
+            # bucket width is configured on the aggregator
+            ts = bucket_ts(data.T, self.aggregator.bucket_ms)
+
+            metrics = self.aggregator.update_trade(price, size, side, ts)
+            if metrics:
+                await self._deliver(metrics)
+
+        except (KeyError, TypeError, ValueError) as e:
+            self.logger.warning(f"TapeListener malformed message: {e}")
+
+    async def close_until(self, ts):
+        """Deliver the open bucket if it starts at or before ts, see DataManager.add_closer."""
+        metrics = self.aggregator.close_until(ts)
+        if metrics:
+            await self._deliver(metrics)
+
+    async def _deliver(self, metrics):
+        if self.stream_metrics is not None:
+            self.stream_metrics.finalized(metrics["ts"])
+        await self.data_manager.get_tape_data(metrics)
+        if self.writer is not None:
+            await self.writer.write(metrics)
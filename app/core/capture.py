@@ -0,0 +1,145 @@
+"""
+Lossless capture of raw websocket frames.
+
+Segments are append-only files made of a magic header followed by records:
+
+    u32 payload length | i64 receive time (ns) | u8 stream id | payload
+
+Frames are written as received, so capture costs one encode and one buffered
+write per message instead of a parse + json.dumps round trip.
+"""
+import os
+import mmap
+import time
+import struct
+import asyncio
+import logging
+from datetime import datetime
+
+from app.core.replay import (
+    STREAM_DEPTH, STREAM_TRADE, STREAM_POLYMARKET, STREAM_POLYMARKET_IDS, STREAM_BINANCE_COMBINED
+)
+
+MAGIC = b"PMCAP01\n"
+RECORD_HEADER = struct.Struct("<IqB")
+
+STREAM_IDS = {
+    STREAM_DEPTH: 1,
+    STREAM_TRADE: 2,
+    STREAM_POLYMARKET: 3,
+    STREAM_POLYMARKET_IDS: 4,
+    STREAM_BINANCE_COMBINED: 5,
+}
+STREAM_NAMES = {v: k for k, v in STREAM_IDS.items()}
+
+SEGMENT_BYTES = 256 * 1024 * 1024  # 256 MB
+WRITE_BUFFER = 1024 * 1024  # 1 MB
+FLUSH_INTERVAL = 1.0  # seconds
+
+
+class RawCapture:
+    def __init__(self, base_dir: str, segment_bytes: int = SEGMENT_BYTES, logger: logging.Logger = None,
+                 clock_ns=time.time_ns):
+        """
+        base_dir: folder for segments, e.g. 'data/raw'
+        segment_bytes: a new segment is started once the current one exceeds this size
+        """
+        self.base_dir = base_dir
+        self.segment_bytes = segment_bytes
+        self.logger = logger or logging.getLogger(__name__)
+        self.clock_ns = clock_ns
+
+        self._file = None
+        self._size = 0
+        self._segment_no = 0
+        # every feed records from the event loop, no locking needed
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flusher())
+
+    def record(self, stream: str, frame):
+        """Append one frame (str or bytes) with its receive time."""
+        recv_ns = self.clock_ns()
+        payload = frame.encode("utf-8") if isinstance(frame, str) else frame
+        data = RECORD_HEADER.pack(len(payload), recv_ns, STREAM_IDS[stream]) + payload
+
+        if self._file is None or self._size >= self.segment_bytes:
+            self._open_segment()
+        self._file.write(data)
+        self._size += len(data)
+
+    def _open_segment(self):
+        if self._file:
+            self._file.close()
+
+        os.makedirs(self.base_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._segment_no += 1
+        path = os.path.join(self.base_dir, f"raw_{stamp}_{self._segment_no:04d}.cap")
+
+        self._file = open(path, "ab", buffering=WRITE_BUFFER)
+        self._file.write(MAGIC)
+        self._size = len(MAGIC)
+        self.logger.info(f"[RawCapture] Switched to {path}")
+
+    def flush(self):
+        if self._file:
+            self._file.flush()
+
+    async def close(self):
+        """Stop the periodic flush and close the current segment."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    async def _flusher(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+
+def read_capture(path):
+    """
+    Yield (recv_ns, stream, payload) from a capture segment.
+
+    The file is mmap'ed and payloads are memoryview slices into it, so nothing
+    is copied until a consumer decodes them. A record truncated by a crash ends
+    the iteration.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size <= len(MAGIC):
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        if mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a capture segment")
+
+        view = memoryview(mm)
+        offset = len(MAGIC)
+        end = len(mm)
+        header_size = RECORD_HEADER.size
+
+        while offset + header_size <= end:
+            length, recv_ns, stream_id = RECORD_HEADER.unpack_from(mm, offset)
+            start = offset + header_size
+            if start + length > end:
+                break
+            yield recv_ns, STREAM_NAMES.get(stream_id, stream_id), view[start:start + length]
+            offset = start + length
+    finally:
+        try:
+            view.release()
+            mm.close()
+        except (BufferError, NameError):
+            # payload views still held by the consumer, the map is freed with them
+            pass
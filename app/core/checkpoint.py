@@ -0,0 +1,123 @@
+"""
+Periodic snapshots of aggregator state, so a restarted collector resumes warm.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_INTERVAL = 30  # seconds
+# older snapshots are ignored on startup, the histories would no longer join up with the live feed
+MAX_CHECKPOINT_AGE = 120  # seconds
+
+
+def save_checkpoint(path: str, components: dict, saved_at: float):
+    """Atomically replace path with {version, saved_at, components}, a crash never leaves a torn file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": CHECKPOINT_VERSION, "saved_at": saved_at, "components": components}, f,
+                  separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str):
+    """Parsed checkpoint, None if there is none. Raises ValueError on a corrupt or foreign file."""
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    if not isinstance(checkpoint, dict) or checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"unsupported checkpoint version in {path}")
+    if "saved_at" not in checkpoint or "components" not in checkpoint:
+        raise ValueError(f"incomplete checkpoint in {path}")
+    return checkpoint
+
+
+def state_float(v):
+    """A number from a checkpoint as float, None stays None; raises TypeError / ValueError otherwise."""
+    return None if v is None else float(v)
+
+
+class Checkpointer:
+    """
+    Snapshots the state of named components (anything with state_dict() / load_state(state),
+    e.g. the aggregators) every `interval` seconds and restores it on startup.
+
+    The state is collected on the event loop, so every component is captured between two
+    messages; serialization and the write run in a worker thread. A checkpoint older than
+    `max_age`, unreadable, or rejected by a component means a cold start for that part:
+    load_state(state) raises KeyError / TypeError / ValueError on a state it cannot use and
+    must leave the component untouched in that case (the aggregators parse everything
+    before assigning anything).
+    """
+    def __init__(self, path: str, components: dict, interval=CHECKPOINT_INTERVAL, max_age=MAX_CHECKPOINT_AGE,
+                 logger: logging.Logger = None, clock=time.time):
+        self.path = path
+        self.components = components
+        self.interval = interval
+        self.max_age = max_age
+        self.logger = logger or logging.getLogger(__name__)
+        self.clock = clock
+        self.stats = {"saved": 0, "failed": 0, "last_save_s": None}
+
+    def restore(self):
+        """Load fresh state into the components, return the names that were restored."""
+        try:
+            checkpoint = load_checkpoint(self.path)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"[Checkpointer] Ignoring {self.path}: {e}")
+            return []
+        if checkpoint is None:
+            self.logger.info(f"[Checkpointer] No checkpoint at {self.path}, starting cold")
+            return []
+
+        age = self.clock() - checkpoint["saved_at"]
+        if age > self.max_age:
+            self.logger.info(f"[Checkpointer] Checkpoint is {age:.0f}s old (max {self.max_age}s), starting cold")
+            return []
+
+        restored = []
+        states = checkpoint["components"]
+        for name, component in self.components.items():
+            if name not in states:
+                continue
+            try:
+                component.load_state(states[name])
+                restored.append(name)
+            except (KeyError, TypeError, ValueError) as e:
+                self.logger.warning(f"[Checkpointer] Could not restore {name}: {e}")
+        self.logger.info(f"[Checkpointer] Restored {len(restored)}/{len(self.components)} components "
+                         f"from a {age:.1f}s old checkpoint")
+        return restored
+
+    def _states(self):
+        return {name: component.state_dict() for name, component in self.components.items()}
+
+    async def save(self):
+        states = self._states()
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(save_checkpoint, self.path, states, self.clock())
+        except (OSError, TypeError, ValueError) as e:
+            self.stats["failed"] += 1
+            self.logger.error(f"[Checkpointer] Failed to write {self.path}: {e}")
+            return
+        self.stats["saved"] += 1
+        self.stats["last_save_s"] = time.perf_counter() - start
+
+    async def run(self):
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                await self.save()
+        finally:
+            # last snapshot on shutdown (cancellation), written inline since the loop is stopping
+            try:
+                save_checkpoint(self.path, self._states(), self.clock())
+            except (OSError, TypeError, ValueError) as e:
+                self.logger.error(f"[Checkpointer] Failed to write {self.path} on shutdown: {e}")
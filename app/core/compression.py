@@ -0,0 +1,106 @@
+import os
+import io
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import zstandard
+
+ZSTD_EXT = ".zst"
+ZSTD_LEVEL = 3
+
+
+def compress_file(path: str, level: int = ZSTD_LEVEL, remove_original: bool = True):
+    """
+    Stream-compress path into path.zst and return (out_path, in_bytes, out_bytes, seconds).
+
+    If path.zst already exists (e.g. a live-compressed file or an earlier run in the
+    same candle) the new data is appended as another zstd frame, which every zstd
+    reader decodes as one continuous stream.
+    """
+    start = time.perf_counter()
+    out_path = path + ZSTD_EXT
+    tmp_path = out_path + ".tmp"
+
+    in_bytes = os.path.getsize(path)
+    with open(path, "rb") as fin, open(tmp_path, "wb") as fout:
+        zstandard.ZstdCompressor(level=level).copy_stream(fin, fout)
+
+    if os.path.exists(out_path):
+        with open(out_path, "ab") as fout, open(tmp_path, "rb") as fin:
+            while chunk := fin.read(1024 * 1024):
+                fout.write(chunk)
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, out_path)
+
+    if remove_original:
+        os.remove(path)
+
+    return out_path, in_bytes, os.path.getsize(out_path), time.perf_counter() - start
+
+
+class FileCompressor:
+    """
+    Compresses closed data files with zstd in a worker pool, off the event loop.
+
+    Threads are enough for the default level since zstandard releases the GIL while
+    compressing; use_processes=True moves the work into separate processes.
+    """
+    def __init__(self, level: int = ZSTD_LEVEL, workers: int = 1, use_processes: bool = False,
+                 remove_original: bool = True, logger: logging.Logger = None):
+        self.level = level
+        self.remove_original = remove_original
+        self.logger = logger or logging.getLogger(__name__)
+
+        pool = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self._executor = pool(max_workers=workers)
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    @property
+    def queue_length(self):
+        return len(self._pending)
+
+    def submit(self, path: str):
+        future = self._executor.submit(compress_file, path, self.level, self.remove_original)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+        try:
+            out_path, in_bytes, out_bytes, seconds = future.result()
+        except Exception as e:
+            self.logger.error(f"[FileCompressor] compression failed: {e}")
+            return
+        ratio = in_bytes / out_bytes if out_bytes else 0.0
+        self.logger.info(
+            f"[FileCompressor] {out_path}: {in_bytes} -> {out_bytes} bytes "
+            f"(ratio {ratio:.1f}x) in {seconds:.2f}s, queue {self.queue_length}"
+        )
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+def open_data_file(path: str, mode: str = "rt"):
+    """Open a data file for reading, transparently decompressing .zst files."""
+    if path.endswith(ZSTD_EXT):
+        return zstandard.open(path, mode, encoding="utf-8" if "t" in mode else None)
+    if "t" in mode:
+        return io.open(path, mode, encoding="utf-8")
+    return io.open(path, mode)
+
+
+def iter_jsonl(path: str):
+    """Yield records from a plain or zstd-compressed JSONL file."""
+    with open_data_file(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
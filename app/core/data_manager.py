@@ -1,35 +1,208 @@
+import time
+import heapq
+from collections import deque
+
 from app.core.writer import JSONLWriter
+from app.core.metrics import AGE_BUCKETS, KIND_COUNTER
+from app.core.rolling import buckets_per
+from app.core.time_utils import curr_timestamp_15min, DEFAULT_BUCKET_MS
 
 VALID_OUTCOMES = {"up", "down"}
 
+SOURCE_L2 = "l2"
+SOURCE_TAPE = "tape"
+SOURCES = (SOURCE_L2, SOURCE_TAPE)
+
+# a second is written once every source has moved past it, or once the most advanced
+# source is this many seconds ahead (a source that went quiet does not hold the others back)
+ALLOWED_LATENESS = 2
+# hard cap on open seconds (and on pending Polymarket updates), oldest are forced out first
+MAX_BUFFERED = 60  # seconds
+
 
 class DataManager:
-    def __init__(self, writer: JSONLWriter):
+    """
+    Event-time join of the L2 and tape buckets with Polymarket quotes.
+
+    Records are keyed by bucket start (seconds, a float for sub-second `bucket_ms`);
+    "second" below means bucket. Lateness and the buffer cap are configured in seconds.
+
+    Every source has a watermark, the latest second it delivered. A second is complete
+    when all watermarks passed it, or when the fastest source is `allowed_lateness`
+    seconds ahead; complete seconds are written in order. Contributions for seconds that
+    were already written are counted as dropped, never emitted as partial records.
+
+    Polymarket values are joined as-of: each written second carries the latest quote
+    and book features with ts <= that second, forward-filled until they change. They are
+    scoped to the 15m candle: the first second of a candle starts without them, so a
+    missing or late next market leaves the fields out instead of repeating the last
+    market's quotes.
+
+    A source that only finalizes a bucket on its next event (the tape: a trade closes the
+    previous second) registers a closer with `add_closer`; before seconds are written the
+    closers deliver their open buckets up to them, so a quiet period does not drop the
+    last bucket before it.
+
+    Written records also go to every sink in `sinks` (objects with an async write(record),
+    e.g. RollupStage), after the writer. Sinks that hold state across records also have an
+    async flush(), called by flush().
+
+    With a `metrics` registry the stats and the age of each record when it is joined
+    (wall time minus bucket start) are exported, labelled file=<writer name>.
+
+    stats:
+        - records: seconds written.
+        - late: contributions that arrived after another source passed their second but still made it in.
+        - dropped: contributions for seconds already written.
+        - forced: seconds written early because `max_buffered` was reached.
+    """
+    def __init__(self, writer: JSONLWriter, sources=SOURCES, allowed_lateness=ALLOWED_LATENESS,
+                 max_buffered=MAX_BUFFERED, bucket_ms=DEFAULT_BUCKET_MS, sinks=(), metrics=None):
         self.data = {}
         self.writer = writer
-        self.last_ts = None
+        self.sinks = list(sinks)
+        self.bucket_ms = bucket_ms
+        self.allowed_lateness = allowed_lateness
+        self.max_buffered = buckets_per(max_buffered, bucket_ms)
+
+        self.watermarks = {source: None for source in sources}
+        self.last_ts = None  # last second written
+
+        self._open = []  # heap of the seconds in self.data
+        self._closers = []  # async close_until(ts) of sources holding a bucket open, see add_closer
+        self._closing = False
+        self._pm_pending = deque()  # [ts, fields] not yet reached by the written seconds, ts ascending
+        self.pm_state = {}  # as-of Polymarket values, forward-filled into every record
+        self._pm_candle = None  # candle pm_state belongs to
 
-    async def _check_and_flush(self, current_ts):
+        self.stats = {"records": 0, "late": 0, "dropped": 0, "forced": 0}
+
+        self.joined_age = None
+        if metrics is not None:
+            name = writer.name
+            for key in self.stats:
+                metrics.callback(f"collector_join_{key}_total", f"DataManager.stats[{key!r}]",
+                                 lambda key=key: self.stats[key], kind=KIND_COUNTER, file=name)
+            metrics.callback("collector_join_open_buckets", "Buckets waiting for the other sources",
+                             lambda: len(self._open), file=name)
+            self.joined_age = metrics.histogram(
+                "collector_record_age_seconds", "Wall time minus bucket start when a record passes a stage",
+                AGE_BUCKETS, stage="joined", file=name
+            )
+
+    def add_closer(self, close_until):
         """
-        If we see a new timestamp, we assume the previous timestamp's
-        data is as complete as it's going to get.
+        Register `async close_until(ts)`, which delivers the source's open bucket through
+        get_*_data if it starts at or before ts, e.g. TapeListener.close_until.
         """
-        if self.last_ts is not None and self.last_ts < current_ts:
-            # Pop the completed record
-            completed_record = self.data.pop(self.last_ts)
-            # Add the timestamp back into the record for the file
-            completed_record["timestamp"] = self.last_ts
+        self._closers.append(close_until)
 
-            # Send to the async writer queue
-            await self.writer.write(completed_record)
+    async def _close_sources(self, ts):
+        # closers deliver through _add, which advances again; only the outermost call closes
+        if self._closing:
+            return
+        self._closing = True
+        try:
+            for close_until in self._closers:
+                await close_until(ts)
+        finally:
+            self._closing = False
 
-        self.last_ts = current_ts
+    def _complete_until(self):
+        seen = [m for m in self.watermarks.values() if m is not None]
+        if not seen:
+            return None
+        behind = max(seen) - self.allowed_lateness
+        if len(seen) < len(self.watermarks):
+            # a source that never reported does not hold the others back beyond the lateness
+            return behind
+        return max(min(seen), behind)
 
-    def get_pm_data(self, msg):
-        ts = msg["ts"]
+    async def _emit(self, ts):
+        record = self.data.pop(ts)
+
+        # as-of join: apply Polymarket updates up to and including this second
+        pending = self._pm_pending
+        candle = curr_timestamp_15min(ts)
+        if candle != self._pm_candle:
+            # the previous candle's market says nothing about this one
+            while pending and pending[0][0] < candle:
+                pending.popleft()
+            self.pm_state.clear()
+            self._pm_candle = candle
+        while pending and pending[0][0] <= ts:
+            self.pm_state.update(pending.popleft()[1])
+        record.update(self.pm_state)
+
+        # the sources' "ts" becomes the record's "timestamp"
+        record.pop("ts", None)
+        record["timestamp"] = ts
+        self.last_ts = ts
+        self.stats["records"] += 1
+        if self.joined_age is not None:
+            self.joined_age.observe(time.time() - ts)
+
+        # Send to the async writer queue
+        await self.writer.write(record)
+        for sink in self.sinks:
+            await sink.write(record)
+
+    async def _advance(self):
+        complete = self._complete_until()
+        heap = self._open
+        if heap and complete is not None and heap[0] <= complete:
+            await self._close_sources(complete)
+        while heap and complete is not None and heap[0] <= complete:
+            await self._emit(heapq.heappop(heap))
+        while len(heap) > self.max_buffered:
+            await self._close_sources(heap[0])
+            if len(heap) <= self.max_buffered:
+                break
+            self.stats["forced"] += 1
+            await self._emit(heapq.heappop(heap))
+
+    async def _add(self, source, ts, metrics):
+        if self.last_ts is not None and ts <= self.last_ts:
+            self.stats["dropped"] += 1
+            return
+
+        mark = self.watermarks[source]
+        if mark is None or ts > mark:
+            self.watermarks[source] = ts
+        if any(m is not None and m > ts for m in self.watermarks.values()):
+            self.stats["late"] += 1
 
         if ts not in self.data:
             self.data[ts] = {}
+            heapq.heappush(self._open, ts)
+        self.data[ts].update(metrics)
+
+        await self._advance()
+
+    def _add_pm(self, ts, fields):
+        if self.last_ts is not None and ts <= self.last_ts:
+            # the second is written already, the value still holds from here on (within its candle)
+            if self._pm_candle is not None and ts >= self._pm_candle:
+                self.pm_state.update(fields)
+            return
+
+        pending = self._pm_pending
+        if pending and pending[-1][0] == ts:
+            pending[-1][1].update(fields)
+        elif pending and pending[-1][0] > ts:
+            # out of order, fold into the first pending second that is not earlier
+            for entry in pending:
+                if entry[0] >= ts:
+                    entry[1].update(fields)
+                    break
+        else:
+            pending.append([ts, dict(fields)])
+
+        while len(pending) > self.max_buffered:
+            self.pm_state.update(pending.popleft()[1])
+
+    def get_pm_data(self, msg):
+        ts = msg["ts"]
 
         data = msg["data"]
         outcome = data.get("outcome")
@@ -37,23 +210,39 @@ class DataManager:
         best_ask = data.get("best_ask")
 
         if outcome in VALID_OUTCOMES and best_bid and best_ask:
-            self.data[ts].update({
+            self._add_pm(ts, {
                 f"{outcome}_best_bid": best_bid,
                 f"{outcome}_best_ask": best_ask
             })
 
-    async def get_l2_data(self, metrics):
-        ts = metrics.pop("ts")
-        await self._check_and_flush(ts)
+    def get_pm_book_data(self, msg):
+        ts = msg["ts"]
 
-        if ts not in self.data:
-            self.data[ts] = {}
-        self.data[ts].update(metrics)
+        data = msg["data"]
+        outcome = data.get("outcome")
+        if outcome not in VALID_OUTCOMES:
+            return
+
+        self._add_pm(ts, {f"{outcome}_{k}": v for k, v in data.items() if k != "outcome"})
+
+    # metrics are copied into the record, not modified: the listeners write the same dict, "ts"
+    # included, to their per-stream output afterwards
+    async def get_l2_data(self, metrics):
+        await self._add(SOURCE_L2, metrics["ts"], metrics)
 
     async def get_tape_data(self, metrics):
-        ts = metrics.pop("ts")
-        await self._check_and_flush(ts)
+        await self._add(SOURCE_TAPE, metrics["ts"], metrics)
 
-        if ts not in self.data:
-            self.data[ts] = {}
-        self.data[ts].update(metrics)
+    async def flush(self):
+        """
+        Write every open second, e.g. at the end of a replay, open source buckets included,
+        then flush the sinks that keep state (RollupStage writes its open bars).
+        """
+        if self._open:
+            await self._close_sources(max(self._open))
+        while self._open:
+            await self._emit(heapq.heappop(self._open))
+        for sink in self.sinks:
+            flush = getattr(sink, "flush", None)
+            if flush is not None:
+                await flush()
@@ -0,0 +1,227 @@
+"""
+Typed decoding of the hot-path websocket payloads.
+
+Binance `depthUpdate` / `trade` and Polymarket market-channel frames (`best_bid_ask`,
+`book`, `price_change`) are decoded
+straight into small typed structs with prices and sizes already converted to
+float. The fastest available backend is used: msgspec (schema-driven, decodes
+into the structs without an intermediate dict), orjson, then the stdlib json.
+
+All backends raise ValueError subclasses on malformed input, so callers keep
+catching (KeyError, TypeError, ValueError).
+"""
+import json
+from typing import Optional, Union
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND_MSGSPEC = "msgspec"
+BACKEND_ORJSON = "orjson"
+BACKEND_JSON = "json"
+
+
+if msgspec is not None:
+    class DepthUpdate(msgspec.Struct):
+        E: int
+        b: list[tuple[float, float]]
+        a: list[tuple[float, float]]
+
+    class Trade(msgspec.Struct):
+        T: int
+        p: float
+        q: float
+        m: bool
+
+    class StreamEnvelope(msgspec.Struct):
+        stream: str
+        data: msgspec.Raw
+
+    class OrderSummary(msgspec.Struct):
+        price: float
+        size: float
+
+    class PriceChange(msgspec.Struct):
+        price: float
+        size: float
+        side: str
+        asset_id: str = ""
+
+    class PolymarketEvent(msgspec.Struct):
+        event_type: str = ""
+        asset_id: str = ""
+        best_bid: Optional[str] = None
+        best_ask: Optional[str] = None
+        bids: list[OrderSummary] = []
+        asks: list[OrderSummary] = []
+        # current price_change format carries one entry per token, the older one `changes` for a single asset_id
+        price_changes: list[PriceChange] = []
+        changes: list[PriceChange] = []
+        timestamp: Optional[str] = None  # ms, as a string
+
+else:
+    from dataclasses import dataclass, field
+
+    @dataclass(slots=True)
+    class DepthUpdate:
+        E: int
+        b: list
+        a: list
+
+    @dataclass(slots=True)
+    class Trade:
+        T: int
+        p: float
+        q: float
+        m: bool
+
+    @dataclass(slots=True)
+    class OrderSummary:
+        price: float
+        size: float
+
+    @dataclass(slots=True)
+    class PriceChange:
+        price: float
+        size: float
+        side: str
+        asset_id: str = ""
+
+    @dataclass(slots=True)
+    class PolymarketEvent:
+        event_type: str = ""
+        asset_id: str = ""
+        best_bid: Optional[str] = None
+        best_ask: Optional[str] = None
+        bids: list = field(default_factory=list)
+        asks: list = field(default_factory=list)
+        price_changes: list = field(default_factory=list)
+        changes: list = field(default_factory=list)
+        timestamp: Optional[str] = None
+
+
+def _levels(levels):
+    return [(float(p), float(q)) for p, q in levels]
+
+
+def depth_from_dict(d):
+    return DepthUpdate(E=d["E"], b=_levels(d["b"]), a=_levels(d["a"]))
+
+
+def trade_from_dict(d):
+    return Trade(T=d["T"], p=float(d["p"]), q=float(d["q"]), m=bool(d["m"]))
+
+
+def _order_summaries(levels):
+    return [OrderSummary(price=float(l["price"]), size=float(l["size"])) for l in levels]
+
+
+def _price_changes(changes):
+    return [
+        PriceChange(price=float(c["price"]), size=float(c["size"]), side=c["side"], asset_id=c.get("asset_id", ""))
+        for c in changes
+    ]
+
+
+def polymarket_from_obj(obj):
+    if not isinstance(obj, dict) or "event_type" not in obj:
+        return None
+    return PolymarketEvent(
+        event_type=obj["event_type"],
+        asset_id=obj.get("asset_id", ""),
+        best_bid=obj.get("best_bid"),
+        best_ask=obj.get("best_ask"),
+        bids=_order_summaries(obj.get("bids", ())),
+        asks=_order_summaries(obj.get("asks", ())),
+        price_changes=_price_changes(obj.get("price_changes", ())),
+        changes=_price_changes(obj.get("changes", ())),
+        timestamp=obj.get("timestamp"),
+    )
+
+
+def _json_loads(raw):
+    # the stdlib decoder does not take memoryviews (zero-copy capture payloads)
+    if isinstance(raw, memoryview):
+        raw = bytes(raw)
+    return json.loads(raw)
+
+
+def available_backends():
+    backends = [BACKEND_JSON]
+    if orjson is not None:
+        backends.insert(0, BACKEND_ORJSON)
+    if msgspec is not None:
+        backends.insert(0, BACKEND_MSGSPEC)
+    return backends
+
+
+class MessageDecoder:
+    """
+    Decodes raw frames (str, bytes or memoryview) into DepthUpdate, Trade and PolymarketEvent.
+
+    backend: BACKEND_MSGSPEC, BACKEND_ORJSON or BACKEND_JSON, defaults to the fastest installed.
+    """
+    def __init__(self, backend: str = None):
+        self.backend = backend or available_backends()[0]
+
+        if self.backend == BACKEND_MSGSPEC:
+            depth = msgspec.json.Decoder(DepthUpdate, strict=False)
+            trade = msgspec.json.Decoder(Trade, strict=False)
+            envelope = msgspec.json.Decoder(StreamEnvelope)
+            # Polymarket also sends JSON arrays of events (e.g. initial book snapshots)
+            polymarket = msgspec.json.Decoder(Union[PolymarketEvent, list[PolymarketEvent]], strict=False)
+            self.depth = depth.decode
+            self.trade = trade.decode
+            self._envelope = envelope.decode
+            self._polymarket = polymarket.decode
+        elif self.backend in (BACKEND_ORJSON, BACKEND_JSON):
+            loads = orjson.loads if self.backend == BACKEND_ORJSON else _json_loads
+            # payloads demultiplexed from a combined stream are already dicts
+            self.depth = lambda raw: depth_from_dict(raw if isinstance(raw, dict) else loads(raw))
+            self.trade = lambda raw: trade_from_dict(raw if isinstance(raw, dict) else loads(raw))
+            self._envelope = loads
+            self._polymarket = loads
+        else:
+            raise ValueError(f"unknown decoder backend {self.backend!r}")
+
+    def envelope(self, raw):
+        """
+        Split a Binance combined-stream frame {"stream": ..., "data": ...} into (stream, payload).
+
+        The payload is left undecoded where the backend allows it (msgspec.Raw) and can be
+        passed to depth() / trade() as is.
+        """
+        msg = self._envelope(raw)
+        if isinstance(msg, dict):
+            return msg["stream"], msg["data"]
+        return msg.stream, msg.data
+
+    def polymarket(self, raw):
+        """Return the PolymarketEvent in a frame, or None for frames that are not a single event."""
+        msg = self._polymarket(raw)
+        if isinstance(msg, PolymarketEvent):
+            return msg if msg.event_type else None
+        return polymarket_from_obj(msg)
+
+    def polymarket_events(self, raw):
+        """Return every PolymarketEvent in a frame, which may hold a single event or an array of them."""
+        msg = self._polymarket(raw)
+        if not isinstance(msg, list):
+            msg = [msg]
+        events = []
+        for item in msg:
+            if not isinstance(item, PolymarketEvent):
+                item = polymarket_from_obj(item)
+            if item is not None and item.event_type:
+                events.append(item)
+        return events
+
+
+DEFAULT_DECODER = MessageDecoder()
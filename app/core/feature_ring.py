@@ -0,0 +1,65 @@
+"""
+Preallocated in-memory history of the latest combined records, for live consumers.
+"""
+import math
+from bisect import bisect_right
+
+import numpy as np
+
+from app.core.schema import TIMESTAMP_FIELD, COMBINED_FIELDS, record_row, store_row
+
+NAN = math.nan
+
+
+class FeatureRing:
+    """
+    Last `capacity` DataManager records as rows of a float64 NumPy array.
+
+    Columns are the timestamp followed by `fields` (schema.COMBINED_FIELDS by default);
+    fields missing from a record are NaN. It is a DataManager sink: write() stores a row
+    in place, so nothing is allocated per record. Reads return copies in time order.
+    """
+    def __init__(self, capacity: int, fields=COMBINED_FIELDS):
+        self.capacity = capacity
+        self.columns = [TIMESTAMP_FIELD] + list(fields)
+        self.data = np.full((capacity, len(self.columns)), NAN)
+        self.count = 0  # rows ever written, the next row goes to count % capacity
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, record):
+        store_row(self.data, self.count % self.capacity, record_row(record, self.columns))
+        self.count += 1
+
+    async def write(self, record):
+        self.append(record)
+
+    def _rows(self, first):
+        """Rows from logical index `first` to the newest, as a copy."""
+        if first >= self.count:
+            return self.data[:0].copy()
+        start = first % self.capacity
+        end = self.count % self.capacity
+        if start < end:
+            return self.data[start:end].copy()
+        return np.concatenate((self.data[start:], self.data[:end]))
+
+    def latest(self):
+        """The newest row as a (1, columns) array, (0, columns) while empty."""
+        return self._rows(self.count - 1) if self.count else self.data[:0].copy()
+
+    def last(self, k: int):
+        """The newest k rows, oldest first."""
+        return self._rows(self.count - min(k, len(self)))
+
+    def last_seconds(self, seconds: float):
+        """Rows with a timestamp within `seconds` of the newest one, oldest first."""
+        if not self.count:
+            return self.data[:0].copy()
+        data, capacity = self.data, self.capacity
+        oldest = self.count - len(self)
+        cutoff = data[(self.count - 1) % capacity, 0] - seconds
+        # rows are written in timestamp order, so the ring is sorted by logical index
+        first = bisect_right(range(oldest, self.count), cutoff, key=lambda i: data[i % capacity, 0])
+        return self._rows(oldest + first)
@@ -0,0 +1,137 @@
+"""
+Local Unix socket API over the FeatureRings, so strategies read live features without
+tailing the JSONL files.
+
+Protocol (little-endian), one request / response at a time per connection:
+    request:  op (1 byte) | name length (u8) | arg (u32) | ring name (utf-8)
+    response: status (u8) | rows (u32) | columns (u32) | rows * columns float64
+              for OP_COLUMNS rows is the byte length of a JSON list of column names that follows
+
+    ops: OP_COLUMNS, OP_LATEST, OP_LAST (arg = k rows), OP_SECONDS (arg = seconds)
+"""
+import json
+import socket
+import struct
+import asyncio
+import logging
+
+import numpy as np
+
+from app.core.feature_ring import FeatureRing
+
+OP_COLUMNS = b"C"
+OP_LATEST = b"L"
+OP_LAST = b"K"
+OP_SECONDS = b"S"
+
+STATUS_OK = 0
+STATUS_UNKNOWN_RING = 1
+STATUS_BAD_OP = 2
+
+REQUEST = struct.Struct("<cBI")
+RESPONSE = struct.Struct("<BII")
+
+
+class FeatureServer:
+    """
+    Serves named FeatureRings (e.g. one per asset) on a Unix socket from the collector's loop.
+
+    Queries are answered straight from the ring between two messages, so a response
+    reflects every record written so far.
+    """
+    def __init__(self, path: str, rings: dict, logger: logging.Logger = None):
+        self.path = path
+        self.rings = rings
+        self.logger = logger or logging.getLogger(__name__)
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        self.logger.info(f"[FeatureServer] Listening on {self.path}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _query(self, op, ring: FeatureRing, arg):
+        if op == OP_COLUMNS:
+            payload = json.dumps(ring.columns).encode()
+            return RESPONSE.pack(STATUS_OK, len(payload), 0) + payload
+        if op == OP_LATEST:
+            rows = ring.latest()
+        elif op == OP_LAST:
+            rows = ring.last(arg)
+        elif op == OP_SECONDS:
+            rows = ring.last_seconds(arg)
+        else:
+            return RESPONSE.pack(STATUS_BAD_OP, 0, 0)
+        return RESPONSE.pack(STATUS_OK, rows.shape[0], rows.shape[1]) + rows.tobytes()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                op, name_len, arg = REQUEST.unpack(await reader.readexactly(REQUEST.size))
+                name = (await reader.readexactly(name_len)).decode()
+                ring = self.rings.get(name)
+                if ring is None:
+                    writer.write(RESPONSE.pack(STATUS_UNKNOWN_RING, 0, 0))
+                else:
+                    writer.write(self._query(op, ring, arg))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            self.logger.warning(f"[FeatureServer] Closing client after error: {e}")
+        finally:
+            writer.close()
+
+
+class FeatureClient:
+    """
+    Blocking client for strategy code; rows come back as (rows, columns) float64 arrays.
+    """
+    def __init__(self, path: str):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self._columns = {}
+
+    def close(self):
+        self.sock.close()
+
+    def _recv_exact(self, n):
+        buf = bytearray(n)
+        view = memoryview(buf)
+        while n:
+            got = self.sock.recv_into(view[-n:], n)
+            if not got:
+                raise ConnectionError("feature server closed the connection")
+            n -= got
+        return buf
+
+    def _request(self, op, name, arg=0):
+        encoded = name.encode()
+        self.sock.sendall(REQUEST.pack(op, len(encoded), arg) + encoded)
+        status, rows, cols = RESPONSE.unpack(self._recv_exact(RESPONSE.size))
+        if status == STATUS_UNKNOWN_RING:
+            raise KeyError(name)
+        if status != STATUS_OK:
+            raise ValueError(f"feature server rejected op {op!r}")
+        if op == OP_COLUMNS:
+            return json.loads(bytes(self._recv_exact(rows)))
+        return np.frombuffer(self._recv_exact(rows * cols * 8), dtype="<f8").reshape(rows, cols)
+
+    def columns(self, name):
+        if name not in self._columns:
+            self._columns[name] = self._request(OP_COLUMNS, name)
+        return self._columns[name]
+
+    def latest(self, name):
+        return self._request(OP_LATEST, name)
+
+    def last(self, name, k):
+        return self._request(OP_LAST, name, k)
+
+    def last_seconds(self, name, seconds):
+        return self._request(OP_SECONDS, name, seconds)
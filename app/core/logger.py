@@ -1,9 +1,107 @@
 import os
+import time
+import queue
+import atexit
 import logging
+import logging.handlers
 from datetime import datetime
 
-def setup_logger(log_folder):
-    """Initializes a logger with a timestamped filename."""
+# queue mode: records waiting for the writer thread, newer ones are dropped beyond this
+LOG_QUEUE_SIZE = 10_000
+# per call site: `RATE_LIMIT_BURST` records per `RATE_LIMIT_INTERVAL` seconds, the rest are counted;
+# only records at RATE_LIMIT_LEVEL or above (hot-path warnings and errors), INFO always passes
+RATE_LIMIT_INTERVAL = 10.0
+RATE_LIMIT_BURST = 5
+RATE_LIMIT_LEVEL = logging.WARNING
+LOG_FORMAT = '%(asctime)s | %(levelname)s | %(name)s | %(message)s'
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through `burst` records per `interval` seconds from each call site (file and line),
+    so a storm of malformed messages logs a handful of lines instead of one per message.
+    The first record of a site's next window notes how many records of that site were
+    suppressed before it. Records below `level` and CRITICAL records always pass.
+    """
+    def __init__(self, interval=RATE_LIMIT_INTERVAL, burst=RATE_LIMIT_BURST, level=RATE_LIMIT_LEVEL,
+                 clock=time.monotonic):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.level = level
+        self.clock = clock
+        self._sites = {}  # (pathname, lineno): [window start, records in window, suppressed]
+        self.suppressed = 0
+
+    def filter(self, record):
+        if record.levelno < self.level or record.levelno >= logging.CRITICAL:
+            return True
+        key = (record.pathname, record.lineno)
+        now = self.clock()
+        site = self._sites.get(key)
+        if site is None or now - site[0] >= self.interval:
+            if site is not None and site[2]:
+                record.msg = (f"{record.msg} [{site[2]} earlier messages from {record.filename}:{record.lineno} "
+                              f"suppressed in the last {now - site[0]:.0f}s]")
+            self._sites[key] = [now, 1, 0]
+            return True
+        site[1] += 1
+        if site[1] <= self.burst:
+            return True
+        site[2] += 1
+        self.suppressed += 1
+        return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that counts and drops records when the queue is full instead of blocking or raising."""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _stop_listener(listener):
+    # QueueListener.stop() fails when called twice, e.g. by the owner and then at exit
+    if listener._thread is not None:
+        listener.stop()
+
+
+def configure_logger(logger, handlers, use_queue=False, rate_limit=False, queue_size=LOG_QUEUE_SIZE):
+    """
+    Attach `handlers` to `logger`, directly or (use_queue=True) behind a QueueHandler so that
+    formatting aside, file and console I/O happen on a QueueListener thread instead of the
+    event loop. Returns the QueueListener, already started, or None.
+    """
+    if rate_limit:
+        logger.addFilter(RateLimitFilter())
+    if not use_queue:
+        for handler in handlers:
+            logger.addHandler(handler)
+        return None
+
+    queue_handler = DroppingQueueHandler(queue.Queue(queue_size))
+    listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    logger.addHandler(queue_handler)
+    listener.start()
+    # drain what is still queued when the process exits
+    atexit.register(_stop_listener, listener)
+    return listener
+
+
+def setup_logger(log_folder, use_queue=False, rate_limit=False):
+    """
+    Initializes a logger with a timestamped filename.
+
+    use_queue: write the file and the console from a background thread, see configure_logger
+    rate_limit: limit every call site to RATE_LIMIT_BURST warnings / errors per RATE_LIMIT_INTERVAL
+        seconds, see RateLimitFilter
+    """
     if not os.path.exists(log_folder):
         os.makedirs(log_folder)
 
@@ -20,11 +118,10 @@ def setup_logger(log_folder):
     console_handler = logging.StreamHandler()
 
     # Formatting
-    formatter = logging.Formatter('%(asctime)s | %(levelname)s | %(name)s | %(message)s')
+    formatter = logging.Formatter(LOG_FORMAT)
     file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    configure_logger(logger, [file_handler, console_handler], use_queue, rate_limit)
 
     return logger
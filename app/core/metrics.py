@@ -0,0 +1,224 @@
+"""
+In-process counters, gauges and histograms with a Prometheus text endpoint.
+
+Components take an optional `metrics` registry and resolve their series once at
+construction; with metrics=None nothing is registered and the hot paths only pay an
+attribute check.
+"""
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+LOOP_LAG_INTERVAL = 0.5  # seconds
+
+# seconds, from 100 us to 10 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# record age since its bucket start, one bucket width is the floor
+AGE_BUCKETS = (0.1, 0.25, 0.5, 1.0, 1.1, 1.25, 1.5, 2.0, 2.5, 3.0, 5.0, 10.0, 30.0, 60.0)
+
+KIND_COUNTER = "counter"
+KIND_GAUGE = "gauge"
+KIND_HISTOGRAM = "histogram"
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, v):
+        self.value = v
+
+
+class Callback:
+    """Series whose value is read from fn() at scrape time, e.g. a queue size or a stats entry."""
+    __slots__ = ("fn",)
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    @property
+    def value(self):
+        return self.fn()
+
+
+class Histogram:
+    """Fixed upper bounds; observe() is a bisect and two additions."""
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, v):
+        self.counts[bisect_left(self.buckets, v)] += 1
+        self.sum += v
+
+
+def _labels(labels, extra=None):
+    items = sorted(labels)
+    if extra:
+        items.append(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class MetricsRegistry:
+    """
+    Series by name and labels. Asking twice for the same name and labels returns the
+    same series, so e.g. all depth listeners share one message counter.
+    """
+    def __init__(self):
+        self._families = {}  # name: [kind, help, {labels: series}]
+
+    def _series(self, kind, name, help_text, labels, factory):
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = [kind, help_text, {}]
+        elif family[0] != kind:
+            raise ValueError(f"metric {name} is a {family[0]}, not a {kind}")
+        key = tuple(sorted(labels.items()))
+        series = family[2].get(key)
+        if series is None:
+            series = family[2][key] = factory()
+        return series
+
+    def counter(self, name, help_text, **labels) -> Counter:
+        return self._series(KIND_COUNTER, name, help_text, labels, Counter)
+
+    def gauge(self, name, help_text, **labels) -> Gauge:
+        return self._series(KIND_GAUGE, name, help_text, labels, Gauge)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, **labels) -> Histogram:
+        return self._series(KIND_HISTOGRAM, name, help_text, labels, lambda: Histogram(buckets))
+
+    def callback(self, name, help_text, fn, kind=KIND_GAUGE, **labels):
+        """Register fn() as the value of a counter or gauge series, replacing an earlier one."""
+        series = self._series(kind, name, help_text, labels, lambda: Callback(fn))
+        series.fn = fn
+        return series
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4."""
+        lines = []
+        for name, (kind, help_text, series) in self._families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, s in series.items():
+                if kind != KIND_HISTOGRAM:
+                    lines.append(f"{name}{_labels(key)} {s.value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(s.buckets, s.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(key, ('le', bound))} {cumulative}")
+                cumulative += s.counts[-1]
+                lines.append(f"{name}_bucket{_labels(key, ('le', '+Inf'))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(key)} {s.sum}")
+                lines.append(f"{name}_count{_labels(key)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Minimal HTTP server on the collector's loop, answers every GET with registry.render().
+    """
+    def __init__(self, registry: MetricsRegistry, host=METRICS_HOST, port=METRICS_PORT,
+                 logger: logging.Logger = None):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.logger = logger or logging.getLogger(__name__)
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.logger.info(f"[MetricsServer] Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+            if request.startswith(b"GET "):
+                body = self.registry.render().encode()
+                head = (f"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+            else:
+                body = b""
+                head = "HTTP/1.1 405 Method Not Allowed\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+            writer.write(head.encode() + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes a sleeping task; anything above a few ms means
+    a callback is hogging the loop and every feed is delayed by as much.
+    """
+    def __init__(self, registry: MetricsRegistry, interval=LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.lag = registry.histogram("collector_event_loop_lag_seconds", "Event loop wake-up delay")
+        self.last = registry.gauge("collector_event_loop_lag_last_seconds", "Most recent event loop wake-up delay")
+
+    async def run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            self.lag.observe(lag)
+            self.last.set(lag)
+
+
+class StreamMetrics:
+    """
+    Series of one feed stream (e.g. "binance_depth"), shared by every listener of that stream.
+
+    The exchange → receive latency compares wall clocks, so it includes any clock skew.
+    Record age is measured from the bucket start, so one bucket width is the floor.
+    """
+    def __init__(self, registry: MetricsRegistry, stream: str):
+        self.messages = registry.counter("collector_messages_total", "Messages received", stream=stream)
+        self.decode = registry.histogram("collector_decode_seconds", "Time to decode one message", stream=stream)
+        self.event_latency = registry.histogram(
+            "collector_event_latency_seconds", "Receive time minus exchange event time", stream=stream
+        )
+        self.finalize_age = registry.histogram(
+            "collector_record_age_seconds", "Wall time minus bucket start when a record passes a stage",
+            AGE_BUCKETS, stage="finalize", stream=stream
+        )
+        self.reconnects = registry.counter("collector_reconnects_total", "Websocket reconnects", stream=stream)
+
+    def received(self, received_at, started, event_ms=None):
+        """received_at: wall time at receive, started: perf_counter before decoding."""
+        self.messages.inc()
+        self.decode.observe(time.perf_counter() - started)
+        if event_ms:
+            self.event_latency.observe(received_at - event_ms / 1000)
+
+    def finalized(self, bucket_start):
+        self.finalize_age.observe(time.time() - bucket_start)
@@ -0,0 +1,76 @@
+from bisect import bisect_left, insort
+
+DEFAULT_MAX_LEVELS = 5000
+
+
+class BookSide:
+    """
+    One side of an order book kept sorted by price.
+
+    Prices live in a sorted array of keys (bids are stored negated, so the best
+    level is always at index 0 on both sides) plus a {key: qty} dict. Lookups
+    are O(log n) bisects, quantity changes on existing levels are O(1) and the
+    top N levels are a plain slice, so nothing is ever re-sorted.
+
+    Levels further than `max_levels` from the touch are pruned on insert, which
+    bounds both memory and the cost of shifting the array on inserts/removals.
+    """
+    def __init__(self, descending=False, max_levels=DEFAULT_MAX_LEVELS):
+        self.descending = descending
+        self.max_levels = max_levels
+        self._keys = []
+        self._qty = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, price):
+        return self._key(price) in self._qty
+
+    def _key(self, price):
+        return -price if self.descending else price
+
+    def update(self, price, qty):
+        """Set quantity at price level, zero quantity removes the level."""
+        key = -price if self.descending else price
+        levels = self._qty
+
+        if qty == 0:
+            if key in levels:
+                del levels[key]
+                keys = self._keys
+                del keys[bisect_left(keys, key)]
+            return
+
+        if key in levels:
+            levels[key] = qty
+            return
+
+        levels[key] = qty
+        insort(self._keys, key)
+
+        # prune levels furthest from the touch
+        if self.max_levels is not None and len(self._keys) > self.max_levels:
+            del levels[self._keys.pop()]
+
+    def clear(self):
+        self._keys.clear()
+        self._qty.clear()
+
+    def best(self):
+        if not self._keys:
+            return None
+        key = self._keys[0]
+        return (-key if self.descending else key, self._qty[key])
+
+    def in_top(self, price, n):
+        """True if a level at price is, or would become, one of the best n."""
+        keys = self._keys
+        return len(keys) < n or self._key(price) <= keys[n - 1]
+
+    def top(self, n=10):
+        """Return the best n levels as [(price, qty), ...] ordered from the touch."""
+        levels = self._qty
+        if self.descending:
+            return [(-k, levels[k]) for k in self._keys[:n]]
+        return [(k, levels[k]) for k in self._keys[:n]]
@@ -0,0 +1,169 @@
+import os
+import time
+import logging
+import asyncio
+import traceback
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.core.schema import TIMESTAMP_FIELD, COMBINED_FIELDS, to_float
+from app.core.time_utils import curr_timestamp_15min, DEFAULT_BUCKET_MS
+from app.core.writer import candle_file_path, check_task, release_queue, drain_task
+
+ROW_GROUP_SIZE = 300  # rows, 5 minutes of 1s records
+# a row group is also written once its first row has waited this long, so a quiet or slow
+# stream does not keep minutes of rows in memory only
+ROW_GROUP_MAX_AGE = 60  # seconds
+
+
+def combined_schema(bucket_ms: int = DEFAULT_BUCKET_MS) -> pa.Schema:
+    """Combined-record schema, the timestamp is int64 seconds or float64 for sub-second buckets."""
+    ts_type = pa.int64() if bucket_ms % 1000 == 0 else pa.float64()
+    return pa.schema([pa.field(TIMESTAMP_FIELD, ts_type)] + [pa.field(name, pa.float64()) for name in COMBINED_FIELDS])
+
+
+COMBINED_SCHEMA = combined_schema()
+
+
+class ParquetWriter:
+    def __init__(self, base_dir: str, name: str, schema: pa.Schema = COMBINED_SCHEMA,
+                 row_group_size: int = ROW_GROUP_SIZE, logger: logging.Logger = None, clock=time.time,
+                 max_queue: int = 0, metrics=None, row_group_max_age: float = ROW_GROUP_MAX_AGE):
+        """
+        Drop-in columnar alternative to JSONLWriter with the same start()/write() interface,
+        15-minute rotation and yyyy/mm/dd/hh layout.
+
+        base_dir: e.g. 'data'
+        name: e.g. 'combined_data.parquet' (will be formatted as MM_combined_data.parquet)
+        schema: fixed Arrow schema, float64 fields are coerced from numbers or numeric strings
+        row_group_size: rows buffered before a row group is written
+        row_group_max_age: seconds the oldest buffered row may wait before its row group is
+            written, whether or not it is full
+        metrics: MetricsRegistry for the queue depth, labelled file=<name>
+
+        A Parquet file is only readable once its footer is written, i.e. after the
+        candle rotates or the writer is stopped; collector.py stops its writers on SIGTERM / SIGINT.
+        """
+        self.base_dir = base_dir
+        self.name = name
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.row_group_max_age = row_group_max_age
+        self.logger = logger or logging.getLogger(__name__)
+        self.clock = clock
+
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+
+        self._current_ts = None
+        self._pq_writer = None
+        self._columns = {f.name: [] for f in schema}
+        self._is_float = [(f.name, f.type == pa.float64()) for f in schema]
+        self._rows = 0
+        self._group_started = None  # monotonic time of the first buffered row
+
+        if metrics is not None:
+            metrics.callback("collector_writer_queue_depth", "Records waiting in the writer queue",
+                             self.queue.qsize, file=name)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._writer())
+
+    @property
+    def task(self):
+        """The writer task once started; it only ends by failing, see write()."""
+        return self._task
+
+    async def stop(self):
+        if self._task is None:
+            return
+        await drain_task(self.queue, self._task)
+        self._task = None
+        self._close_file()
+
+    async def write(self, obj):
+        check_task(self._task, self.name)
+        await self.queue.put(obj)
+
+    def _flush_row_group(self):
+        if not self._rows:
+            return
+        arrays = [pa.array(self._columns[f.name], type=f.type) for f in self.schema]
+        self._pq_writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        for col in self._columns.values():
+            col.clear()
+        self._rows = 0
+        self._group_started = None
+
+    def _close_file(self):
+        if self._pq_writer:
+            self._flush_row_group()
+            self._pq_writer.close()
+            self._pq_writer = None
+            self._current_ts = None
+
+    def _open_new_file(self):
+        """Rotate file if candle changed, closing (and finalizing) the previous one"""
+        candle_ts = curr_timestamp_15min(self.clock())
+
+        if candle_ts == self._current_ts:
+            return
+
+        self._close_file()
+
+        # Parquet files cannot be appended to, a restart within a candle gets a numbered file
+        file_path = candle_file_path(self.base_dir, self.name, candle_ts)
+        root, ext = os.path.splitext(file_path)
+        n = 0
+        while os.path.exists(file_path):
+            n += 1
+            file_path = f"{root}.{n}{ext}"
+
+        self._pq_writer = pq.ParquetWriter(file_path, self.schema, compression="zstd")
+        self._current_ts = candle_ts
+        self.logger.info(f"[ParquetWriter] Switched to {file_path}")
+
+    def _append(self, obj):
+        columns = self._columns
+        for name, is_float in self._is_float:
+            v = obj.get(name)
+            # missing and unparsable values are written as nulls
+            columns[name].append(to_float(v, None) if is_float else v)
+        if not self._rows:
+            self._group_started = time.monotonic()
+        self._rows += 1
+
+    async def _next(self):
+        """Next record, or None once the buffered rows reached `row_group_max_age`."""
+        if not self._rows:
+            return await self.queue.get()
+        timeout = self._group_started + self.row_group_max_age - time.monotonic()
+        try:
+            return await asyncio.wait_for(self.queue.get(), max(timeout, 0))
+        except asyncio.TimeoutError:
+            return None
+
+    async def _writer(self):
+        try:
+            while True:
+                obj = await self._next()
+                if obj is None:
+                    self._flush_row_group()
+                    continue
+
+                self._open_new_file()
+                self._append(obj)
+                if self._rows >= self.row_group_size or \
+                        time.monotonic() - self._group_started >= self.row_group_max_age:
+                    self._flush_row_group()
+
+                self.queue.task_done()
+
+        except Exception:
+            self.logger.error(traceback.format_exc())
+            released = release_queue(self.queue)
+            self.logger.error(f"[ParquetWriter] Writer task of {self.name} failed, {released} queued records "
+                              f"dropped, further writes raise")
+            raise
@@ -0,0 +1,137 @@
+import json
+import time
+import heapq
+import asyncio
+import logging
+from collections import Counter
+
+from app.core.compression import open_data_file
+
+# stream names used in recordings
+STREAM_DEPTH = "depth"
+STREAM_TRADE = "trade"
+STREAM_POLYMARKET = "polymarket"
+STREAM_POLYMARKET_IDS = "polymarket_ids"  # token map active from this point on, see WebSocketOrderBook.set_markets
+STREAM_BINANCE_COMBINED = "binance_combined"  # multiplexed /stream?streams=... frames
+
+
+class ReplayClock:
+    """
+    Stand-in for time.time() that returns the receive time of the event being replayed.
+    """
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def read_jsonl_recording(path):
+    """
+    Yield (recv_ns, stream, msg) from a JSONL recording.
+
+    Each line is {"recv_ns": <int>, "stream": <name>, "msg": <raw websocket frame>},
+    the file may be zstd-compressed.
+    """
+    with open_data_file(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            yield rec["recv_ns"], rec["stream"], rec["msg"]
+
+
+def merge_recordings(*recordings):
+    """Merge already time-ordered recordings into one stream ordered by receive time."""
+    return heapq.merge(*recordings, key=lambda event: event[0])
+
+
+class ReplayEngine:
+    """
+    Feeds recorded frames through the live handlers in receive-time order.
+
+    Receive time is the only clock shared by all feeds, so ordering by it
+    reproduces the interleaving the live collector saw. The shared ReplayClock
+    is advanced before each event, which makes Polymarket timestamps and
+    writer file rotation follow the recording instead of the wall clock.
+
+    speed: None replays as fast as possible, N replays at N x real time.
+    data_managers: flushed at the end so the seconds still open are written.
+    """
+    def __init__(self, events, clock, l2_listener=None, tape_listener=None, polymarket=None,
+                 writers=(), speed=None, logger=None, combined=None, data_managers=()):
+        self.events = events
+        self.clock = clock
+        self.l2_listener = l2_listener
+        self.tape_listener = tape_listener
+        self.polymarket = polymarket
+        self.combined = combined
+        self.writers = writers
+        self.data_managers = data_managers
+        self.speed = speed
+        self.logger = logger or logging.getLogger(__name__)
+        self.counts = Counter()
+
+    async def _dispatch(self, stream, msg):
+        # Binance handlers decode capture memoryviews in place, Polymarket frames are compared as text
+        if isinstance(msg, (bytes, memoryview)) and stream in (STREAM_POLYMARKET, STREAM_POLYMARKET_IDS):
+            msg = str(msg, "utf-8")
+
+        if stream == STREAM_DEPTH and self.l2_listener:
+            await self.l2_listener.handle_message(msg)
+        elif stream == STREAM_TRADE and self.tape_listener:
+            await self.tape_listener.handle_message(msg)
+        elif stream == STREAM_POLYMARKET and self.polymarket:
+            await self.polymarket.handle_message(msg)
+        elif stream == STREAM_BINANCE_COMBINED and self.combined:
+            await self.combined.handle_message(msg)
+        elif stream == STREAM_POLYMARKET_IDS and self.polymarket:
+            ids = json.loads(msg)
+            if "ids" in ids:
+                self.polymarket.set_markets(ids["ids"], ids["assets"], ids.get("candle_ts"))
+            else:
+                self.polymarket.set_markets(ids)
+        else:
+            self.counts["skipped"] += 1
+            return
+        self.counts[stream] += 1
+
+    async def run(self):
+        first_ns = None
+        start = time.perf_counter()
+
+        for recv_ns, stream, msg in self.events:
+            if first_ns is None:
+                first_ns = recv_ns
+
+            if self.speed:
+                delay = (recv_ns - first_ns) / 1e9 / self.speed - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            self.clock.now = recv_ns / 1e9
+            await self._dispatch(stream, msg)
+
+            # let writer tasks drain so rotation sees the same clock as live
+            await asyncio.sleep(0)
+
+        # the last seconds wait for a watermark that never comes, write them out
+        for data_manager in self.data_managers:
+            await data_manager.flush()
+        for writer in self.writers:
+            await writer.queue.join()
+
+        elapsed = time.perf_counter() - start
+        total = sum(v for k, v in self.counts.items() if k != "skipped")
+        stats = {
+            "events": total,
+            "elapsed_s": elapsed,
+            "events_per_sec": total / elapsed if elapsed > 0 else 0.0,
+            "recorded_s": (recv_ns - first_ns) / 1e9 if first_ns is not None else 0.0,
+            **self.counts,
+        }
+        self.logger.info(
+            f"[Replay] {total} events in {elapsed:.2f}s "
+            f"({stats['events_per_sec']:.0f} events/s, {dict(self.counts)})"
+        )
+        return stats
@@ -0,0 +1,156 @@
+import math
+from collections import deque
+
+# variance below this fraction of the squared value scale is treated as float noise and recomputed exactly
+NOISE_VAR_RATIO = 1e-9
+
+
+def buckets_per(seconds: float, bucket_ms: int) -> int:
+    """Number of buckets spanning `seconds`, at least one; windows are configured in seconds."""
+    return max(1, round(seconds * 1000 / bucket_ms))
+
+
+def per_bucket_alpha(alpha: float, bucket_ms: int) -> float:
+    """EMA alpha per bucket that decays as fast in time as `alpha` applied once per second."""
+    if bucket_ms == 1000:
+        return alpha
+    return 1 - (1 - alpha) ** (bucket_ms / 1000)
+
+
+class RollingStats:
+    """
+    Mean and population standard deviation over the last `window` values.
+
+    Uses Welford's update for growth and the fixed-size replacement update once
+    the window is full, so each append is O(1) instead of a full pass over the
+    history. Accumulated rounding is bounded by recomputing the exact moments
+    once per `window` replacements, and whenever the variance collapses to the
+    noise floor (e.g. a flat series), where a residue would blow up z-scores.
+    Replacing a value with an equal one keeps exact moments exact, so a flat
+    series is recomputed once rather than on every read.
+    """
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._scale = 0.0
+        self._replacements = 0
+        self._exact = True  # moments were recomputed and nothing changed since
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, x: float):
+        values = self.values
+        n = len(values)
+
+        if abs(x) > self._scale:
+            self._scale = abs(x)
+
+        if n < self.window:
+            self._exact = False
+            values.append(x)
+            delta = x - self.mean
+            self.mean += delta / (n + 1)
+            self._m2 += delta * (x - self.mean)
+            return
+
+        old = values[0]
+        if x != old:
+            self._exact = False
+        values.append(x)
+        old_mean = self.mean
+        self.mean = old_mean + (x - old) / n
+        self._m2 += (x - old) * (x - self.mean + old - old_mean)
+
+        self._replacements += 1
+        if self._replacements >= self.window:
+            self._recompute()
+
+    def _recompute(self):
+        values = self.values
+        n = len(values)
+        self._replacements = 0
+        self._exact = True
+        if n == 0:
+            self.mean = self._m2 = self._scale = 0.0
+            return
+        mu = sum(values) / n
+        self.mean = mu
+        self._m2 = sum((x - mu) ** 2 for x in values)
+        self._scale = max(abs(x) for x in values)
+
+    @property
+    def variance(self):
+        n = len(self.values)
+        if n == 0:
+            return 0.0
+        var = self._m2 / n
+        if not self._exact and var <= NOISE_VAR_RATIO * self._scale * self._scale:
+            self._recompute()
+            var = self._m2 / n
+        return max(var, 0.0)
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def zscore(self, v: float):
+        sigma = self.std
+        return (v - self.mean) / sigma if sigma > 0 else 0.0
+
+    def state_dict(self):
+        # running moments too, so a restored window continues bit for bit
+        return {
+            "values": list(self.values),
+            "mean": self.mean,
+            "m2": self._m2,
+            "scale": self._scale,
+            "replacements": self._replacements,
+            "exact": self._exact,
+        }
+
+    def load_state(self, state):
+        # parse everything before assigning, a bad state leaves the window unchanged
+        values = deque((float(v) for v in state["values"][-self.window:]), maxlen=self.window)
+        if len(state["values"]) > self.window:
+            # window shrank, the saved moments no longer apply
+            self.values = values
+            self._recompute()
+            return
+        moments = (float(state["mean"]), float(state["m2"]), float(state["scale"]),
+                   int(state["replacements"]), bool(state["exact"]))
+        self.values = values
+        self.mean, self._m2, self._scale, self._replacements, self._exact = moments
+
+
+class RollingRatio:
+    """
+    Fraction of truthy flags over the last `window` appends, kept as a running count.
+    """
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.count = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, flag: bool):
+        values = self.values
+        if len(values) == self.window:
+            self.count -= values[0]
+        flag = bool(flag)
+        values.append(flag)
+        self.count += flag
+
+    def ratio(self):
+        return self.count / len(self.values) if self.values else 0.0
+
+    def state_dict(self):
+        return {"values": list(self.values)}
+
+    def load_state(self, state):
+        self.values = deque((bool(v) for v in state["values"]), maxlen=self.window)
+        self.count = sum(self.values)
@@ -0,0 +1,156 @@
+"""
+Incremental multi-timeframe bars built from the joined per-second records.
+
+Each timeframe keeps one open bar and folds every record into it in O(1); a bar
+is emitted when the first record of the next period arrives, the same way the
+aggregators finalize buckets. Nothing is ever rescanned, so 60s and 15m features
+cost the same per update as 5s ones.
+"""
+import logging
+from dataclasses import dataclass
+
+from app.core.time_utils import CANDLE_SECONDS
+
+# {name: period in seconds}, 15m bars are aligned to the Polymarket candles
+TIMEFRAMES = {
+    "5s": 5,
+    "60s": 60,
+    "15m": CANDLE_SECONDS,
+}
+
+
+@dataclass
+class Bar:
+    """
+    Running summary of one period.
+    """
+    ts: float
+    seconds: int = 0
+    open: float = None
+    high: float = None
+    low: float = None
+    close: float = None
+    buy_vol: float = 0.0
+    sell_vol: float = 0.0
+    cvd: float = None
+    obi_sum: float = 0.0
+    obi_n: int = 0
+    obi_last: float = None
+    bid_liq_sum: float = 0.0
+    ask_liq_sum: float = 0.0
+
+
+class Rollup:
+    """
+    Bars of one timeframe.
+
+    Fields of the emitted bar:
+        - open/high/low/close: from the per-second last trade `price`.
+        - buy_vol/sell_vol/volume: summed traded volume.
+        - afi: (buy - sell) / volume over the bar.
+        - cvd_delta / cvd: net aggressor volume of the bar and the running CVD at its close.
+        - obi_mean / obi_close: mean and last per-second OBI.
+        - obi: liquidity-weighted OBI over the bar, (sum bid_liq - sum ask_liq) / total.
+        - seconds: number of records folded in.
+        - partial: only on bars emitted by flush(), True: the period was cut short by a shutdown.
+    """
+    def __init__(self, name: str, period: int):
+        self.name = name
+        self.period = period
+        self.bar = None
+
+    def update(self, ts, record):
+        """Fold one record into the open bar, return the finished bar when a new period starts."""
+        start = ts - ts % self.period
+        finished = None
+        bar = self.bar
+        if bar is None or start != bar.ts:
+            if bar is not None:
+                finished = self._finalize(bar)
+            bar = self.bar = Bar(ts=start)
+
+        bar.seconds += 1
+
+        price = record.get("price")
+        if price is not None:
+            if bar.open is None:
+                bar.open = bar.high = bar.low = price
+            elif price > bar.high:
+                bar.high = price
+            elif price < bar.low:
+                bar.low = price
+            bar.close = price
+
+        bar.buy_vol += record.get("buy_vol", 0.0)
+        bar.sell_vol += record.get("sell_vol", 0.0)
+        cvd = record.get("cvd")
+        if cvd is not None:
+            bar.cvd = cvd
+
+        obi = record.get("obi")
+        if obi is not None:
+            bar.obi_sum += obi
+            bar.obi_n += 1
+            bar.obi_last = obi
+        bar.bid_liq_sum += record.get("bid_liq", 0.0)
+        bar.ask_liq_sum += record.get("ask_liq", 0.0)
+
+        return finished
+
+    def flush(self):
+        """The open bar marked partial, or None; the next update starts a new bar."""
+        if self.bar is None:
+            return None
+        bar = self._finalize(self.bar)
+        bar["partial"] = True
+        self.bar = None
+        return bar
+
+    def _finalize(self, b: Bar):
+        volume = b.buy_vol + b.sell_vol
+        liq = b.bid_liq_sum + b.ask_liq_sum
+        return {
+            "timestamp": b.ts,
+            "timeframe": self.name,
+            "seconds": b.seconds,
+            "open": b.open,
+            "high": b.high,
+            "low": b.low,
+            "close": b.close,
+            "buy_vol": b.buy_vol,
+            "sell_vol": b.sell_vol,
+            "volume": volume,
+            "afi": (b.buy_vol - b.sell_vol) / volume if volume > 0 else 0.0,
+            "cvd_delta": b.buy_vol - b.sell_vol,
+            "cvd": b.cvd,
+            "obi_mean": b.obi_sum / b.obi_n if b.obi_n else None,
+            "obi_close": b.obi_last,
+            "obi": (b.bid_liq_sum - b.ask_liq_sum) / liq if liq > 0 else 0.0,
+        }
+
+
+class RollupStage:
+    """
+    DataManager sink that turns the joined records into 5s / 60s / 15m bars.
+
+    sinks: {timeframe name: writer}, each with an async write(bar); timeframes
+    without a sink are not computed.
+    """
+    def __init__(self, sinks, timeframes=TIMEFRAMES, logger: logging.Logger = None):
+        self.sinks = sinks
+        self.rollups = [Rollup(name, period) for name, period in timeframes.items() if name in sinks]
+        self.logger = logger or logging.getLogger(__name__)
+
+    async def write(self, record):
+        ts = record["timestamp"]
+        for rollup in self.rollups:
+            bar = rollup.update(ts, record)
+            if bar is not None:
+                await self.sinks[rollup.name].write(bar)
+
+    async def flush(self):
+        """Write every open bar as a partial one, e.g. at shutdown before the sinks are stopped."""
+        for rollup in self.rollups:
+            bar = rollup.flush()
+            if bar is not None:
+                await self.sinks[rollup.name].write(bar)
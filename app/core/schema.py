@@ -0,0 +1,80 @@
+"""
+Fixed column layout of the DataManager combined record.
+
+Used by the columnar sinks; anything not listed here is ignored by them.
+"""
+import math
+
+from app.binance.aggregators import l2_aggregator, tape_aggregator
+from app.polymarket.book_aggregator import BOOK_FEATURES
+
+TIMESTAMP_FIELD = "timestamp"
+
+TAPE_FIELDS = [
+    "price",
+    "buy_vol",
+    "sell_vol",
+    "total_vol",
+    "vol_per_sec",
+    "vol_accel",
+    "afi",
+    "ew_afi",
+    "cvd",
+    "cvd_slope",
+    "price_eff",
+    "buy_eff",
+    "sell_eff",
+    "afi_pos_ratio",
+    "cvd_slope_pos_ratio",
+] + [f"z_{k}" for k in tape_aggregator.Z_WINDOWS]
+
+L2_FIELDS = [
+    "bid_liq",
+    "ask_liq",
+    "obi",
+    "ew_obi",
+    "bid_liq_delta",
+    "ask_liq_delta",
+    "weighted_obi",
+    "obi_pos_ratio",
+    "bid_liq_increasing_ratio",
+    "ask_liq_decreasing_ratio",
+] + [f"z_{k}" for k in l2_aggregator.Z_WINDOWS]
+
+POLYMARKET_FIELDS = [
+    "up_best_bid",
+    "up_best_ask",
+    "down_best_bid",
+    "down_best_ask",
+] + [f"{outcome}_{k}" for outcome in ("up", "down") for k in BOOK_FEATURES]
+
+# every value column is float64, the timestamp is int64 unix seconds
+COMBINED_FIELDS = TAPE_FIELDS + L2_FIELDS + POLYMARKET_FIELDS
+
+
+def to_float(v, missing=math.nan):
+    """A record value as a float64 column value, `missing` for None or anything unparsable."""
+    # Polymarket quotes arrive as strings
+    if v is None:
+        return missing
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return missing
+
+
+def record_row(record, columns):
+    """The values of `columns` in `record`, None where a field is missing."""
+    return list(map(record.get, columns))
+
+
+def store_row(data, index, values):
+    """
+    Write a record_row() into row `index` of the float64 array `data` in place,
+    None and unparsable values become NaN.
+    """
+    try:
+        # NumPy turns None into NaN and parses numeric strings itself
+        data[index] = values
+    except (TypeError, ValueError):
+        data[index] = [to_float(v) for v in values]
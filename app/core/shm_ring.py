@@ -0,0 +1,194 @@
+"""
+Fan-out of combined records to other processes through a shared-memory ring.
+
+One ShmPublisher (a DataManager sink in the collector) writes fixed-width float64 rows,
+any number of ShmSubscriber processes read them without touching the feeds or the files.
+
+Segment layout:
+    header    64 bytes: magic, version, slots, columns, names length (u32 each), published (u64 at 32)
+    names     JSON list of column names, padded to 8 bytes
+    slot_seq  slots x int64, sequence number of the record in each slot, -1 while it is written
+    data      slots x columns float64
+"""
+import json
+import time
+import struct
+import logging
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+from app.core.schema import TIMESTAMP_FIELD, COMBINED_FIELDS, record_row, store_row
+
+SHM_MAGIC = 0x504D3135  # "PM15"
+SHM_VERSION = 1
+DEFAULT_SLOTS = 4096
+HEADER = struct.Struct("<IIIII")
+HEADER_SIZE = 64
+PUBLISHED_OFFSET = 32
+# a reader further behind than this fraction of the ring is reported as slow
+SLOW_READER_RATIO = 0.5
+WRITING = -1
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # before 3.13 attaching registers the segment with this process' resource tracker, which
+    # would unlink it when the reader exits; skip the registration instead of undoing it, since
+    # the tracker may be shared with the publisher (forked readers)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _layout(slots, n_columns, names_len):
+    names_end = HEADER_SIZE + (names_len + 7) // 8 * 8
+    data_offset = names_end + slots * 8
+    return names_end, data_offset, data_offset + slots * n_columns * 8
+
+
+def _views(buf, slots, n_columns, names_len):
+    names_end, data_offset, _ = _layout(slots, n_columns, names_len)
+    published = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=PUBLISHED_OFFSET)
+    slot_seq = np.ndarray((slots,), dtype=np.int64, buffer=buf, offset=names_end)
+    data = np.ndarray((slots, n_columns), dtype=np.float64, buffer=buf, offset=data_offset)
+    return published, slot_seq, data
+
+
+class ShmPublisher:
+    """
+    Writes records into the ring `name`, creating (or replacing a stale) segment.
+
+    Every record gets the next sequence number. A slot is marked as being written,
+    filled, stamped with its sequence number, and only then is the published count
+    advanced, so readers never see a half-written row as valid.
+    """
+    def __init__(self, name: str, fields=COMBINED_FIELDS, slots=DEFAULT_SLOTS, logger: logging.Logger = None):
+        self.name = name
+        self.columns = [TIMESTAMP_FIELD] + list(fields)
+        self.slots = slots
+        self.logger = logger or logging.getLogger(__name__)
+
+        names = json.dumps(self.columns).encode()
+        size = _layout(slots, len(self.columns), len(names))[2]
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # left over by a publisher that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        buf = self.shm.buf
+        self._published, self.slot_seq, self.data = _views(buf, slots, len(self.columns), len(names))
+        self.slot_seq[:] = WRITING
+        self._published[0] = 0
+        buf[HEADER_SIZE:HEADER_SIZE + len(names)] = names
+        buf[:HEADER.size] = HEADER.pack(SHM_MAGIC, SHM_VERSION, slots, len(self.columns), len(names))
+        self.seq = 0
+        self.logger.info(f"[ShmPublisher] Publishing {len(self.columns)} columns x {slots} slots on {name}")
+
+    def publish_row(self, values):
+        """Publish one row of len(columns) values (numbers, numeric strings or None)."""
+        seq = self.seq
+        slot = seq % self.slots
+        self.slot_seq[slot] = WRITING
+        store_row(self.data, slot, values)
+        self.slot_seq[slot] = seq
+        self.seq = seq + 1
+        self._published[0] = self.seq
+
+    def publish(self, record):
+        self.publish_row(record_row(record, self.columns))
+
+    async def write(self, record):
+        self.publish(record)
+
+    def close(self):
+        self._published = self.slot_seq = self.data = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class ShmSubscriber:
+    """
+    Reads new records from the ring `name` in order.
+
+    Starts at the newest record (from_start=True: at the oldest one still in the ring).
+    A reader that falls more than a ring behind loses the overwritten records: it skips
+    to the oldest record still available and counts the gap in stats["overruns"]. Lag
+    beyond SLOW_READER_RATIO of the ring sets `slow` (and counts stats["slow_polls"]) so
+    the consumer can shed work before it overruns.
+    """
+    def __init__(self, name: str, from_start=False, max_batch=None):
+        self.shm = _attach(name)
+        buf = self.shm.buf
+        magic, version, slots, n_columns, names_len = HEADER.unpack(bytes(buf[:HEADER.size]))
+        if magic != SHM_MAGIC or version != SHM_VERSION:
+            self.shm.close()
+            raise ValueError(f"{name} is not a combined-record ring (version {SHM_VERSION})")
+        self.slots = slots
+        self.columns = json.loads(bytes(buf[HEADER_SIZE:HEADER_SIZE + names_len]))
+        self._published, self.slot_seq, self.data = _views(buf, slots, n_columns, names_len)
+        self.max_batch = max_batch or slots
+
+        head = int(self._published[0])
+        self.next = max(0, head - slots) if from_start else head
+        self.slow = False
+        self.stats = {"received": 0, "overruns": 0, "slow_polls": 0}
+
+    def lag(self):
+        return int(self._published[0]) - self.next
+
+    def poll(self):
+        """New records as a (rows, columns) array, oldest first, empty if there are none."""
+        head = int(self._published[0])
+        lag = head - self.next
+        self.slow = lag > self.slots * SLOW_READER_RATIO
+        if self.slow:
+            self.stats["slow_polls"] += 1
+        if lag > self.slots:
+            self._skip(head - self.slots)
+        end = min(head, self.next + self.max_batch)
+        if end <= self.next:
+            return self.data[:0].copy()
+
+        first = self.next
+        start, stop = first % self.slots, end % self.slots
+        if start < stop:
+            rows = self.data[start:stop].copy()
+        else:
+            rows = np.concatenate((self.data[start:], self.data[:stop]))
+
+        # the publisher overwrites in order, if the oldest copied row is intact so are the rest
+        if self.slot_seq[start] != first:
+            self._skip(int(self._published[0]) - self.slots + 1)
+            return self.poll()
+
+        self.next = end
+        self.stats["received"] += len(rows)
+        return rows
+
+    def _skip(self, to):
+        self.stats["overruns"] += to - self.next
+        self.next = to
+
+    def wait(self, timeout=None, interval=0.0005):
+        """Poll until there is at least one record or timeout (seconds) passes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            rows = self.poll()
+            if len(rows) or (deadline is not None and time.monotonic() >= deadline):
+                return rows
+            time.sleep(interval)
+
+    def close(self):
+        self._published = self.slot_seq = self.data = None
+        self.shm.close()
@@ -1,7 +1,21 @@
 import time
 
+CANDLE_SECONDS = 15 * 60
+DEFAULT_BUCKET_MS = 1000
 
-def curr_timestamp_15min() -> int:
-    now = int(time.time())
-    interval = 15 * 60
-    return now - (now % interval)
+
+def curr_timestamp_15min(now: float = None) -> int:
+    now = int(time.time() if now is None else now)
+    return now - (now % CANDLE_SECONDS)
+
+
+def bucket_ts(ms, bucket_ms: int = DEFAULT_BUCKET_MS):
+    """
+    Start of the bucket holding epoch milliseconds `ms`, in seconds: an int for
+    whole-second buckets (unchanged record format), a float for sub-second ones.
+    """
+    ms = int(ms)
+    start = ms - ms % bucket_ms
+    if bucket_ms % 1000 == 0:
+        return start // 1000
+    return start / 1000
@@ -1,41 +1,208 @@
 import os
 import json
+import time
 import logging
 import asyncio
 import traceback
 from datetime import datetime
-from app.core.time_utils import curr_timestamp_15min
+from collections import OrderedDict
+
+import zstandard
+
+from app.core.time_utils import curr_timestamp_15min, CANDLE_SECONDS
+from app.core.compression import ZSTD_EXT, ZSTD_LEVEL
+from app.core.metrics import KIND_COUNTER
+
+# what write() does when a bounded queue is full
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+
+# event-time partitioning: candle files kept open, and how long (event time) a past candle's
+# file stays open for stragglers after the newest record moved on
+MAX_OPEN_PARTITIONS = 3
+PARTITION_GRACE = 30  # seconds
+
+
+def candle_file_path(base_dir, name, candle_ts):
+    """Return base_dir/yyyy/mm/dd/hh/MM_<name> for a candle start, creating the folders."""
+    # Convert timestamp to a datetime object
+    dt = datetime.fromtimestamp(candle_ts)
+
+    # Create folder structure: base_dir/yyyy/mm/dd/hh
+    dir_path = os.path.join(
+        base_dir,
+        dt.strftime('%Y'),
+        dt.strftime('%m'),
+        dt.strftime('%d'),
+        dt.strftime('%H')
+    )
+    os.makedirs(dir_path, exist_ok=True)
+
+    # Create filename: MM_filename.jsonl (e.g., 15_polymarket.jsonl)
+    minute_prefix = dt.strftime('%M')
+    file_name = f"{minute_prefix}_{name}"
+
+    return os.path.join(dir_path, file_name)
+
+
+def check_task(task, name):
+    """Raise if the writer task died, instead of letting the caller fill the queue and block on it."""
+    if task is not None and task.done():
+        raise RuntimeError(f"writer task of {name} is not running") from task.exception()
+
+
+def release_queue(queue):
+    """Empty the queue of a dead writer task, waking blocked producers. Returns the records released."""
+    released = 0
+    while not queue.empty():
+        queue.get_nowait()
+        queue.task_done()
+        released += 1
+    return released
+
+
+async def drain_task(queue, task):
+    """Wait until the writer task wrote everything queued (or died), then cancel it."""
+    joined = asyncio.create_task(queue.join())
+    await asyncio.wait([joined, task], return_when=asyncio.FIRST_COMPLETED)
+    joined.cancel()
+    if task.done():
+        # failed, the error was logged by the task and is raised by write()
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
 
 
 class JSONLWriter:
-    def __init__(self, base_dir: str, name: str, file_rotation: bool = True, logger: logging.Logger = None):
+    def __init__(self, base_dir: str, name: str, file_rotation: bool = True, logger: logging.Logger = None,
+                 clock=time.time, batch_size: int = 1, max_queue: int = 0, overflow: str = OVERFLOW_BLOCK,
+                 flush_interval: float = None, flush_bytes: int = None, fsync: bool = False,
+                 compressor=None, compress_live: bool = False, metrics=None, partition_key: str = None,
+                 max_open_partitions: int = MAX_OPEN_PARTITIONS, partition_grace: float = PARTITION_GRACE):
         """
         base_dir: e.g. 'data'
         name: e.g. 'polymarket.json' (will be formatted as MM_polymarket.jsonl)
+        clock: returns current unix time, replay passes its event clock here
+        batch_size: max records drained from the queue and written with a single write() call
+        max_queue: queue bound, 0 is unbounded
+        overflow: OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST or OVERFLOW_DROP_NEWEST when the queue is full
+        flush_interval / flush_bytes: flush once this many seconds / bytes are pending,
+            if neither is set every batch is flushed (the defaults keep line-by-line behaviour)
+        fsync: fsync after each flush
+        compressor: FileCompressor that zstd-compresses each file once the candle rotates away from it
+        compress_live: write MM_<name>.zst directly, every flush ends a zstd frame so the file
+            stays readable while it grows
+        metrics: MetricsRegistry for queue depth, stats and batch write time, labelled file=<name>
+        partition_key: route every record to the candle file of its own timestamp (seconds) in this
+            field, e.g. "timestamp" or "ts", instead of the candle of the wall clock at write time.
+            Up to `max_open_partitions` candle files stay open (least recently used closed first); a
+            past candle's file is closed once the newest record is `partition_grace` seconds past its
+            end. A record for a candle that was already closed reopens its file in append mode and is
+            counted in stats["late_reopens"]; if that file went to the compressor, which reads and then
+            removes it, the record goes to a new part MM_<root>.late-N<ext> instead.
         """
         self.base_dir = base_dir
         self.name = name
 
-        self.queue = asyncio.Queue()
+        self.queue = asyncio.Queue(maxsize=max_queue)
         self._task = None
 
         self._current_ts = None
         self._file = None
+        self._file_path = None
 
         self.file_rotation = file_rotation
 
         self.logger = logger
+        self.clock = clock
+
+        self.batch_size = batch_size
+        self.overflow = overflow
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.fsync = fsync
+        self.compressor = compressor
+        self.compress_live = compress_live
+
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+
+        self.partition_key = partition_key
+        self.max_open_partitions = max_open_partitions
+        self.partition_grace = partition_grace
+        self._partitions = OrderedDict()  # candle_ts: (file, path), least recently used first
+        self._dirty = set()  # partition files written since the last flush
+        # candle_ts: late parts opened since its file was handed to the compressor (0: only the file itself)
+        self._submitted = {}
+        # the partition of the last record, so staying inside a candle costs two comparisons
+        self._part_start = self._part_end = 0
+        self._part_file = None
+        self._watermark = 0  # newest record timestamp
+
+        self.stats = {
+            "records": 0,
+            "batches": 0,
+            "max_batch": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "late_reopens": 0,
+        }
+
+        self.write_seconds = None
+        if metrics is not None:
+            metrics.callback("collector_writer_queue_depth", "Records waiting in the writer queue",
+                             self.queue.qsize, file=name)
+            for key in ("records", "dropped", "flushes"):
+                metrics.callback(f"collector_writer_{key}_total", f"JSONLWriter.stats[{key!r}]",
+                                 lambda key=key: self.stats[key], kind=KIND_COUNTER, file=name)
+            self.write_seconds = metrics.histogram(
+                "collector_writer_batch_seconds", "Time to serialize and write one batch", file=name
+            )
 
     async def start(self):
         if self._task is None:
             self._task = asyncio.create_task(self._writer())
 
+    @property
+    def task(self):
+        """The writer task once started; it only ends by failing, see write()."""
+        return self._task
+
+    async def stop(self):
+        """Drain the queue, stop the writer task and close the current file, handing it to the compressor."""
+        if self._task is None:
+            return
+        await drain_task(self.queue, self._task)
+        self._task = None
+        if self._file:
+            self._file.close()
+            self._file = None
+            self._current_ts = None
+            self._pending_bytes = 0
+            if self.compressor and not self.compress_live:
+                self.compressor.submit(self._file_path)
+        for candle_ts in list(self._partitions):
+            self._close_partition(candle_ts)
+
     async def write(self, obj):
-        await self.queue.put(obj)
+        check_task(self._task, self.name)
+        if self.overflow == OVERFLOW_BLOCK or not self.queue.full():
+            await self.queue.put(obj)
+            return
+
+        self.stats["dropped"] += 1
+        if self.overflow == OVERFLOW_DROP_OLDEST:
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.queue.put_nowait(obj)
 
     def _open_new_file(self):
         """Rotate file if candle changed and create yyyy/mm/dd/hh/ structure"""
-        candle_ts = curr_timestamp_15min()
+        candle_ts = curr_timestamp_15min(self.clock())
 
         if candle_ts == self._current_ts:
             return
@@ -43,46 +210,169 @@ class JSONLWriter:
         # Close old file if it exists
         if self._file:
             self._file.close()
+            self._pending_bytes = 0
+            if self.compressor and not self.compress_live:
+                self.compressor.submit(self._file_path)
 
-        # Convert timestamp to a datetime object
-        dt = datetime.fromtimestamp(candle_ts)
+        self._file, self._file_path = self._open_file(candle_ts)
+        self._current_ts = candle_ts
+        self.logger.info(f"[JSONLWriter] Switched to {self._file_path}")
 
-        # Create folder structure: base_dir/yyyy/mm/dd/hh
-        dir_path = os.path.join(
-            self.base_dir,
-            dt.strftime('%Y'),
-            dt.strftime('%m'),
-            dt.strftime('%d'),
-            dt.strftime('%H')
-        )
-        os.makedirs(dir_path, exist_ok=True)
+    def _open_file(self, candle_ts, part=0):
+        file_path = candle_file_path(self.base_dir, self.name, candle_ts)
+        if part:
+            # the candle's earlier files are being compressed and removed, never append to them
+            root, ext = os.path.splitext(file_path)
+            file_path = f"{root}.late-{part}{ext}"
 
-        # Create filename: MM_filename.jsonl (e.g., 15_polymarket.jsonl)
-        minute_prefix = dt.strftime('%M')
-        file_name = f"{minute_prefix}_{self.name}"
+        # Flushing is explicit, see _maybe_flush
+        if self.compress_live:
+            file_path += ZSTD_EXT
+            cctx = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+            return zstandard.open(file_path, "at", cctx=cctx, encoding="utf-8"), file_path
+        return open(file_path, "a", encoding="utf-8"), file_path
 
-        file_path = os.path.join(dir_path, file_name)
+    def _switch_partition(self, ts):
+        """Make the candle of ts the current partition, opening its file if needed."""
+        candle_ts = curr_timestamp_15min(ts)
+        if candle_ts in self._partitions:
+            self._partitions.move_to_end(candle_ts)
+        else:
+            if candle_ts + CANDLE_SECONDS <= self._watermark:
+                self.stats["late_reopens"] += 1
+                self.logger.warning(f"[JSONLWriter] Reopening closed candle {candle_ts} of {self.name} for a late record")
+            part = 0
+            if candle_ts in self._submitted:
+                part = self._submitted[candle_ts] = self._submitted[candle_ts] + 1
+            self._partitions[candle_ts] = self._open_file(candle_ts, part)
+            self.logger.info(f"[JSONLWriter] Opened {self._partitions[candle_ts][1]}")
+            while len(self._partitions) > self.max_open_partitions:
+                self._close_partition(next(iter(self._partitions)))
 
-        # Open with line buffering (buffering=1) for real-time safety
-        self._file = open(file_path, "a", encoding="utf-8", buffering=1)
+        self._part_start = candle_ts
+        self._part_end = candle_ts + CANDLE_SECONDS
+        self._part_file = self._partitions[candle_ts][0]
+        return self._part_file
 
-        self._current_ts = candle_ts
-        self.logger.info(f"[JSONLWriter] Switched to {file_path}")
+    def _close_partition(self, candle_ts):
+        f, path = self._partitions.pop(candle_ts)
+        self._dirty.discard(f)
+        f.close()
+        if f is self._part_file:
+            self._part_start = self._part_end = 0
+            self._part_file = None
+        if self.compressor and not self.compress_live:
+            self.compressor.submit(path)
+            self._submitted.setdefault(candle_ts, 0)
+
+    def _close_expired_partitions(self):
+        for candle_ts in [c for c in self._partitions if c + CANDLE_SECONDS + self.partition_grace <= self._watermark]:
+            self._close_partition(candle_ts)
+
+    def _write_partitioned(self, batch):
+        """Write each record to the file of its own candle, consecutive records of a candle in one write()."""
+        key = self.partition_key
+        start, end, f = self._part_start, self._part_end, self._part_file
+        watermark = self._watermark
+        lines = []
+        for obj in batch:
+            ts = obj.get(key)
+            if ts is None:
+                ts = self.clock()
+            if not start <= ts < end:
+                if lines:
+                    self._write_lines(f, lines)
+                    lines = []
+                f = self._switch_partition(ts)
+                start, end = self._part_start, self._part_end
+            if ts > watermark:
+                watermark = ts
+            lines.append(json.dumps(obj) + "\n")
+        self._write_lines(f, lines)
+
+        self._watermark = watermark
+        if len(self._partitions) > 1:
+            self._close_expired_partitions()
+
+    def _write_lines(self, f, lines):
+        data = "".join(lines)
+        f.write(data)
+        self._dirty.add(f)
+        self._pending_bytes += len(data)
+
+    def _flush(self):
+        for f in (self._dirty if self.partition_key else (self._file,)):
+            f.flush()
+            if self.compress_live:
+                f.buffer.flush(zstandard.FLUSH_FRAME)
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._dirty.clear()
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+        self.stats["flushes"] += 1
+
+    def _maybe_flush(self):
+        if self.flush_interval is None and self.flush_bytes is None:
+            self._flush()
+        elif self.flush_bytes is not None and self._pending_bytes >= self.flush_bytes:
+            self._flush()
+        elif self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval:
+            self._flush()
+
+    async def _next_batch(self):
+        if self._pending_bytes and self.flush_interval is not None:
+            # wake up to flush pending data when the stream goes quiet
+            try:
+                obj = await asyncio.wait_for(self.queue.get(), self.flush_interval)
+            except asyncio.TimeoutError:
+                self._flush()
+                obj = await self.queue.get()
+        else:
+            obj = await self.queue.get()
+
+        batch = [obj]
+        while len(batch) < self.batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
 
     async def _writer(self):
         try:
             while True:
-                obj = await self.queue.get()
+                batch = await self._next_batch()
+
+                started = time.perf_counter()
+                if self.partition_key:
+                    self._write_partitioned(batch)
+                    self._maybe_flush()
+                else:
+                    if self.file_rotation:
+                        self._open_new_file()
 
-                if self.file_rotation:
-                    self._open_new_file()
+                    # Ensure we have an open file before writing
+                    if not self._file:
+                        for _ in batch:
+                            self.queue.task_done()
+                        continue
+                    data = "".join([json.dumps(obj) + "\n" for obj in batch])
+                    self._file.write(data)
+                    self._pending_bytes += len(data)
+                    self._maybe_flush()
+                if self.write_seconds is not None:
+                    self.write_seconds.observe(time.perf_counter() - started)
 
-                # Ensure we have an open file before writing
-                if self._file:
-                    self._file.write(json.dumps(obj) + "\n")
+                self.stats["records"] += len(batch)
+                self.stats["batches"] += 1
+                if len(batch) > self.stats["max_batch"]:
+                    self.stats["max_batch"] = len(batch)
 
-                self.queue.task_done()
+                for _ in batch:
+                    self.queue.task_done()
 
         except Exception:
             self.logger.error(traceback.format_exc())
+            released = release_queue(self.queue)
+            self.stats["dropped"] += released
+            self.logger.error(f"[JSONLWriter] Writer task of {self.name} failed, {released} queued records "
+                              f"dropped, further writes raise")
             raise
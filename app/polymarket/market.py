@@ -1,9 +1,39 @@
-import time
+import os
 import json
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from app.core.time_utils import curr_timestamp_15min
 
+GAMMA_URL = os.environ.get("POLYMARKET_GAMMA_URL", "https://gamma-api.polymarket.com")
+HTTP_TIMEOUT = (3, 5)  # connect, read seconds
+HTTP_RETRIES = 3
+MARKET_CACHE_SIZE = 64
+
+_session = None
+_session_lock = threading.Lock()
+_market_cache = {}
+
+
+def get_session() -> requests.Session:
+    """Shared keep-alive session for the Gamma API, retrying connection errors and 429/5xx."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=HTTP_RETRIES,
+                backoff_factor=0.3,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET",),
+            )
+            _session = requests.Session()
+            _session.headers.update({"User-Agent": "Mozilla/5.0"})
+            _session.mount("https://", HTTPAdapter(max_retries=retry, pool_maxsize=8))
+        return _session
+
+
 def extract_asset_map(market_json):
     outcomes = json.loads(market_json["outcomes"])
     token_ids = json.loads(market_json["clobTokenIds"])
@@ -15,24 +45,33 @@ def extract_asset_map(market_json):
         for token_id, outcome in zip(token_ids, outcomes)
     }
 
-def get_ids():
-    curr_ts = curr_timestamp_15min()
-    slug = f"btc-updown-15m-{curr_ts}"
-    url = f"https://gamma-api.polymarket.com/markets/slug/{slug}"
 
-    headers = {"User-Agent": "Mozilla/5.0"}
-    response = requests.get(url, headers=headers)
-    data = response.json()
+def market_slug(asset: str, candle_ts: int) -> str:
+    return f"{asset}-updown-15m-{candle_ts}"
 
-    asset_id_maps = extract_asset_map(data)
-    return asset_id_maps
 
+def get_ids(asset="btc", candle_ts: int = None):
+    """
+    {token_id: outcome} for the asset's 15m market starting at candle_ts (default: current candle).
+
+    Token IDs never change for a market, so results are cached per slug; prefetching
+    the next candle makes the lookup at the boundary free.
+    """
+    if candle_ts is None:
+        candle_ts = curr_timestamp_15min()
+    slug = market_slug(asset, candle_ts)
+    if slug in _market_cache:
+        return _market_cache[slug]
+
+    url = f"{GAMMA_URL}/markets/slug/{slug}"
+    response = get_session().get(url, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
 
-def seconds_until_reconnect() -> int:
-    now = time.time()
-    interval = 15 * 60
+    asset_id_maps = extract_asset_map(data)
 
-    next_candle_start = now - (now % interval) + interval
-    reconnect_time = next_candle_start
+    _market_cache[slug] = asset_id_maps
+    while len(_market_cache) > MARKET_CACHE_SIZE:
+        _market_cache.pop(next(iter(_market_cache)))
+    return asset_id_maps
 
-    return int(reconnect_time - now) + 1
@@ -1,130 +1,519 @@
+import os
 import json
 import time
 import asyncio
-import requests
-import threading
-from websocket import WebSocketApp
+from collections import deque
 
-from app.polymarket.market import get_ids, seconds_until_reconnect
+import websockets
 
+from app.core.replay import STREAM_POLYMARKET, STREAM_POLYMARKET_IDS
+from app.core.decoding import DEFAULT_DECODER
+from app.core.metrics import StreamMetrics
+from app.core.time_utils import curr_timestamp_15min, bucket_ts, CANDLE_SECONDS, DEFAULT_BUCKET_MS
+from app.polymarket.market import get_ids
+from app.polymarket.book_aggregator import PolymarketBookAggregator
+
+POLYMARKET_URL = os.environ.get("POLYMARKET_WS_URL", "wss://ws-subscriptions-clob.polymarket.com")
 MAX_MESSAGE_SIZE = 2 * 1024 * 1024  # 2 MB
+PING_INTERVAL = 10  # seconds, the market channel expects a text "PING" and answers "PONG"
+RECONNECT_DELAY = 5  # seconds
+LOG_MESSAGE_CHARS = 200  # a failing frame is logged up to this many characters
+
+# rollover schedule, relative to the candle boundary
+PREFETCH_LEAD = 60  # next candle's token IDs are fetched this many seconds ahead
+OPEN_LEAD = 10  # the next subscription is opened this many seconds ahead
+CLOSE_TIMEOUT = 30  # the old subscription is closed after this even if the new one stays silent
+PREFETCH_RETRY = 5  # seconds between failed lookups
+
+
+async def _cancel(task):
+    """Cancel a background task and wait for it, whatever it raises is of no use any more."""
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
 
 
 class WebSocketOrderBook:
-    def __init__(self, channel_type, url, asset_id_maps, writer, loop, data_manager, logger):
+    def __init__(self, channel_type, url, asset_id_maps, writer, data_manager, logger, clock=time.time,
+                 capture=None, decoder=DEFAULT_DECODER, token_assets=None, data_managers=None, candle_ts=None,
+                 book_aggregator=None, bucket_ms=DEFAULT_BUCKET_MS, metrics=None):
+        """
+        asyncio client for one Polymarket channel subscription, runs on the same loop as the Binance listeners.
+
+        asset_id_maps: {token_id: outcome}
+        writer: per-stream output of the quotes, None skips it
+        token_assets / data_managers: {token_id: asset} and {asset: DataManager} when one
+            subscription covers several assets; tokens are then routed to their asset's DataManager
+        candle_ts: start of the candle the tokens trade in; quotes are only forwarded inside
+            [candle_ts, candle_ts + 15m), earlier ones are held back and released by activate()
+        book_aggregator: PolymarketBookAggregator fed from `book` / `price_change` events
+        bucket_ms: quotes are stamped with the start of their bucket, same width as the DataManager
+        metrics: MetricsRegistry for message, decode and reconnect series, None disables them
+        """
         self.channel_type = channel_type
         self.url = url
-        self.asset_id_maps = asset_id_maps
         self.writer = writer
-        self.loop = loop
         self.data_manager = data_manager
         self.logger = logger
+        self.clock = clock
+        self.bucket_ms = bucket_ms
+        self.capture = capture
+        self.decoder = decoder
+        self.data_managers = data_managers or {}
+        self.book_aggregator = book_aggregator or PolymarketBookAggregator()
+        self.stream_metrics = StreamMetrics(metrics, "polymarket") if metrics is not None else None
 
-        furl = url + "/ws/" + channel_type
-        self.ws = WebSocketApp(
-            furl,
-            on_message=self.on_message,
-            on_error=self.on_error,
-            on_close=self.on_close,
-            on_open=self.on_open,
-        )
-        self._stop_event = threading.Event()
+        self.asset_id_maps = {}
+        self.token_assets = {}
+        self.windows = {}  # {token_id: (start, end)} when tokens are bound to a candle
+        self._pending = {}  # latest quote per token received before its candle started
+        self._pending_books = set()  # tokens whose book changed before their candle started
+        self.set_markets(asset_id_maps, token_assets, candle_ts)
 
-    def on_message(self, ws, message):
+        self.ws_url = url + "/ws/" + channel_type
+        self.ws = None
+        self.first_message_at = None
+        self.first_message = asyncio.Event()
+        self._stop_event = asyncio.Event()
+
+    async def handle_message(self, message):
         try:
             if len(message) > MAX_MESSAGE_SIZE:
                 self.logger.warning(f"Polymarket message too large ({len(message)} bytes), skipping")
                 return
             if message == "PONG":
                 return
-            msg = json.loads(message)
-            if isinstance(msg, dict) and "event_type" in msg:
-                if msg.get("event_type") == "best_bid_ask":
-                    outcome = self.asset_id_maps.get(msg.get("asset_id"), "unknown")
-                    metrics = {
-                        "ts": int(time.time()),
-                        "source": "polymarket",
-                        "data": {
-                            "outcome": outcome,
-                            "best_bid": msg.get("best_bid"),
-                            "best_ask": msg.get("best_ask"),
-                        }
-                    }
-
-                    self.data_manager.get_pm_data(metrics)
-
-                    asyncio.run_coroutine_threadsafe(
-                        self.writer.write(metrics),
-                        self.loop
-                    )
+            sm = self.stream_metrics
+            if sm is not None:
+                received_at, started = time.time(), time.perf_counter()
+            events = self.decoder.polymarket_events(message)
+            if sm is not None:
+                sm.received(received_at, started, int(events[0].timestamp) if events and events[0].timestamp else None)
+            for msg in events:
+                event_type = msg.event_type
+                if event_type == "best_bid_ask":
+                    await self._on_best_bid_ask(msg)
+                elif event_type == "book":
+                    self.book_aggregator.apply_snapshot(msg.asset_id, msg.bids, msg.asks)
+                    self._emit_book(msg.asset_id)
+                elif event_type == "price_change":
+                    touched = set()
+                    for change in msg.price_changes or msg.changes:
+                        token_id = change.asset_id or msg.asset_id
+                        self.book_aggregator.apply_change(token_id, change.side, change.price, change.size)
+                        touched.add(token_id)
+                    for token_id in touched:
+                        self._emit_book(token_id)
 
         except Exception as e:
-            self.logger.error(f"Polymarket error: {e} on message {message}")
+            snippet = message[:LOG_MESSAGE_CHARS]
+            if len(message) > LOG_MESSAGE_CHARS:
+                snippet = f"{snippet}... ({len(message)} chars)"
+            self.logger.error(f"Polymarket error: {e} on message {snippet}")
+
+    def _ts(self):
+        return bucket_ts(self.clock() * 1000, self.bucket_ms)
+
+    def _state(self, token_id):
+        """-1 before the token's candle, 0 inside it (or unbound), 1 after it."""
+        window = self.windows.get(token_id)
+        if window is None:
+            return 0
+        now = self.clock()
+        if now < window[0]:
+            return -1
+        return 1 if now >= window[1] else 0
+
+    async def _on_best_bid_ask(self, msg):
+        state = self._state(msg.asset_id)
+        if state < 0:
+            self._pending[msg.asset_id] = msg
+            return
+        if state > 0:
+            return
+        if self._pending or self._pending_books:
+            await self.activate()
+        await self._emit(msg)
+
+    async def _emit(self, msg):
+        outcome = self.asset_id_maps.get(msg.asset_id, "unknown")
+        metrics = {
+            "ts": self._ts(),
+            "source": "polymarket",
+            "data": {
+                "outcome": outcome,
+                "best_bid": msg.best_bid,
+                "best_ask": msg.best_ask,
+            }
+        }
+
+        asset = self.token_assets.get(msg.asset_id)
+        if asset is not None:
+            metrics["asset"] = asset
+        self.data_managers.get(asset, self.data_manager).get_pm_data(metrics)
+
+        if self.writer is not None:
+            await self.writer.write(metrics)
+
+    def _emit_book(self, token_id):
+        """Pass the token's current book features to its DataManager, the last update in a second wins."""
+        state = self._state(token_id)
+        if state < 0:
+            self._pending_books.add(token_id)
+            return
+        if state > 0:
+            return
+        features = self.book_aggregator.features(token_id)
+        if features is None:
+            return
+
+        metrics = {
+            "ts": self._ts(),
+            "source": "polymarket_book",
+            "data": {"outcome": self.asset_id_maps.get(token_id, "unknown"), **features},
+        }
+        asset = self.token_assets.get(token_id)
+        self.data_managers.get(asset, self.data_manager).get_pm_book_data(metrics)
 
-    def on_error(self, ws, error):
-        self.logger.error(f"Error: {error}")
+    async def activate(self):
+        """Forward the quotes and books held back for tokens whose candle has started, stamped with the current time."""
+        now = self.clock()
+        for token_id, msg in list(self._pending.items()):
+            if now >= self.windows[token_id][0]:
+                del self._pending[token_id]
+                await self._emit(msg)
+        for token_id in list(self._pending_books):
+            if now >= self.windows[token_id][0]:
+                self._pending_books.discard(token_id)
+                self._emit_book(token_id)
 
-    def on_close(self, ws, close_status_code, close_msg):
-        self.logger.info(f"Polymarket closing: {close_status_code}, {close_msg}")
+    def set_markets(self, asset_id_maps, token_assets=None, candle_ts=None):
+        """
+        Switch to a new set of tokens. With candle_ts the tokens are added next to the
+        previous candle's, which stay live until the boundary (replaying recorded rollovers).
+        """
+        if candle_ts is None:
+            self.asset_id_maps = dict(asset_id_maps)
+            self.token_assets = dict(token_assets or {})
+            self.windows = {}
+            self._pending = {}
+            self._pending_books = set()
+            return
 
-    def on_open(self, ws):
-        ws.send(json.dumps({
+        # forget tokens of candles that are over
+        now = self.clock()
+        for token_id, (_, end) in list(self.windows.items()):
+            if end <= now:
+                del self.windows[token_id]
+                self.asset_id_maps.pop(token_id, None)
+                self.token_assets.pop(token_id, None)
+                self._pending.pop(token_id, None)
+                self._pending_books.discard(token_id)
+                self.book_aggregator.remove(token_id)
+
+        window = (candle_ts, candle_ts + CANDLE_SECONDS)
+        self.asset_id_maps.update(asset_id_maps)
+        self.token_assets.update(token_assets or {})
+        self.windows.update({token_id: window for token_id in asset_id_maps})
+
+    def subscription(self):
+        return json.dumps({
             "type": self.channel_type,
             "assets_ids": list(self.asset_id_maps.keys()),
             "custom_feature_enabled": True
-        }))
+        })
 
-    def run(self):
+    async def _pinger(self, ws):
+        while True:
+            await asyncio.sleep(PING_INTERVAL)
+            await ws.send("PING")
+
+    async def run(self):
+        """Subscribe and stream until disconnect(), reconnecting after errors."""
         while not self._stop_event.is_set():
-            self.logger.info("Starting WebSocket connection...")
-            self.ws.run_forever(ping_interval=30, ping_timeout=10)
-            
+            try:
+                self.logger.info("Starting WebSocket connection...")
+                async with websockets.connect(self.ws_url, max_size=MAX_MESSAGE_SIZE) as ws:
+                    self.ws = ws
+                    await ws.send(self.subscription())
+                    pinger = asyncio.create_task(self._pinger(ws))
+                    try:
+                        async for message in ws:
+                            if self.first_message_at is None:
+                                self.first_message_at = self.clock()
+                                self.first_message.set()
+                            if self.capture:
+                                self.capture.record(STREAM_POLYMARKET, message)
+                            await self.handle_message(message)
+                    finally:
+                        # a ping that failed because the connection dropped must not outlive it
+                        await _cancel(pinger)
+
+                self.logger.info(f"Polymarket closed: {ws.close_code}, {ws.close_reason}")
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Error: {e}")
+            finally:
+                self.ws = None
+
             if not self._stop_event.is_set():
-                self.logger.warning("WebSocket disconnected unexpectedly. Retrying in 5s...")
-                time.sleep(5)
-
-    def connect(self):
-        self._stop_event.clear()
-        self.ws.run_forever(
-            ping_interval=30, 
-            ping_timeout=10, 
-            reconnect=5
-        )
+                if self.stream_metrics is not None:
+                    self.stream_metrics.reconnects.inc()
+                self.logger.warning(f"WebSocket disconnected unexpectedly. Retrying in {RECONNECT_DELAY}s...")
+                try:
+                    await asyncio.wait_for(self._stop_event.wait(), RECONNECT_DELAY)
+                except asyncio.TimeoutError:
+                    pass
 
-    def disconnect(self):
+    async def disconnect(self):
         self._stop_event.set()
+        if self.ws is not None:
+            await self.ws.close()
+
+
+def fetch_markets(assets, candle_ts=None):
+    """
+    Look up the candle's market of every asset on its own, so one missing market does not
+    hold back the others. Returns ({token_id: outcome}, {token_id: asset}, {asset: error})
+    with the assets whose lookup failed in the last dict.
+    """
+    asset_id_maps = {}
+    token_assets = {}
+    failed = {}
+    for asset in assets:
         try:
-            self.ws.close()
-        except Exception:
-            pass
+            ids = get_ids(asset, candle_ts)
+        except Exception as e:
+            failed[asset] = e
+            continue
+        asset_id_maps.update(ids)
+        token_assets.update({token_id: asset for token_id in ids})
+    return asset_id_maps, token_assets, failed
+
+
+class CandleSubscriptions:
+    """
+    Subscriptions of one candle: one per group of assets whose markets resolved together,
+    and the task still looking up the assets that were not listed in time.
+    """
+    def __init__(self, candle_ts):
+        self.candle_ts = candle_ts
+        self.connections = []  # (WebSocketOrderBook, run task)
+        self.assets = set()  # assets with a subscription
+        self.late = None
+
+    async def activate(self):
+        for connection, _ in self.connections:
+            await connection.activate()
 
 
-def polymarket_runner(writer, loop, data_manager, logger):
-    url = "wss://ws-subscriptions-clob.polymarket.com"
+class RolloverScheduler:
+    """
+    Moves the Polymarket subscription to the next 15m markets without a gap.
 
-    while True:
+    Ahead of each boundary the next candle's token IDs are prefetched (PREFETCH_LEAD) and
+    a second subscription is opened (OPEN_LEAD). Quotes on it are held back until the
+    boundary, then released; the old subscription stops forwarding at the boundary and is
+    closed once the new one has delivered its first message.
+
+    Markets are looked up per asset: the subscription opens with the assets that resolved,
+    and an asset listed late gets its own subscription as soon as its lookup succeeds (until
+    its candle ends). A failing rollover step is logged and the schedule carries on.
+
+    gaps: measured rollover gaps in seconds, time from the boundary until the new
+    subscription was delivering (0.0 when it was live before the boundary).
+    """
+    def __init__(self, writer, data_manager, logger, capture=None, assets=("btc",), data_managers=None,
+                 url=POLYMARKET_URL, clock=time.time, bucket_ms=DEFAULT_BUCKET_MS, metrics=None):
+        self.writer = writer
+        self.data_manager = data_manager
+        self.logger = logger
+        self.capture = capture
+        self.assets = assets
+        self.data_managers = data_managers
+        self.url = url
+        self.clock = clock
+        self.bucket_ms = bucket_ms
+
+        self.gaps = deque(maxlen=96)
+        self.stats = {"rollovers": 0, "last_gap_s": None, "max_gap_s": 0.0, "prefetch_failures": 0,
+                      "late_markets": 0, "step_errors": 0}
+
+        self.metrics = metrics
+        if metrics is not None:
+            for key, kind in (("rollovers", "counter"), ("prefetch_failures", "counter"),
+                              ("late_markets", "counter"), ("step_errors", "counter"),
+                              ("last_gap_s", "gauge"), ("max_gap_s", "gauge")):
+                metrics.callback(
+                    f"collector_polymarket_{key}", f"RolloverScheduler.stats[{key!r}]",
+                    lambda key=key: self.stats[key] or 0, kind=kind
+                )
+
+    async def _sleep_until(self, t):
+        delay = t - self.clock()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _fetch(self, candle_ts, assets, deadline):
+        """
+        ({token_id: outcome}, {token_id: asset}, missing assets) for candle_ts; assets whose
+        lookup fails are retried every PREFETCH_RETRY seconds until the deadline.
+        """
+        asset_id_maps = {}
+        token_assets = {}
+        missing = list(assets)
+        while True:
+            # the Gamma API call is blocking, keep it off the loop
+            ids, assets_of, failed = await asyncio.to_thread(fetch_markets, missing, candle_ts)
+            asset_id_maps.update(ids)
+            token_assets.update(assets_of)
+            for asset, e in failed.items():
+                self.stats["prefetch_failures"] += 1
+                self.logger.warning(f"[Polymarket] {asset} market lookup for {candle_ts} failed: {e}")
+            missing = list(failed)
+            if not missing or self.clock() + PREFETCH_RETRY >= deadline:
+                return asset_id_maps, token_assets, missing
+            await asyncio.sleep(PREFETCH_RETRY)
+
+    def _open(self, subscriptions, asset_id_maps, token_assets):
+        candle_ts = subscriptions.candle_ts
+        self.logger.info(f"Polymarket IDs for {candle_ts}: {asset_id_maps}")
+        if self.capture:
+            self.capture.record(STREAM_POLYMARKET_IDS, json.dumps(
+                {"ids": asset_id_maps, "assets": token_assets, "candle_ts": candle_ts}
+            ))
+
+        connection = WebSocketOrderBook(
+            "market", self.url, asset_id_maps, self.writer, self.data_manager, self.logger,
+            clock=self.clock, capture=self.capture, token_assets=token_assets,
+            data_managers=self.data_managers, candle_ts=candle_ts, bucket_ms=self.bucket_ms, metrics=self.metrics
+        )
+        subscriptions.connections.append((connection, asyncio.create_task(connection.run())))
+        subscriptions.assets.update(token_assets.values())
+
+    async def _start(self, candle_ts, deadline):
+        """Subscribe to the candle's markets that resolve by the deadline, keep looking up the rest."""
+        subscriptions = CandleSubscriptions(candle_ts)
         try:
-            asset_id_maps = get_ids()
-            logger.info(f"Polymarket IDs: {asset_id_maps}")
+            asset_id_maps, token_assets, _ = await self._fetch(candle_ts, self.assets, deadline)
+            await self._sleep_until(candle_ts - OPEN_LEAD)
+            if asset_id_maps:
+                self._open(subscriptions, asset_id_maps, token_assets)
+        except asyncio.CancelledError:
+            await self._close(subscriptions)
+            raise
+        except Exception as e:
+            self.stats["step_errors"] += 1
+            self.logger.error(f"[Polymarket] subscribing to {candle_ts} failed: {e}")
 
-            market_connection = WebSocketOrderBook(
-                "market", url, asset_id_maps, writer, loop, data_manager, logger
-            )
+        missing = [asset for asset in self.assets if asset not in subscriptions.assets]
+        if missing:
+            self.logger.warning(f"[Polymarket] no market for {missing} at {candle_ts} yet, retrying")
+            subscriptions.late = asyncio.create_task(self._late(subscriptions, missing))
+        return subscriptions
 
-            t = threading.Thread(
-                target=market_connection.connect,
-                daemon=True
-            )
-            t.start()
+    async def _late(self, subscriptions, missing):
+        """Subscribe to each missing asset once its market is listed, until the candle ends."""
+        candle_ts = subscriptions.candle_ts
+        while missing and self.clock() + PREFETCH_RETRY < candle_ts + CANDLE_SECONDS:
+            await asyncio.sleep(PREFETCH_RETRY)
+            try:
+                asset_id_maps, token_assets, missing = await self._fetch(candle_ts, missing, deadline=self.clock())
+                if asset_id_maps:
+                    self._open(subscriptions, asset_id_maps, token_assets)
+                    self.stats["late_markets"] += len(set(token_assets.values()))
+            except Exception as e:
+                self.stats["step_errors"] += 1
+                self.logger.error(f"[Polymarket] late subscription for {candle_ts} failed: {e}")
+        if missing:
+            self.logger.warning(f"[Polymarket] no market for {missing} during candle {candle_ts}")
 
-            sleep_s = seconds_until_reconnect()
-            logger.info(f"[Polymarket] sleeping {sleep_s}s")
-            time.sleep(sleep_s)
+    async def _close(self, subscriptions):
+        # the late lookup first, it could still add a connection
+        if subscriptions.late is not None:
+            await _cancel(subscriptions.late)
+            subscriptions.late = None
+        for connection, task in subscriptions.connections:
+            try:
+                await connection.disconnect()
+            except Exception as e:
+                self.logger.warning(f"[Polymarket] closing subscription for {subscriptions.candle_ts}: {e}")
+            await asyncio.gather(task, return_exceptions=True)
+        subscriptions.connections.clear()
 
-            logger.info("[Polymarket] reconnecting")
-            market_connection.disconnect()
-            time.sleep(1)
+    async def _await_first_message(self, subscriptions):
+        """Wait (at most CLOSE_TIMEOUT) for the new subscription to deliver and record the gap."""
+        boundary = subscriptions.candle_ts
+        if not subscriptions.connections:
+            self.logger.warning(f"[Polymarket] no subscription for {boundary} at the boundary")
+            return
+        connection = subscriptions.connections[0][0]
+        try:
+            await asyncio.wait_for(connection.first_message.wait(), CLOSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        self._record_gap(connection, boundary)
+
+    def _record_gap(self, connection, boundary):
+        if connection.first_message_at is None:
+            self.logger.warning(f"[Polymarket] no message on the new subscription {CLOSE_TIMEOUT}s after rollover")
+            return
+        gap = max(0.0, connection.first_message_at - boundary)
+        self.gaps.append(gap)
+        self.stats["rollovers"] += 1
+        self.stats["last_gap_s"] = gap
+        self.stats["max_gap_s"] = max(self.stats["max_gap_s"], gap)
+        self.logger.info(
+            f"[Polymarket] rollover to {boundary}: gap {gap:.3f}s, "
+            f"first message {connection.first_message_at - boundary:+.3f}s from boundary"
+        )
 
+    async def _step(self, name, coro):
+        """Run one rollover step; an error is logged and counted, the schedule goes on."""
+        try:
+            await coro
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            logger.error(f"[Polymarket] error: {e}")
-            time.sleep(5)
+            self.stats["step_errors"] += 1
+            self.logger.error(f"[Polymarket] {name} failed: {e}")
+
+    async def run(self):
+        candle_ts = curr_timestamp_15min(self.clock())
+        # one lookup round now, assets that are missing are picked up by the late task
+        current = await self._start(candle_ts, deadline=self.clock())
+        nxt = None
+
+        try:
+            while True:
+                boundary = candle_ts + CANDLE_SECONDS
+
+                await self._sleep_until(boundary - PREFETCH_LEAD)
+                nxt = await self._start(boundary, deadline=boundary - OPEN_LEAD)
+
+                await self._sleep_until(boundary)
+                await self._step(f"activating {boundary}", nxt.activate())
+
+                # the old subscription is muted from the boundary on, close it once the new one is live
+                await self._step(f"waiting for {boundary}", self._await_first_message(nxt))
+                await self._step(f"closing {candle_ts}", self._close(current))
+
+                current, nxt = nxt, None
+                candle_ts = boundary
+        finally:
+            await self._close(current)
+            if nxt is not None:
+                await self._close(nxt)
+
+
+async def polymarket_runner(writer, data_manager, logger, capture=None, assets=("btc",), data_managers=None,
+                            bucket_ms=DEFAULT_BUCKET_MS, metrics=None):
+    """
+    One Polymarket subscription covering the 15m markets of all `assets`, rolled over
+    to the next markets at every candle boundary. With `data_managers` ({asset: DataManager})
+    quotes are routed per asset, otherwise everything goes to `data_manager`.
+    """
+    await RolloverScheduler(
+        writer, data_manager, logger, capture, assets, data_managers, bucket_ms=bucket_ms, metrics=metrics
+    ).run()
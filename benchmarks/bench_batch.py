@@ -0,0 +1,113 @@
+"""
+Parity check and timing of the vectorized batch engine against the streaming aggregators.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_batch.py
+"""
+import time
+
+import numpy as np
+
+from app.binance.aggregators.batch import l2_metrics, tape_metrics
+from app.binance.aggregators.l2_aggregator import L2Aggregator
+from app.binance.aggregators.tape_aggregator import TapeAggregator
+from app.core.time_utils import bucket_ts
+
+N_SECONDS = 20_000
+LEVELS = 10
+TOLERANCE = 1e-6
+BUCKET_WIDTHS = [1000, 250]  # ms
+
+
+def synthetic_trades(rng):
+    per_sec = rng.poisson(8, N_SECONDS)
+    # leave some seconds without trades, those produce no bucket
+    per_sec[rng.random(N_SECONDS) < 0.05] = 0
+    sec = np.repeat(np.arange(1_700_000_000, 1_700_000_000 + N_SECONDS), per_sec)
+    event_ms = sec * 1000 + np.sort(rng.integers(0, 1000, len(sec)))
+    price = 95000 + np.cumsum(rng.normal(0, 1, len(sec)))
+    qty = rng.exponential(0.05, len(sec))
+    is_buyer_maker = rng.random(len(sec)) < 0.5
+    return event_ms, price, qty, is_buyer_maker
+
+
+def synthetic_snapshots(rng):
+    n = N_SECONDS * 10
+    event_ms = 1_700_000_000_000 + np.arange(n) * 100
+    mid = 95000 + np.cumsum(rng.normal(0, 0.5, n))
+    offsets = 0.01 * np.arange(1, LEVELS + 1)
+    bid_px = mid[:, None] - offsets
+    ask_px = mid[:, None] + offsets
+    bid_qty = rng.uniform(0.01, 3, (n, LEVELS))
+    ask_qty = rng.uniform(0.01, 3, (n, LEVELS))
+    # thin books and empty snapshots
+    bid_px[rng.random(n) < 0.01, 5:] = np.nan
+    ask_px[rng.random(n) < 0.01, 0:] = np.nan
+    bid_qty[np.isnan(bid_px)] = np.nan
+    ask_qty[np.isnan(ask_px)] = np.nan
+    return event_ms, bid_px, bid_qty, ask_px, ask_qty
+
+
+def levels(px, qty):
+    return [(p, q) for p, q in zip(px, qty) if not np.isnan(p)]
+
+
+def compare(name, streamed, df):
+    assert len(streamed) == len(df), f"{name}: {len(streamed)} streamed vs {len(df)} batch buckets"
+    worst = 0.0
+    for m, row in zip(streamed, df.itertuples(index=False)):
+        row = row._asdict()
+        for k, v in row.items():
+            if k not in m:
+                assert np.isnan(v), f"{name}: {k} present in batch only at ts={row['ts']}"
+                continue
+            worst = max(worst, abs(m[k] - v))
+    assert worst < TOLERANCE, f"{name}: max abs diff {worst}"
+    return worst
+
+
+def run(bucket_ms):
+    rng = np.random.default_rng(7)
+
+    event_ms, price, qty, is_buyer_maker = synthetic_trades(rng)
+    start = time.perf_counter()
+    agg = TapeAggregator(bucket_ms=bucket_ms)
+    streamed = []
+    for t, p, q, m in zip(event_ms.tolist(), price.tolist(), qty.tolist(), is_buyer_maker.tolist()):
+        metrics = agg.update_trade(p, q, "sell" if m else "buy", bucket_ts(t, bucket_ms))
+        if metrics:
+            streamed.append(metrics)
+    t_stream = time.perf_counter() - start
+    start = time.perf_counter()
+    df = tape_metrics(event_ms, price, qty, is_buyer_maker, bucket_ms=bucket_ms)
+    t_batch = time.perf_counter() - start
+    diff = compare("tape", streamed, df)
+    print(f"{bucket_ms:>4}ms tape: {len(event_ms)} trades | streaming {t_stream:.2f}s | batch {t_batch:.3f}s | "
+          f"max abs diff {diff:.2e}")
+
+    event_ms, bid_px, bid_qty, ask_px, ask_qty = synthetic_snapshots(rng)
+    start = time.perf_counter()
+    agg = L2Aggregator(bucket_ms=bucket_ms)
+    streamed = []
+    for i, t in enumerate(event_ms.tolist()):
+        metrics = agg.update_l2(
+            levels(bid_px[i], bid_qty[i]), levels(ask_px[i], ask_qty[i]), bucket_ts(t, bucket_ms)
+        )
+        if metrics:
+            streamed.append(metrics)
+    t_stream = time.perf_counter() - start
+    start = time.perf_counter()
+    df = l2_metrics(event_ms, bid_px, bid_qty, ask_px, ask_qty, levels_used=LEVELS, bucket_ms=bucket_ms)
+    t_batch = time.perf_counter() - start
+    diff = compare("l2", streamed, df)
+    print(f"{bucket_ms:>4}ms   l2: {len(event_ms)} snapshots | streaming {t_stream:.2f}s | batch {t_batch:.3f}s | "
+          f"max abs diff {diff:.2e}")
+
+
+def main():
+    for bucket_ms in BUCKET_WIDTHS:
+        run(bucket_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+End-to-end throughput of the Binance path (decode, book, aggregators, DataManager join)
+at each aggregation bucket width, on a synthetic hour of depth and trade frames.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_bucket_width.py
+"""
+import json
+import time
+import random
+import asyncio
+
+from app.core.data_manager import DataManager
+from app.binance.listeners.l2_listener import L2Listener
+from app.binance.listeners.tape_listener import TapeListener
+from app.binance.aggregators.l2_aggregator import L2Aggregator
+from app.binance.aggregators.tape_aggregator import TapeAggregator
+
+BUCKET_WIDTHS = [100, 250, 500, 1000]  # ms
+N_SECONDS = 3600
+TRADES_PER_SEC = 20
+LEVELS_USED = 10
+
+
+class NullWriter:
+    def __init__(self):
+        self.records = 0
+
+    async def write(self, record):
+        self.records += 1
+
+
+def qty(rng):
+    # a quarter of the updates remove their level
+    return "0" if rng.random() < 0.25 else f"{rng.random() * 3:.4f}"
+
+
+def synthetic_frames(rng):
+    """(is_depth, frame) in event-time order: depth diffs every 100 ms plus Poisson-ish trades."""
+    start_ms = 1_700_000_000_000
+    mid = 95000.0
+    events = []
+    for i in range(N_SECONDS * 10):
+        t = start_ms + i * 100
+        mid += rng.gauss(0, 0.5)
+        events.append((t, True, json.dumps({
+            "e": "depthUpdate", "E": t, "s": "BTCUSDT", "U": i, "u": i,
+            "b": [[f"{mid - rng.randint(1, 30) * 0.01:.2f}", qty(rng)] for _ in range(8)],
+            "a": [[f"{mid + rng.randint(1, 30) * 0.01:.2f}", qty(rng)] for _ in range(8)],
+        })))
+    for _ in range(N_SECONDS * TRADES_PER_SEC):
+        t = start_ms + rng.randrange(N_SECONDS * 1000)
+        events.append((t, False, json.dumps({
+            "e": "trade", "E": t, "s": "BTCUSDT", "t": 0, "p": f"{mid + rng.gauss(0, 5):.2f}",
+            "q": f"{rng.expovariate(20):.5f}", "T": t, "m": rng.random() < 0.5, "M": True,
+        })))
+    events.sort(key=lambda e: e[0])
+    return [(is_depth, frame) for _, is_depth, frame in events]
+
+
+async def run(frames, bucket_ms):
+    sink = NullWriter()
+    dm = DataManager(sink, bucket_ms=bucket_ms)
+    l2 = L2Listener(None, LEVELS_USED, NullWriter(), L2Aggregator(LEVELS_USED, bucket_ms), dm)
+    tape = TapeListener(None, NullWriter(), TapeAggregator(bucket_ms), dm)
+    dm.add_closer(tape.close_until)
+
+    start = time.perf_counter()
+    for is_depth, frame in frames:
+        if is_depth:
+            await l2.handle_message(frame)
+        else:
+            await tape.handle_message(frame)
+    await dm.flush()
+    return time.perf_counter() - start, sink.records
+
+
+def main():
+    frames = synthetic_frames(random.Random(1))
+    print(f"{len(frames)} frames, {N_SECONDS}s of feed")
+    print(f"{'bucket':>7} | {'records':>8} | {'seconds':>7} | {'frames/s':>9} | {'us/frame':>8}")
+    for bucket_ms in BUCKET_WIDTHS:
+        elapsed, records = asyncio.run(run(frames, bucket_ms))
+        print(f"{bucket_ms:>5}ms | {records:>8} | {elapsed:>7.2f} | {len(frames) / elapsed:>9.0f} | "
+              f"{elapsed / len(frames) * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
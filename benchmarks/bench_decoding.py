@@ -0,0 +1,80 @@
+"""
+Per-message decode cost for depthUpdate, trade and best_bid_ask frames, for every installed
+decoder backend and for the json.loads + float() path the handlers used before.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_decoding.py
+"""
+import json
+import time
+import random
+
+from app.core.decoding import MessageDecoder, available_backends
+
+N_MESSAGES = 50_000
+
+
+def depth_frame(rng, i):
+    return json.dumps({
+        "e": "depthUpdate", "E": 1_700_000_000_000 + i * 100, "s": "BTCUSDT", "U": i, "u": i + 40,
+        "b": [[f"{95000 - rng.randint(1, 500) * 0.01:.2f}", f"{rng.random():.8f}"] for _ in range(20)],
+        "a": [[f"{95000 + rng.randint(1, 500) * 0.01:.2f}", f"{rng.random():.8f}"] for _ in range(20)],
+    })
+
+
+def trade_frame(rng, i):
+    return json.dumps({
+        "e": "trade", "E": 1_700_000_000_000 + i, "s": "BTCUSDT", "t": i, "p": f"{95000 + rng.random():.2f}",
+        "q": f"{rng.random():.8f}", "T": 1_700_000_000_000 + i, "m": rng.random() < 0.5, "M": True,
+    })
+
+
+def best_bid_ask_frame(rng, i):
+    return json.dumps({
+        "event_type": "best_bid_ask", "market": "0xabc", "asset_id": str(10 ** 70 + i % 2),
+        "best_bid": f"{rng.random():.2f}", "best_ask": f"{rng.random():.2f}", "spread": "0.01",
+        "timestamp": str(1_700_000_000_000 + i),
+    })
+
+
+def legacy_depth(raw):
+    data = json.loads(raw)
+    return data["E"], [(float(p), float(q)) for p, q in data["b"]], [(float(p), float(q)) for p, q in data["a"]]
+
+
+def legacy_trade(raw):
+    data = json.loads(raw)
+    return float(data["p"]), float(data["q"]), data["m"], data["T"]
+
+
+def legacy_best_bid_ask(raw):
+    msg = json.loads(raw)
+    if isinstance(msg, dict) and "event_type" in msg:
+        return msg.get("asset_id"), msg.get("best_bid"), msg.get("best_ask")
+
+
+def timed(fn, frames):
+    start = time.perf_counter()
+    for f in frames:
+        fn(f)
+    return (time.perf_counter() - start) / len(frames) * 1e6
+
+
+def main():
+    rng = random.Random(11)
+    cases = [
+        ("depthUpdate", [depth_frame(rng, i) for i in range(N_MESSAGES // 10)], legacy_depth, "depth"),
+        ("trade", [trade_frame(rng, i) for i in range(N_MESSAGES)], legacy_trade, "trade"),
+        ("best_bid_ask", [best_bid_ask_frame(rng, i) for i in range(N_MESSAGES)], legacy_best_bid_ask, "polymarket"),
+    ]
+    backends = available_backends()
+    print(f"{'message':>12} | {'legacy json':>11} | " + " | ".join(f"{b:>9}" for b in backends) + "   (us/msg)")
+    for name, frames, legacy, method in cases:
+        row = [timed(legacy, frames)]
+        for backend in backends:
+            row.append(timed(getattr(MessageDecoder(backend), method), frames))
+        print(f"{name:>12} | {row[0]:>11.2f} | " + " | ".join(f"{v:>9.2f}" for v in row[1:]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+FeatureRing write cost per combined record, ring queries checked against a plain list
+(across wrap-around), and Unix socket round-trip latency of FeatureClient queries.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_feature_server.py
+"""
+import os
+import time
+import random
+import asyncio
+import tempfile
+import threading
+
+import numpy as np
+
+from app.core.schema import COMBINED_FIELDS
+from app.core.feature_ring import FeatureRing
+from app.core.feature_server import FeatureServer, FeatureClient
+
+CAPACITY = 900
+N_RECORDS = 100_000
+N_QUERIES = 20_000
+START_TS = 1_700_000_000
+
+
+def synthetic_records(rng, n):
+    records = []
+    ts = START_TS
+    for _ in range(n):
+        # occasional gaps, so second-based and row-based windows differ
+        ts += 1 if rng.random() < 0.95 else rng.randint(2, 5)
+        record = {f: rng.random() for f in COMBINED_FIELDS if rng.random() < 0.95}
+        record["up_best_bid"] = f"{rng.random():.2f}"
+        record["timestamp"] = ts
+        records.append(record)
+    return records
+
+
+def check_parity(records):
+    ring = FeatureRing(CAPACITY)
+    kept = []
+    for i, record in enumerate(records[:5 * CAPACITY]):
+        ring.append(record)
+        kept = (kept + [record])[-CAPACITY:]
+        if i % 97:
+            continue
+        ts = [r["timestamp"] for r in kept]
+        assert ring.latest()[0, 0] == ts[-1]
+        for k in (1, 60, CAPACITY, CAPACITY + 10):
+            assert list(ring.last(k)[:, 0]) == ts[-k:]
+        for seconds in (1, 60, 300, 10_000):
+            assert list(ring.last_seconds(seconds)[:, 0]) == [t for t in ts if t > ts[-1] - seconds]
+        row = ring.latest()[0]
+        col = ring.columns.index("up_best_bid")
+        assert row[col] == float(kept[-1]["up_best_bid"])
+
+
+def client_latency(path, results):
+    client = FeatureClient(path)
+    columns = client.columns("btc")
+    for name, query in (("latest", lambda: client.latest("btc")),
+                        ("last 60", lambda: client.last("btc", 60)),
+                        ("last 900s", lambda: client.last_seconds("btc", 900))):
+        samples = np.empty(N_QUERIES)
+        for i in range(N_QUERIES):
+            start = time.perf_counter()
+            rows = query()
+            samples[i] = time.perf_counter() - start
+        assert rows.shape[1] == len(columns)
+        results[name] = samples
+    client.close()
+
+
+async def serve(records, path):
+    ring = FeatureRing(CAPACITY)
+    for record in records[:CAPACITY]:
+        ring.append(record)
+    server = FeatureServer(path, {"btc": ring})
+    await server.start()
+
+    results = {}
+    thread = threading.Thread(target=client_latency, args=(path, results))
+    thread.start()
+    while thread.is_alive():
+        await asyncio.sleep(0.01)
+    await server.stop()
+    return results
+
+
+def main():
+    records = synthetic_records(random.Random(9), N_RECORDS)
+
+    check_parity(records)
+    print("ring queries match a plain list: ok")
+
+    ring = FeatureRing(CAPACITY)
+    start = time.perf_counter()
+    for record in records:
+        ring.append(record)
+    elapsed = time.perf_counter() - start
+    print(f"append: {elapsed / len(records) * 1e6:.2f} us/record ({len(ring.columns)} columns)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = asyncio.run(serve(records, os.path.join(tmp, "features.sock")))
+    for name, samples in results.items():
+        p50, p99 = np.percentile(samples, [50, 99]) * 1e6
+        print(f"{name:>10}: p50 {p50:.1f} us, p99 {p99:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+CPU cost of the L2 path (decode, book, top levels, aggregator) per `L2Listener` mode on a
+synthetic high-volatility hour: depth diffs every 100 ms with many levels near a fast-moving
+touch. Conflated output is checked against snapshot mode, and the time-weighted average
+against a reference that re-reads the top levels after every diff.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_l2_modes.py
+"""
+import json
+import time
+import random
+import asyncio
+
+from app.core.decoding import MessageDecoder
+from app.core.order_book import BookSide
+from app.core.time_utils import bucket_ts
+from app.binance.listeners.l2_listener import L2Listener, L2_MODES, L2_MODE_SNAPSHOT, L2_MODE_CONFLATED, L2_MODE_TWAL
+from app.binance.aggregators.l2_aggregator import L2Aggregator
+
+N_SECONDS = 3600
+LEVELS_PER_SIDE = 40
+LEVELS_USED = 10
+BUCKET_MS = 1000
+START_MS = 1_700_000_000_000
+
+
+class CollectingManager:
+    def __init__(self):
+        self.records = []
+
+    async def get_l2_data(self, metrics):
+        self.records.append(dict(metrics))
+
+
+class NullWriter:
+    async def write(self, record):
+        pass
+
+
+def qty(rng):
+    # a quarter of the updates remove their level
+    return "0" if rng.random() < 0.25 else f"{rng.random() * 3:.4f}"
+
+
+def synthetic_frames(rng):
+    mid = 95000.0
+    frames = []
+    for i in range(N_SECONDS * 10):
+        # irregular spacing inside the 100 ms cadence so the time weights differ
+        t = START_MS + i * 100 + rng.randrange(100)
+        mid += rng.gauss(0, 5)
+        frames.append(json.dumps({
+            "e": "depthUpdate", "E": t, "s": "BTCUSDT", "U": i, "u": i,
+            "b": [[f"{mid - rng.randint(1, 200) * 0.01:.2f}", qty(rng)] for _ in range(LEVELS_PER_SIDE)],
+            "a": [[f"{mid + rng.randint(1, 200) * 0.01:.2f}", qty(rng)] for _ in range(LEVELS_PER_SIDE)],
+        }))
+    return frames
+
+
+async def run(frames, mode):
+    dm = CollectingManager()
+    listener = L2Listener(None, LEVELS_USED, NullWriter(), L2Aggregator(LEVELS_USED, BUCKET_MS), dm, mode=mode)
+    start = time.process_time()
+    for frame in frames:
+        await listener.handle_message(frame)
+    return time.process_time() - start, dm.records
+
+
+def reference_twal(frames):
+    """{bucket ts: averaged liquidity}, top levels re-read after every diff."""
+    decoder = MessageDecoder()
+    aggregator = L2Aggregator(LEVELS_USED, BUCKET_MS)
+    bids, asks = BookSide(descending=True), BookSide()
+    sums, liq, last_ms, bucket = {}, None, None, None
+
+    def hold(until_ms):
+        if liq is not None and until_ms > last_ms:
+            acc = sums.setdefault(bucket, [0.0] * 5)
+            for i, v in enumerate(liq):
+                acc[i] += v * (until_ms - last_ms)
+            acc[4] += until_ms - last_ms
+
+    for frame in frames:
+        data = decoder.depth(frame)
+        ts = bucket_ts(data.E, BUCKET_MS)
+        if bucket is not None and ts != bucket:
+            hold(bucket * 1000 + BUCKET_MS)
+            last_ms = ts * 1000
+        bucket = ts
+        if last_ms is not None:
+            hold(data.E)
+        last_ms = data.E
+        for p, q in data.b:
+            bids.update(p, q)
+        for p, q in data.a:
+            asks.update(p, q)
+        liq = aggregator.liquidity(bids.top(LEVELS_USED), asks.top(LEVELS_USED)) if bids and asks else None
+    return {ts: [v / acc[4] for v in acc[:4]] for ts, acc in sums.items()}
+
+
+def main():
+    frames = synthetic_frames(random.Random(3))
+    print(f"{len(frames)} depth frames, {N_SECONDS}s of feed, {LEVELS_PER_SIDE} levels per side")
+
+    results = {mode: asyncio.run(run(frames, mode)) for mode in L2_MODES}
+
+    assert results[L2_MODE_CONFLATED][1] == results[L2_MODE_SNAPSHOT][1]
+    print("conflated == snapshot: ok")
+
+    # the last bucket is never closed and the first one is only partly covered
+    expected = reference_twal(frames)
+    for record in results[L2_MODE_TWAL][1][1:]:
+        want = expected[record["ts"]]
+        assert abs(record["bid_liq"] - want[0]) < 1e-6 and abs(record["ask_liq"] - want[1]) < 1e-6, record["ts"]
+    print("twal == per-diff reference: ok")
+
+    base = results[L2_MODE_SNAPSHOT][0]
+    print(f"{'mode':>10} | {'cpu s':>6} | {'us/frame':>8} | {'saved':>6}")
+    for mode, (cpu, _) in results.items():
+        print(f"{mode:>10} | {cpu:>6.2f} | {cpu / len(frames) * 1e6:>8.1f} | {1 - cpu / base:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
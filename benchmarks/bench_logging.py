@@ -0,0 +1,122 @@
+"""
+Event loop lag during a malformed-message storm, with log output that stalls.
+
+Malformed depth and trade frames plus oversized broken Polymarket frames arrive at
+FLOOD_RATE per second for DURATION seconds; every one of them logs a warning or an error.
+The handler sleeps STALL per record, like a full disk or a blocked stdout pipe. Loop lag is
+the delay of a 5 ms sleep on the same loop, as LoopLagMonitor measures it in the collector.
+
+Modes: handlers on the loop thread (the old setup_logger) or behind a QueueHandler, each
+with and without the per-call-site rate limit.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_logging.py
+"""
+import time
+import asyncio
+import logging
+
+import numpy as np
+
+from app.core.logger import configure_logger, LOG_FORMAT
+from app.polymarket.websocket_ob import WebSocketOrderBook
+from app.binance.listeners.l2_listener import L2Listener
+from app.binance.listeners.tape_listener import TapeListener
+from app.binance.aggregators.l2_aggregator import L2Aggregator
+from app.binance.aggregators.tape_aggregator import TapeAggregator
+
+FLOOD_RATE = 2000  # frames/s
+DURATION = 3  # seconds per mode
+TICK = 0.01
+STALL = 0.001  # seconds per emitted record
+LAG_INTERVAL = 0.005
+BAD_DEPTH = '{"e": "depthUpdate", "E": "x", "b": [[1]]}'
+BAD_TRADE = '{"e": "trade", "T": 1}'
+BAD_POLYMARKET = '[{"event_type": "book", "asset_id": "1", "bids": [{"price": "x"}]}' + " " * 50_000 + "]"
+MODES = [
+    ("loop thread", False, False),
+    ("loop thread, rate limited", False, True),
+    ("queue", True, False),
+    ("queue, rate limited", True, True),
+]
+
+
+class StallingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.stall = STALL
+        self.records = 0
+
+    def emit(self, record):
+        self.format(record)
+        self.records += 1
+        if self.stall:
+            time.sleep(self.stall)
+
+
+class NullWriter:
+    async def write(self, record):
+        pass
+
+
+async def lag_monitor(samples, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(time.perf_counter() - start - LAG_INTERVAL)
+
+
+async def flood(logger):
+    l2 = L2Listener(None, 10, NullWriter(), L2Aggregator(), None, logger)
+    tape = TapeListener(None, NullWriter(), TapeAggregator(), None, logger)
+    polymarket = WebSocketOrderBook("market", "", {}, NullWriter(), None, logger)
+    frames = [(l2, BAD_DEPTH), (tape, BAD_TRADE), (polymarket, BAD_POLYMARKET)]
+    per_tick = int(FLOOD_RATE * TICK)
+    sent = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < DURATION:
+        for _ in range(per_tick):
+            handler, frame = frames[sent % len(frames)]
+            await handler.handle_message(frame)
+            sent += 1
+        await asyncio.sleep(TICK)
+    return sent, time.perf_counter() - start
+
+
+async def run(name, use_queue, rate_limit):
+    logger = logging.getLogger(f"bench_logging.{name}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = StallingHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = configure_logger(logger, [handler], use_queue=use_queue, rate_limit=rate_limit)
+
+    samples, stop = [], asyncio.Event()
+    monitor = asyncio.create_task(lag_monitor(samples, stop))
+    sent, elapsed = await flood(logger)
+    stop.set()
+    await monitor
+
+    written = handler.records
+    dropped = next((h.dropped for h in logger.handlers if hasattr(h, "dropped")), 0)
+    suppressed = sum(getattr(f, "suppressed", 0) for f in logger.filters)
+    if listener is not None:
+        # let the writer thread finish without stalling
+        handler.stall = 0
+        listener.stop()
+    return np.array(samples), sent / elapsed, written, suppressed, dropped
+
+
+def main():
+    print(f"{FLOOD_RATE} bad frames/s for {DURATION}s, handler stalls {STALL * 1000:.0f} ms per record")
+    print(f"{'mode':>26} | {'lag p50 ms':>10} | {'p99 ms':>7} | {'max ms':>7} | {'frames/s':>8} | "
+          f"{'written':>7} | {'suppressed':>10} | {'dropped':>7}")
+    for name, use_queue, rate_limit in MODES:
+        lag, rate, written, suppressed, dropped = asyncio.run(run(name, use_queue, rate_limit))
+        p50, p99, worst = np.percentile(lag, [50, 99, 100]) * 1000
+        print(f"{name:>26} | {p50:>10.2f} | {p99:>7.1f} | {worst:>7.1f} | {rate:>8.0f} | "
+              f"{written:>7} | {suppressed:>10} | {dropped:>7}")
+
+
+if __name__ == "__main__":
+    main()
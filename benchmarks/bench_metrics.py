@@ -0,0 +1,116 @@
+"""
+Overhead of the metrics instrumentation on the Binance hot path (combined frame → depth /
+trade listener → aggregator → DataManager), with and without a MetricsRegistry, plus a
+scrape of the HTTP endpoint checked against the counts fed in.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_metrics.py
+"""
+import json
+import time
+import random
+import asyncio
+
+from app.core.metrics import MetricsRegistry, MetricsServer, LoopLagMonitor
+from app.core.data_manager import DataManager
+from app.binance.listeners.l2_listener import L2Listener
+from app.binance.listeners.tape_listener import TapeListener
+from app.binance.listeners.combined_listener import CombinedStreamListener, depth_stream, trade_stream
+from app.binance.aggregators.l2_aggregator import L2Aggregator
+from app.binance.aggregators.tape_aggregator import TapeAggregator
+
+N_SECONDS = 1800
+TRADES_PER_SECOND = 20
+LEVELS_USED = 10
+SYMBOL = "btcusdt"
+START_MS = 1_700_000_000_000
+REPEATS = 3
+
+
+class NullWriter:
+    name = "null"
+
+    async def write(self, record):
+        pass
+
+
+def synthetic_frames(rng):
+    mid = 95000.0
+    frames = []
+    for s in range(N_SECONDS):
+        for i in range(10):
+            t = START_MS + s * 1000 + i * 100
+            mid += rng.gauss(0, 2)
+            frames.append(json.dumps({"stream": depth_stream(SYMBOL), "data": {
+                "e": "depthUpdate", "E": t, "s": "BTCUSDT", "U": t, "u": t,
+                "b": [[f"{mid - rng.randint(1, 50) * 0.01:.2f}", f"{rng.random():.4f}"] for _ in range(10)],
+                "a": [[f"{mid + rng.randint(1, 50) * 0.01:.2f}", f"{rng.random():.4f}"] for _ in range(10)],
+            }}))
+        for i in range(TRADES_PER_SECOND):
+            t = START_MS + s * 1000 + i * (1000 // TRADES_PER_SECOND)
+            frames.append(json.dumps({"stream": trade_stream(SYMBOL), "data": {
+                "e": "trade", "E": t, "T": t, "s": "BTCUSDT", "p": f"{mid:.2f}",
+                "q": f"{rng.random():.4f}", "m": rng.random() < 0.5,
+            }}))
+    return frames
+
+
+def pipeline(metrics):
+    dm = DataManager(NullWriter(), metrics=metrics)
+    l2 = L2Listener(None, LEVELS_USED, NullWriter(), L2Aggregator(LEVELS_USED), dm, metrics=metrics)
+    tape = TapeListener(None, NullWriter(), TapeAggregator(), dm, metrics=metrics)
+    dm.add_closer(tape.close_until)
+    return CombinedStreamListener("", {SYMBOL: l2}, {SYMBOL: tape}, metrics=metrics), dm
+
+
+async def run(frames, metrics):
+    listener, dm = pipeline(metrics)
+    start = time.process_time()
+    for frame in frames:
+        await listener.handle_message(frame)
+    return time.process_time() - start, dm.stats["records"]
+
+
+async def scrape(registry, port):
+    server = MetricsServer(registry, port=port)
+    await server.start()
+    lag_task = asyncio.create_task(LoopLagMonitor(registry, interval=0.01).run())
+    await asyncio.sleep(0.1)
+    reader, writer = await asyncio.open_connection(server.host, port)
+    writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    response = (await reader.read()).decode()
+    writer.close()
+    lag_task.cancel()
+    await server.stop()
+    return response
+
+
+def main():
+    frames = synthetic_frames(random.Random(5))
+    print(f"{len(frames)} combined frames, {N_SECONDS}s of feed")
+
+    timings = {"off": [], "on": []}
+    for _ in range(REPEATS):
+        for label in timings:
+            registry = MetricsRegistry() if label == "on" else None
+            cpu, records = asyncio.run(run(frames, registry))
+            timings[label].append(cpu)
+    off, on = min(timings["off"]), min(timings["on"])
+    print(f"metrics off: {off / len(frames) * 1e6:.2f} us/frame")
+    print(f"metrics on:  {on / len(frames) * 1e6:.2f} us/frame ({on / off - 1:+.1%})")
+
+    response = asyncio.run(scrape(registry, random.randint(20000, 40000)))
+    head, body = response.split("\r\n\r\n", 1)
+    assert head.startswith("HTTP/1.1 200") and "version=0.0.4" in head
+    samples = dict(line.rsplit(" ", 1) for line in body.splitlines() if not line.startswith("#"))
+    n_depth = len(frames) - N_SECONDS * TRADES_PER_SECOND
+    assert float(samples['collector_messages_total{stream="binance_combined"}']) == len(frames)
+    assert float(samples['collector_messages_total{stream="binance_depth"}']) == n_depth
+    assert float(samples['collector_decode_seconds_count{stream="binance_trade"}']) == N_SECONDS * TRADES_PER_SECOND
+    assert float(samples['collector_join_records_total{file="null"}']) == records
+    assert float(samples["collector_event_loop_lag_seconds_count"]) > 0
+    print(f"scrape: {len(samples)} samples, counts match: ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Compares the dict + full sort book used by L2Listener originally against BookSide.
+
+Each synthetic depth diff touches levels near the touch (as Binance @depth@100ms
+mostly does) and is followed by a top-N read of both sides.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_order_book.py
+"""
+import time
+import random
+from collections import defaultdict
+
+from app.core.order_book import BookSide
+from app.binance.listeners.l2_listener import get_top_levels
+
+MID = 95000.0
+TICK = 0.01
+LEVELS_USED = 10
+UPDATES_PER_MSG = 20
+BOOK_SIZES = [1_000, 5_000, 10_000, 50_000]
+
+
+def make_book(n, rng):
+    bids = [(round(MID - TICK * (i + 1), 2), rng.uniform(0.001, 5)) for i in range(n)]
+    asks = [(round(MID + TICK * (i + 1), 2), rng.uniform(0.001, 5)) for i in range(n)]
+    return bids, asks
+
+
+def make_diffs(n_msgs, rng):
+    diffs = []
+    for _ in range(n_msgs):
+        b, a = [], []
+        for _ in range(UPDATES_PER_MSG):
+            side = b if rng.random() < 0.5 else a
+            sign = -1 if side is b else 1
+            price = round(MID + sign * TICK * rng.randint(1, 200), 2)
+            qty = 0.0 if rng.random() < 0.2 else rng.uniform(0.001, 5)
+            side.append((price, qty))
+        diffs.append((b, a))
+    return diffs
+
+
+def run_dict(book_bids, book_asks, diffs):
+    bids, asks = defaultdict(float), defaultdict(float)
+    bids.update(book_bids)
+    asks.update(book_asks)
+
+    start = time.perf_counter()
+    for b, a in diffs:
+        for p, q in b:
+            if q == 0:
+                bids.pop(p, None)
+            else:
+                bids[p] = q
+        for p, q in a:
+            if q == 0:
+                asks.pop(p, None)
+            else:
+                asks[p] = q
+        top_bids = get_top_levels(bids, reverse=True, n=LEVELS_USED)
+        top_asks = get_top_levels(asks, reverse=False, n=LEVELS_USED)
+    return time.perf_counter() - start, top_bids, top_asks
+
+
+def run_book_side(book_bids, book_asks, diffs, max_levels=None):
+    bids = BookSide(descending=True, max_levels=max_levels)
+    asks = BookSide(descending=False, max_levels=max_levels)
+    for p, q in book_bids:
+        bids.update(p, q)
+    for p, q in book_asks:
+        asks.update(p, q)
+
+    start = time.perf_counter()
+    for b, a in diffs:
+        for p, q in b:
+            bids.update(p, q)
+        for p, q in a:
+            asks.update(p, q)
+        top_bids = bids.top(LEVELS_USED)
+        top_asks = asks.top(LEVELS_USED)
+    return time.perf_counter() - start, top_bids, top_asks
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'levels':>8} | {'dict+sort us/msg':>16} | {'BookSide us/msg':>15} | {'speedup':>7}")
+    for n in BOOK_SIZES:
+        book_bids, book_asks = make_book(n, rng)
+        n_msgs = max(200, 2_000_000 // n)
+        diffs = make_diffs(n_msgs, rng)
+
+        t_dict, db, da = run_dict(book_bids, book_asks, diffs)
+        t_book, bb, ba = run_book_side(book_bids, book_asks, diffs)
+        assert db == bb and da == ba, "top levels differ between implementations"
+
+        us_dict = t_dict / n_msgs * 1e6
+        us_book = t_book / n_msgs * 1e6
+        print(f"{n:>8} | {us_dict:>16.1f} | {us_book:>15.2f} | {us_dict / us_book:>6.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Storage size and pandas load time of a day of combined records: JSONLWriter vs ParquetWriter.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_parquet.py
+"""
+import os
+import glob
+import time
+import random
+import asyncio
+import logging
+import tempfile
+
+import pandas as pd
+
+from app.core.replay import ReplayClock
+from app.core.writer import JSONLWriter
+from app.core.parquet_writer import ParquetWriter
+from app.core.schema import COMBINED_FIELDS, POLYMARKET_FIELDS
+
+N_SECONDS = 86_400
+START_TS = 1_700_000_100
+
+
+def synthetic_records(rng):
+    for i in range(N_SECONDS):
+        rec = {"timestamp": START_TS + i}
+        for name in COMBINED_FIELDS:
+            rec[name] = f"{rng.random():.2f}" if name in POLYMARKET_FIELDS else rng.gauss(0, 1)
+        yield rec
+
+
+async def write_all(writer, clock, records):
+    await writer.start()
+    for rec in records:
+        clock.now = rec["timestamp"]
+        await writer.write(rec)
+        await asyncio.sleep(0)
+    await writer.stop()
+
+
+def folder_size(path, pattern):
+    files = glob.glob(os.path.join(path, "**", pattern), recursive=True)
+    return files, sum(os.path.getsize(f) for f in files)
+
+
+async def main():
+    records = list(synthetic_records(random.Random(5)))
+    logger = logging.getLogger("bench")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for fmt, cls, name, loader in [
+            ("jsonl", JSONLWriter, "combined_data.jsonl", lambda f: pd.read_json(f, lines=True)),
+            ("parquet", ParquetWriter, "combined_data.parquet", pd.read_parquet),
+        ]:
+            clock = ReplayClock()
+            out = os.path.join(tmp, fmt)
+            start = time.perf_counter()
+            await write_all(cls(out, name, logger=logger, clock=clock), clock, records)
+            t_write = time.perf_counter() - start
+
+            files, size = folder_size(out, f"*_{name}")
+            start = time.perf_counter()
+            df = pd.concat([loader(f) for f in sorted(files)], ignore_index=True)
+            t_load = time.perf_counter() - start
+            assert len(df) == N_SECONDS
+            results[fmt] = (size, t_load)
+            print(f"{fmt:>8}: {len(files)} files, {size / 1e6:.1f} MB | write {t_write:.1f}s | load {t_load:.2f}s")
+
+        (j_size, j_load), (p_size, p_load) = results["jsonl"], results["parquet"]
+        print(f"parquet is {j_size / p_size:.1f}x smaller and loads {j_load / p_load:.1f}x faster")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""
+Per-event cost of maintaining Polymarket books from `book` / `price_change` frames and
+computing depth features after every event, checked against a naive dict book that is
+re-sorted on each read.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_pm_book.py
+"""
+import json
+import time
+import random
+
+from app.core.decoding import MessageDecoder
+from app.polymarket.book_aggregator import PolymarketBookAggregator, DEPTH_LEVELS
+
+N_EVENTS = 100_000
+TOKENS = ["up", "down"]
+
+
+def ticks(lo, hi):
+    return [round(i * 0.01, 2) for i in range(lo, hi)]
+
+
+def book_frame(rng, token):
+    return json.dumps({
+        "event_type": "book", "asset_id": token, "market": "0xabc", "timestamp": "0", "hash": "0x0",
+        "bids": [{"price": f"{p:.2f}", "size": f"{rng.uniform(1, 500):.2f}"} for p in ticks(1, 50)],
+        "asks": [{"price": f"{p:.2f}", "size": f"{rng.uniform(1, 500):.2f}"} for p in ticks(51, 100)],
+    })
+
+
+def price_change_frame(rng, i):
+    changes = []
+    for token in TOKENS:
+        side = "BUY" if rng.random() < 0.5 else "SELL"
+        price = rng.choice(ticks(1, 50) if side == "BUY" else ticks(51, 100))
+        size = 0.0 if rng.random() < 0.1 else rng.uniform(1, 500)
+        changes.append({"asset_id": token, "price": f"{price:.2f}", "size": f"{size:.2f}", "side": side,
+                        "hash": "0x0", "best_bid": "0.49", "best_ask": "0.51"})
+    return json.dumps({"event_type": "price_change", "market": "0xabc", "price_changes": changes,
+                       "timestamp": str(i)})
+
+
+def naive_features(book):
+    bids = sorted(((p, q) for p, q in book["BUY"].items() if q > 0), reverse=True)[:DEPTH_LEVELS]
+    asks = sorted((p, q) for p, q in book["SELL"].items() if q > 0)[:DEPTH_LEVELS]
+    return sum(q for _, q in bids), sum(q for _, q in asks), bids[0][0], asks[0][0]
+
+
+def main():
+    rng = random.Random(5)
+    decoder = MessageDecoder()
+    frames = [book_frame(rng, token) for token in TOKENS] + [price_change_frame(rng, i) for i in range(N_EVENTS)]
+
+    # parity against a naive book
+    aggregator = PolymarketBookAggregator()
+    naive = {token: {"BUY": {}, "SELL": {}} for token in TOKENS}
+    for frame in frames[:5000]:
+        for msg in decoder.polymarket_events(frame):
+            if msg.event_type == "book":
+                aggregator.apply_snapshot(msg.asset_id, msg.bids, msg.asks)
+                naive[msg.asset_id]["BUY"] = {l.price: l.size for l in msg.bids}
+                naive[msg.asset_id]["SELL"] = {l.price: l.size for l in msg.asks}
+            else:
+                for c in msg.price_changes:
+                    aggregator.apply_change(c.asset_id, c.side, c.price, c.size)
+                    naive[c.asset_id][c.side][c.price] = c.size
+            for token in TOKENS:
+                if token not in aggregator.books:
+                    continue
+                f = aggregator.features(token)
+                bid_depth, ask_depth, best_bid, best_ask = naive_features(naive[token])
+                assert abs(f["bid_depth"] - bid_depth) < 1e-6 and abs(f["ask_depth"] - ask_depth) < 1e-6
+                assert abs(f["spread"] - (best_ask - best_bid)) < 1e-9
+    print("parity with naive book: ok")
+
+    # decode + apply + features for the touched tokens, as WebSocketOrderBook does
+    aggregator = PolymarketBookAggregator()
+    start = time.perf_counter()
+    for frame in frames:
+        for msg in decoder.polymarket_events(frame):
+            if msg.event_type == "book":
+                aggregator.apply_snapshot(msg.asset_id, msg.bids, msg.asks)
+                aggregator.features(msg.asset_id)
+            else:
+                for c in msg.price_changes:
+                    aggregator.apply_change(c.asset_id, c.side, c.price, c.size)
+                for token in TOKENS:
+                    aggregator.features(token)
+    elapsed = time.perf_counter() - start
+    print(f"{decoder.backend}: {len(frames)} frames in {elapsed:.2f}s, {elapsed / len(frames) * 1e6:.2f} us/frame")
+
+
+if __name__ == "__main__":
+    main()
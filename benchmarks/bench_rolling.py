@@ -0,0 +1,100 @@
+"""
+Checks the O(1) rolling z-score/ratio path in the aggregators against the original
+full-recompute implementation and times both.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_rolling.py
+"""
+import math
+import time
+import random
+from collections import deque
+
+from app.binance.aggregators.l2_aggregator import L2Aggregator
+from app.binance.aggregators.tape_aggregator import TapeAggregator
+
+N_SECONDS = 20_000
+TOLERANCE = 1e-6
+
+
+def legacy_normalize(agg, metrics):
+    """The full-recompute z-score previously used by both aggregators."""
+    for k, window in agg.z_windows.items():
+        v = metrics.get(k)
+        if v is None:
+            continue
+        hist = agg.legacy_hist[k]
+        hist.append(v)
+        if len(hist) >= max(5, window // 10):
+            mu = sum(hist) / len(hist)
+            sigma = math.sqrt(sum((x - mu) ** 2 for x in hist) / len(hist))
+            metrics[f"z_{k}"] = (v - mu) / sigma if sigma > 0 else 0.0
+
+
+def make_legacy(cls):
+    agg = cls()
+    agg.legacy_hist = {k: deque(maxlen=v) for k, v in agg.z_windows.items()}
+    agg._normalize = lambda metrics: legacy_normalize(agg, metrics)
+    return agg
+
+
+def tape_feed(rng):
+    price = 95000.0
+    for ts in range(N_SECONDS):
+        # quiet stretches exercise the flat-window path
+        n_trades = 0 if rng.random() < 0.1 else rng.randint(1, 30)
+        if n_trades == 0:
+            yield price, 0.0, "buy", ts
+            continue
+        for _ in range(n_trades):
+            price += rng.gauss(0, 2)
+            yield price, rng.expovariate(20), rng.choice(("buy", "sell")), ts
+
+
+def l2_feed(rng):
+    for ts in range(N_SECONDS):
+        mid = 95000 + rng.gauss(0, 50)
+        bids = [(mid - 0.01 * (i + 1), rng.uniform(0.01, 3)) for i in range(10)]
+        asks = [(mid + 0.01 * (i + 1), rng.uniform(0.01, 3)) for i in range(10)]
+        yield bids, asks, ts
+
+
+def max_diff(a, b):
+    worst = 0.0
+    for ma, mb in zip(a, b):
+        assert ma.keys() == mb.keys(), f"metric keys differ at ts={ma['ts']}"
+        for k in ma:
+            worst = max(worst, abs(ma[k] - mb[k]))
+    return worst
+
+
+def run(agg, method, events):
+    out = []
+    start = time.perf_counter()
+    for ev in events:
+        m = method(agg)(*ev)
+        if m:
+            out.append(m)
+    return time.perf_counter() - start, out
+
+
+def main():
+    tape_events = list(tape_feed(random.Random(1)))
+    l2_events = list(l2_feed(random.Random(2)))
+
+    for name, cls, events, method in [
+        ("tape", TapeAggregator, tape_events, lambda a: a.update_trade),
+        ("l2", L2Aggregator, l2_events, lambda a: a.update_l2),
+    ]:
+        t_new, new = run(cls(), method, events)
+        t_old, old = run(make_legacy(cls), method, events)
+        diff = max_diff(new, old)
+        assert diff < TOLERANCE, f"{name}: max abs diff {diff}"
+        print(
+            f"{name:>4}: {len(new)} buckets | legacy {t_old / len(old) * 1e6:.1f} us/bucket"
+            f" | rolling {t_new / len(new) * 1e6:.1f} us/bucket | max abs diff {diff:.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
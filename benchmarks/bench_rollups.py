@@ -0,0 +1,87 @@
+"""
+Per-record cost of the incremental 5s / 60s / 15m rollups, checked against a pandas
+groupby over the full history.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_rollups.py
+"""
+import time
+import random
+
+import numpy as np
+import pandas as pd
+
+from app.core.rollups import Rollup, TIMEFRAMES
+
+N_SECONDS = 200_000
+START_TS = 1_700_000_100
+
+
+def synthetic_records(rng, n):
+    records = []
+    price = 35_000.0
+    cvd = 0.0
+    for i in range(n):
+        buy = rng.expovariate(1.0) if rng.random() < 0.8 else 0.0
+        sell = rng.expovariate(1.0) if rng.random() < 0.8 else 0.0
+        cvd += buy - sell
+        bid = rng.uniform(1, 50)
+        ask = rng.uniform(1, 50)
+        record = {
+            "timestamp": START_TS + i,
+            "buy_vol": buy,
+            "sell_vol": sell,
+            "cvd": cvd,
+            "bid_liq": bid,
+            "ask_liq": ask,
+            "obi": (bid - ask) / (bid + ask),
+        }
+        if buy or sell:
+            price += rng.gauss(0, 5)
+            record["price"] = price
+        records.append(record)
+    return records
+
+
+def expected_bars(df, period):
+    g = df.groupby(df["timestamp"] - df["timestamp"] % period)
+    return pd.DataFrame({
+        "open": g["price"].first(),
+        "high": g["price"].max(),
+        "low": g["price"].min(),
+        "close": g["price"].last(),
+        "volume": g["buy_vol"].sum() + g["sell_vol"].sum(),
+        "cvd": g["cvd"].last(),
+        "obi_mean": g["obi"].mean(),
+        "obi": (g["bid_liq"].sum() - g["ask_liq"].sum()) / (g["bid_liq"].sum() + g["ask_liq"].sum()),
+    })
+
+
+def main():
+    rng = random.Random(11)
+    records = synthetic_records(rng, N_SECONDS)
+
+    # parity, the last (still open) bar is never emitted
+    df = pd.DataFrame(records)
+    for name, period in TIMEFRAMES.items():
+        rollup = Rollup(name, period)
+        bars = [b for b in (rollup.update(r["timestamp"], r) for r in records) if b is not None]
+        got = pd.DataFrame(bars).set_index("timestamp")
+        want = expected_bars(df, period).iloc[:len(got)]
+        for col in want.columns:
+            assert np.allclose(got[col].astype(float), want[col], equal_nan=True), (name, col)
+    print("parity with pandas groupby: ok")
+
+    rollups = [Rollup(name, period) for name, period in TIMEFRAMES.items()]
+    start = time.perf_counter()
+    for r in records:
+        ts = r["timestamp"]
+        for rollup in rollups:
+            rollup.update(ts, r)
+    elapsed = time.perf_counter() - start
+    print(f"{len(records)} records x {len(rollups)} timeframes in {elapsed:.2f}s, "
+          f"{elapsed / len(records) * 1e6:.2f} us/record")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+JSONLWriter throughput in line-by-line vs batched mode, and overflow behaviour of a bounded queue.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_writer.py
+"""
+import time
+import asyncio
+import logging
+import tempfile
+
+from app.core.writer import JSONLWriter, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST
+
+N_RECORDS = 200_000
+RECORD = {
+    "timestamp": 1_700_000_000, "price": 95000.12, "buy_vol": 1.23, "sell_vol": 0.87, "afi": 0.17,
+    "ew_afi": 0.12, "obi": 0.05, "ew_obi": 0.03, "weighted_obi": 0.06, "cvd": 45.3,
+    "up_best_bid": "0.72", "up_best_ask": "0.74", "down_best_bid": "0.26", "down_best_ask": "0.28",
+}
+CONFIGS = [
+    ("line-by-line", {}),
+    ("batch 64", {"batch_size": 64}),
+    ("batch 512", {"batch_size": 512}),
+    ("batch 512, flush 1s", {"batch_size": 512, "flush_interval": 1.0}),
+]
+
+
+async def run(tmp, **opts):
+    writer = JSONLWriter(tmp, "bench.jsonl", logger=logging.getLogger("bench"), **opts)
+    await writer.start()
+    start = time.perf_counter()
+    for i in range(N_RECORDS):
+        await writer.write(RECORD)
+        # producers hand over control now and then, like the listeners do between messages
+        if i % 1000 == 0:
+            await asyncio.sleep(0)
+    await writer.queue.join()
+    elapsed = time.perf_counter() - start
+    await writer.stop()
+    return elapsed, writer.stats
+
+
+async def overflow(tmp, policy):
+    # writer never started: the bounded queue fills and the policy kicks in
+    writer = JSONLWriter(tmp, "bench.jsonl", max_queue=1000, overflow=policy, logger=logging.getLogger("bench"))
+    for i in range(10_000):
+        await writer.write({"i": i})
+    return writer.stats["dropped"], writer.queue.get_nowait()["i"]
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, opts in CONFIGS:
+            elapsed, stats = await run(tmp, **opts)
+            print(
+                f"{name:>20}: {N_RECORDS / elapsed:>9.0f} records/s | batches {stats['batches']} "
+                f"(avg {stats['records'] / stats['batches']:.1f}, max {stats['max_batch']}) | flushes {stats['flushes']}"
+            )
+        for policy in (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST):
+            dropped, head = await overflow(tmp, policy)
+            print(f"{policy:>20}: dropped {dropped}, oldest kept record #{head}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""
+Soak run of the DataManager join: millions of synthetic seconds with jittered, late and
+missing L2/tape buckets and bursty Polymarket quotes. Checks that the buffered state
+stays bounded, every second is written once and in order, and that traced memory
+does not grow between the first and the last part of the run.
+
+Usage:
+    PYTHONPATH=. python benchmarks/soak_data_manager.py [seconds]
+"""
+import sys
+import time
+import random
+import asyncio
+import tracemalloc
+
+from app.core.data_manager import DataManager, MAX_BUFFERED
+
+N_SECONDS = 2_000_000
+CHECKPOINTS = 4
+
+
+class NullSink:
+    """Checks ordering instead of writing."""
+    def __init__(self):
+        self.records = 0
+        self.last_ts = None
+
+    async def write(self, record):
+        ts = record["timestamp"]
+        assert self.last_ts is None or ts > self.last_ts, f"out of order: {ts} after {self.last_ts}"
+        self.last_ts = ts
+        self.records += 1
+
+
+async def run(n_seconds):
+    rng = random.Random(3)
+    sink = NullSink()
+    dm = DataManager(sink)
+
+    tracemalloc.start()
+    memory = []
+    start = time.perf_counter()
+    tape_backlog = []
+
+    for ts in range(n_seconds):
+        # L2 every second unless the feed stalls, tape only in seconds with trades and sometimes late
+        if rng.random() > 0.001:
+            await dm.get_l2_data({"ts": ts, "bid_liq": 1.0, "ask_liq": 1.0})
+        if rng.random() < 0.7:
+            tape_backlog.append(ts)
+        while tape_backlog and (rng.random() < 0.8 or len(tape_backlog) > 5):
+            await dm.get_tape_data({"ts": tape_backlog.pop(0), "price": 1.0, "total_vol": 1.0})
+
+        for _ in range(rng.randint(0, 3)):
+            dm.get_pm_data({"ts": ts + rng.randint(-2, 1), "data": {
+                "outcome": rng.choice(("up", "down")), "best_bid": "0.5", "best_ask": "0.51"
+            }})
+
+        assert len(dm.data) <= MAX_BUFFERED + 1 and len(dm._pm_pending) <= MAX_BUFFERED
+
+        if (ts + 1) % (n_seconds // CHECKPOINTS) == 0:
+            current, _ = tracemalloc.get_traced_memory()
+            memory.append(current)
+            print(f"{ts + 1:>9} s: open {len(dm.data)}, pm pending {len(dm._pm_pending)}, "
+                  f"traced {current / 1024:.0f} KiB, {dm.stats}")
+
+    await dm.flush()
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+
+    assert sink.records == dm.stats["records"]
+    growth = memory[-1] - memory[0]
+    print(f"{n_seconds} seconds in {elapsed:.1f}s ({n_seconds / elapsed:.0f} s/s), "
+          f"{sink.records} records, memory growth {growth / 1024:.1f} KiB")
+    assert growth < 64 * 1024, "memory grows with session length"
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else N_SECONDS))
@@ -0,0 +1,342 @@
+"""
+Benchmark suite of the collector's hot paths, comparable across commits.
+
+Every case builds its inputs from a seeded generator, so two runs time exactly the same
+work. A case is timed REPEATS times on fresh state and the fastest run is kept (the least
+disturbed by other processes); results are nanoseconds per operation.
+
+    --out results.json       write the results with the commit, Python version and host
+    --baseline results.json  compare against an earlier run, exit 1 if any case got slower
+                             than --threshold (default 25%)
+    --filter substring       only run matching cases
+    --quick                  a tenth of the operations, for a smoke run
+
+Usage:
+    PYTHONPATH=. python benchmarks/suite.py --out base.json
+    PYTHONPATH=. python benchmarks/suite.py --baseline base.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from app.core.order_book import BookSide
+from app.core.writer import JSONLWriter
+from app.core.data_manager import DataManager
+from app.core.metrics import MetricsRegistry
+from app.binance.listeners.l2_listener import L2Listener, get_top_levels
+from app.binance.listeners.tape_listener import TapeListener
+from app.binance.aggregators.l2_aggregator import L2Aggregator
+from app.binance.aggregators.tape_aggregator import TapeAggregator
+
+SEED = 1234
+REPEATS = 5
+THRESHOLD = 0.25
+MID = 95000.0
+TICK = 0.01
+LEVELS_USED = 10
+START_MS = 1_700_000_000_000
+BOOK_SIZES = [100, 1_000, 10_000]
+RECORD = {
+    "timestamp": 1_700_000_000, "price": 95000.12, "buy_vol": 1.23, "sell_vol": 0.87, "afi": 0.17,
+    "ew_afi": 0.12, "obi": 0.05, "ew_obi": 0.03, "weighted_obi": 0.06, "cvd": 45.3,
+    "up_best_bid": "0.72", "up_best_ask": "0.74", "down_best_bid": "0.26", "down_best_ask": "0.28",
+}
+
+CASES = {}
+
+
+def case(name, ops):
+    """Register setup(rng, n) -> run() under `name`; run() performs `ops` operations."""
+    def register(setup):
+        CASES[name] = (setup, ops)
+        return setup
+    return register
+
+
+class NullWriter:
+    name = "null"
+
+    async def write(self, record):
+        pass
+
+
+class NullManager:
+    async def get_l2_data(self, metrics):
+        pass
+
+    async def get_tape_data(self, metrics):
+        pass
+
+
+# deterministic inputs
+
+def book_levels(rng, n):
+    bids = {round(MID - TICK * (i + 1), 2): rng.uniform(0.001, 5) for i in range(n)}
+    asks = {round(MID + TICK * (i + 1), 2): rng.uniform(0.001, 5) for i in range(n)}
+    return bids, asks
+
+
+def depth_diffs(rng, n, levels=20):
+    """(E, bids, asks) diffs near the touch, a fifth of them removing their level, 10 per second."""
+    diffs = []
+    for i in range(n):
+        b = [(round(MID - TICK * rng.randint(1, 200), 2), 0.0 if rng.random() < 0.2 else rng.uniform(0.001, 5))
+             for _ in range(levels // 2)]
+        a = [(round(MID + TICK * rng.randint(1, 200), 2), 0.0 if rng.random() < 0.2 else rng.uniform(0.001, 5))
+             for _ in range(levels // 2)]
+        diffs.append((START_MS + i * 100, b, a))
+    return diffs
+
+
+def depth_frames(rng, n):
+    return [json.dumps({
+        "e": "depthUpdate", "E": e, "s": "BTCUSDT", "U": i, "u": i,
+        "b": [[f"{p:.2f}", f"{q:.8f}"] for p, q in b], "a": [[f"{p:.2f}", f"{q:.8f}"] for p, q in a],
+    }) for i, (e, b, a) in enumerate(depth_diffs(rng, n))]
+
+
+def trades(rng, n, per_second=20):
+    """(T, price, size, is_buyer_maker) with `per_second` trades per second."""
+    return [(START_MS + i * 1000 // per_second, MID + rng.gauss(0, 5), rng.uniform(0.0001, 2), rng.random() < 0.5)
+            for i in range(n)]
+
+
+def trade_frames(rng, n):
+    return [json.dumps({"e": "trade", "E": t, "T": t, "s": "BTCUSDT", "p": f"{p:.2f}", "q": f"{q:.8f}", "m": m})
+            for t, p, q, m in trades(rng, n)]
+
+
+def run_async(coro_fn):
+    return lambda: asyncio.run(coro_fn())
+
+
+# cases
+
+for size in BOOK_SIZES:
+    @case(f"get_top_levels[{size}]", 2_000)
+    def _(rng, n, size=size):
+        bids, _ = book_levels(rng, size)
+        return lambda: [get_top_levels(bids, reverse=True, n=LEVELS_USED) for _ in range(n)]
+
+    @case(f"book_side.update+top[{size}]", 20_000)
+    def _(rng, n, size=size):
+        bids, asks = book_levels(rng, size)
+        side_b, side_a = BookSide(descending=True), BookSide()
+        for p, q in bids.items():
+            side_b.update(p, q)
+        for p, q in asks.items():
+            side_a.update(p, q)
+        diffs = depth_diffs(rng, n)
+
+        def run():
+            for _, b, a in diffs:
+                for p, q in b:
+                    side_b.update(p, q)
+                for p, q in a:
+                    side_a.update(p, q)
+                side_b.top(LEVELS_USED)
+                side_a.top(LEVELS_USED)
+        return run
+
+
+@case("l2_aggregator.update_l2", 50_000)
+def _(rng, n):
+    aggregator = L2Aggregator(LEVELS_USED)
+    snapshots = []
+    for e, b, a in depth_diffs(rng, n):
+        top_b = sorted(((p, q or 0.5) for p, q in b), reverse=True)[:LEVELS_USED]
+        top_a = sorted((p, q or 0.5) for p, q in a)[:LEVELS_USED]
+        snapshots.append((top_b, top_a, e // 1000))
+
+    def run():
+        for top_b, top_a, ts in snapshots:
+            aggregator.update_l2(top_b, top_a, ts)
+    return run
+
+
+@case("tape_aggregator.update_trade", 100_000)
+def _(rng, n):
+    aggregator = TapeAggregator()
+    data = [(p, q, "sell" if m else "buy", t // 1000) for t, p, q, m in trades(rng, n)]
+
+    def run():
+        for p, q, side, ts in data:
+            aggregator.update_trade(p, q, side, ts)
+    return run
+
+
+@case("l2_listener.handle_message", 20_000)
+def _(rng, n):
+    listener = L2Listener(None, LEVELS_USED, NullWriter(), L2Aggregator(LEVELS_USED), NullManager())
+    frames = depth_frames(rng, n)
+
+    async def run():
+        for frame in frames:
+            await listener.handle_message(frame)
+    return run_async(run)
+
+
+@case("tape_listener.handle_message", 50_000)
+def _(rng, n):
+    listener = TapeListener(None, NullWriter(), TapeAggregator(), NullManager())
+    frames = trade_frames(rng, n)
+
+    async def run():
+        for frame in frames:
+            await listener.handle_message(frame)
+    return run_async(run)
+
+
+def join_inputs(rng, n):
+    """Per bucket: an L2 record, a tape record and a Polymarket quote, the tape one second late at times."""
+    events = []
+    for i in range(n):
+        ts = START_MS // 1000 + i
+        l2 = {"ts": ts, "bid_liq": rng.random(), "ask_liq": rng.random(), "obi": rng.random()}
+        tape = {"ts": ts, "price": MID, "buy_vol": rng.random(), "sell_vol": rng.random()}
+        quote = {"ts": ts, "data": {"outcome": "up", "best_bid": "0.51", "best_ask": "0.53"}}
+        events.append((l2, tape, quote, rng.random() < 0.1))
+    return events
+
+
+def join_case(metrics):
+    def setup(rng, n):
+        dm = DataManager(NullWriter(), metrics=MetricsRegistry() if metrics else None)
+        events = join_inputs(rng, n)
+
+        async def run():
+            held = None
+            for l2, tape, quote, late in events:
+                dm.get_pm_data(quote)
+                await dm.get_l2_data(l2)
+                if held is not None:
+                    await dm.get_tape_data(held)
+                    held = None
+                if late:
+                    held = tape
+                else:
+                    await dm.get_tape_data(tape)
+            await dm.flush()
+        return run_async(run)
+    return setup
+
+
+case("data_manager.join", 50_000)(join_case(metrics=False))
+case("data_manager.join+metrics", 50_000)(join_case(metrics=True))
+
+
+@case("jsonl_writer.write", 100_000)
+def _(rng, n):
+    tmp = tempfile.mkdtemp(prefix="bench_suite_")
+
+    async def run():
+        writer = JSONLWriter(tmp, "suite.jsonl", logger=logging.getLogger("bench"), batch_size=256)
+        await writer.start()
+        try:
+            for i in range(n):
+                await writer.write(RECORD)
+                # producers hand over control now and then, like the listeners do between messages
+                if i % 1000 == 0:
+                    await asyncio.sleep(0)
+            await writer.stop()
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return run_async(run)
+
+
+# runner
+
+def measure(name, quick=False):
+    setup, ops = CASES[name]
+    n = max(1, ops // 10) if quick else ops
+    samples = []
+    for _ in range(REPEATS):
+        run = setup(random.Random(SEED), n)
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) / n * 1e9)
+    return {"ns_per_op": min(samples), "median_ns_per_op": sorted(samples)[len(samples) // 2], "ops": n}
+
+
+def meta():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "time": int(time.time()),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Cases slower than the baseline by more than `threshold` as (name, before, now, change)."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        change = result["ns_per_op"] / before["ns_per_op"] - 1
+        result["change"] = change
+        if change > threshold:
+            regressions.append((name, before["ns_per_op"], result["ns_per_op"], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collector benchmark suite")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--filter", default="")
+    parser.add_argument("--quick", action="store_true")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    names = [name for name in CASES if args.filter in name]
+    results = {}
+    print(f"{'case':<34} | {'ns/op':>10} | {'median':>10} | {'vs base':>8}")
+    for name in names:
+        results[name] = result = measure(name, args.quick)
+        change = ""
+        before = baseline and baseline.get("results", {}).get(name)
+        if before:
+            change = f"{result['ns_per_op'] / before['ns_per_op'] - 1:+.1%}"
+        print(f"{name:<34} | {result['ns_per_op']:>10.0f} | {result['median_ns_per_op']:>10.0f} | {change:>8}",
+              flush=True)
+
+    report = {"meta": meta(), "results": results}
+    regressions = compare(results, baseline, args.threshold) if baseline else []
+    if baseline:
+        report["baseline"] = baseline.get("meta")
+        report["threshold"] = args.threshold
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    for name, before, now, change in regressions:
+        print(f"REGRESSION {name}: {before:.0f} -> {now:.0f} ns/op ({change:+.1%} > {args.threshold:.0%})")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
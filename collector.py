@@ -1,77 +1,277 @@
+import os
+import signal
 import asyncio
-import threading
 
 from app.polymarket.websocket_ob import polymarket_runner
 
-from app.core.writer import JSONLWriter
+from app.core.writer import JSONLWriter, OVERFLOW_DROP_OLDEST
+from app.core.capture import RawCapture
+from app.core.compression import FileCompressor
+from app.core.parquet_writer import ParquetWriter, combined_schema
 from app.core.logger import setup_logger
 from app.core.data_manager import DataManager
-from app.binance.listeners.l2_listener import L2Listener
+from app.core.rollups import RollupStage, TIMEFRAMES
+from app.core.checkpoint import Checkpointer
+from app.core.feature_ring import FeatureRing
+from app.core.feature_server import FeatureServer
+from app.core.shm_ring import ShmPublisher
+from app.core.metrics import MetricsRegistry, MetricsServer, LoopLagMonitor
+from app.core.rolling import buckets_per
+from app.binance.listeners.l2_listener import L2Listener, L2_MODE_CONFLATED
 from app.binance.listeners.tape_listener import TapeListener
+from app.binance.listeners.combined_listener import CombinedStreamListener
 from app.binance.aggregators.l2_aggregator import L2Aggregator
 from app.binance.aggregators.tape_aggregator import TapeAggregator
 
-SYMBOL = "btcusdt"
-DEPTH_WS = f"wss://stream.binance.com:9443/ws/{SYMBOL}@depth@100ms"
-TAPE_WS = f"wss://stream.binance.com:9443/ws/{SYMBOL}@trade"
+# every asset gets its own aggregators and outputs, all Binance streams share one connection
+ASSETS = ["btc", "eth", "sol", "xrp"]
+QUOTE = "usdt"
+BINANCE_WS = os.environ.get("BINANCE_WS_URL", "wss://stream.binance.com:9443")
 
 LEVELS_USED = 10
+# "snapshot", "conflated" (top levels once per bucket, same output) or "twal" (time-weighted average)
+L2_MODE = L2_MODE_CONFLATED
+# aggregation bucket width; below 1000 records are keyed by fractional seconds
+BUCKET_MS = 1000
 DATA_FOLDER = "data"
 LOGGING_FOLDER = "logs"
+# log file / console writes happen on a background thread, never on the event loop
+QUEUE_LOGGING = True
+# warnings / errors from one line are limited to a burst per window (malformed-message storms)
+RATE_LIMIT_LOGS = True
+
+# combined data sink: "jsonl" or "parquet"
+OUTPUT_FORMAT = "jsonl"
+
+# raw per-stream records ({asset}_l2 / {asset}_tape / polymarket.jsonl) next to the combined data;
+# off as before, the listeners then only feed the DataManagers
+STREAM_OUTPUTS = False
+
+# writer queues are bounded; combined data blocks when full, per-stream outputs shed the oldest records
+WRITER_QUEUE_SIZE = 100_000
+WRITER_BATCH_SIZE = 256
+
+# route JSONL records to the candle file of their own timestamp instead of the wall clock at write time
+PARTITION_BY_EVENT_TIME = True
+
+# zstd-compress JSONL files in a background pool once their candle is over
+COMPRESS_ROTATED = False
+
+# 5s / 60s / 15m bars per asset, written to {asset}_rollup_{timeframe}.jsonl
+ROLLUPS = True
+
+# aggregator state is snapshotted periodically and restored on startup if fresh (warm restarts)
+CHECKPOINT = True
+CHECKPOINT_PATH = "data/checkpoint.json"
+
+# latest combined records per asset in memory, queried over a Unix socket (FeatureClient)
+FEATURE_SERVER = True
+FEATURE_SOCKET = "data/features.sock"
+FEATURE_RING_SECONDS = 900
+
+# combined records per asset in a shared-memory ring "<SHM_PREFIX><asset>" for other processes (ShmSubscriber)
+SHM_PUBLISH = True
+SHM_PREFIX = os.environ.get("SHM_PREFIX", "pmc15m_")
+
+# Prometheus text endpoint: message rates, decode / event latency, record age per stage, queue depths, loop lag
+METRICS = True
+# bind to 0.0.0.0 inside a container so the published port reaches it (docker-compose.yaml sets it)
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9108))
+
+# record every raw websocket frame for replay
+CAPTURE_RAW = False
+CAPTURE_FOLDER = "data/raw"
+
+async def shutdown(tasks, data_managers, writers, servers, closeables, compressor, logger):
+    """
+    Stop feeding, write what is still buffered and close every output: open seconds (and the
+    open rollup bars, as partial ones) are flushed through the writers and sinks, writer queues
+    are drained, Parquet files get their footer, shared memory and sockets are released.
+    """
+    for task in tasks:
+        task.cancel()
+    # the checkpointer writes its last snapshot while cancelled
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    for data_manager in data_managers.values():
+        try:
+            await data_manager.flush()
+        except Exception as e:
+            logger.error(f"Could not flush {data_manager.writer.name}: {e}")
+    for writer in writers:
+        try:
+            await writer.stop()
+        except Exception as e:
+            logger.error(f"Could not stop writer {writer.name}: {e}")
+    for server in servers:
+        await server.stop()
+    for closeable in closeables:
+        closed = closeable.close()
+        # RawCapture.close() is async, it also stops its flush task
+        if asyncio.iscoroutine(closed):
+            await closed
+    if compressor is not None:
+        compressor.shutdown(wait=True)
+    logger.info("Trading session stopped")
+
 
 async def main():
-    logger = setup_logger(LOGGING_FOLDER)
+    logger = setup_logger(LOGGING_FOLDER, use_queue=QUEUE_LOGGING, rate_limit=RATE_LIMIT_LOGS)
     logger.info("Starting trading session...")
 
-    # event loop
+    # SIGTERM (docker stop) and SIGINT end the session through the same clean shutdown
+    stop = asyncio.Event()
     loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    compressor = FileCompressor(logger=logger) if COMPRESS_ROTATED else None
+
+    # everything run() starts is registered here and stopped by shutdown(), also when the setup fails halfway
+    tasks = []
+    data_managers = {}
+    writers = []
+    servers = []
+    closeables = []
+    try:
+        await run(stop, compressor, tasks, data_managers, writers, servers, closeables, logger)
+    finally:
+        await shutdown(tasks, data_managers, writers, servers, closeables, compressor, logger)
+
+
+async def run(stop, compressor, tasks, data_managers, writers, servers, closeables, logger):
+    metrics = MetricsRegistry() if METRICS else None
 
     # writers
-    l2_writer = JSONLWriter(DATA_FOLDER, "l2.jsonl", logger=logger)
-    tape_writer = JSONLWriter(DATA_FOLDER, "tape.jsonl", logger=logger)
-    polymarket_writer = JSONLWriter(DATA_FOLDER, "polymarket.jsonl", logger=logger)
-    data_manager_writer = JSONLWriter(DATA_FOLDER, "combined_data.jsonl", logger=logger)
-
-    await asyncio.gather(
-        # l2_writer.start(),
-        # tape_writer.start(),
-        # polymarket_writer.start(),
-        data_manager_writer.start()
+    # per-stream records carry "ts", combined records and bars "timestamp"
+    stream_partition_key = "ts" if PARTITION_BY_EVENT_TIME else None
+    combined_partition_key = "timestamp" if PARTITION_BY_EVENT_TIME else None
+    stream_writer_opts = dict(
+        batch_size=WRITER_BATCH_SIZE, max_queue=WRITER_QUEUE_SIZE, overflow=OVERFLOW_DROP_OLDEST,
+        compressor=compressor, logger=logger, metrics=metrics, partition_key=stream_partition_key
     )
 
-    data_manager = DataManager(data_manager_writer)
+    async def stream_writer(name):
+        # None unless STREAM_OUTPUTS: a writer nobody starts would only fill its queue
+        if not STREAM_OUTPUTS:
+            return None
+        writer = JSONLWriter(DATA_FOLDER, name, **stream_writer_opts)
+        await writer.start()
+        writers.append(writer)
+        return writer
 
-    # listeners
-    l2_listener = L2Listener(
-        DEPTH_WS,
-        LEVELS_USED,
-        l2_writer,
-        L2Aggregator(),
-        data_manager,
-        logger
-    )
+    polymarket_writer = await stream_writer("polymarket.jsonl")
 
-    trade_listener = TapeListener(
-        TAPE_WS,
-        tape_writer,
-        TapeAggregator(),
-        data_manager,
-        logger
-    )
+    capture = None
+    if CAPTURE_RAW:
+        capture = RawCapture(CAPTURE_FOLDER, logger=logger)
+        await capture.start()
+        closeables.append(capture)
+
+    feature_rings = {}
+    l2_listeners = {}
+    tape_listeners = {}
+    for asset in ASSETS:
+        symbol = f"{asset}{QUOTE}"
+        l2_writer = await stream_writer(f"{asset}_l2.jsonl")
+        tape_writer = await stream_writer(f"{asset}_tape.jsonl")
+        if OUTPUT_FORMAT == "parquet":
+            data_manager_writer = ParquetWriter(
+                DATA_FOLDER, f"{asset}_combined_data.parquet", schema=combined_schema(BUCKET_MS),
+                max_queue=WRITER_QUEUE_SIZE, logger=logger, metrics=metrics
+            )
+        else:
+            data_manager_writer = JSONLWriter(
+                DATA_FOLDER, f"{asset}_combined_data.jsonl", batch_size=WRITER_BATCH_SIZE,
+                max_queue=WRITER_QUEUE_SIZE, compressor=compressor, logger=logger, metrics=metrics,
+                partition_key=combined_partition_key
+            )
+        await data_manager_writer.start()
+        writers.append(data_manager_writer)
+
+        sinks = []
+        if ROLLUPS:
+            rollup_writers = {
+                name: JSONLWriter(
+                    DATA_FOLDER, f"{asset}_rollup_{name}.jsonl", batch_size=WRITER_BATCH_SIZE,
+                    max_queue=WRITER_QUEUE_SIZE, compressor=compressor, logger=logger, metrics=metrics,
+                    partition_key=combined_partition_key
+                )
+                for name in TIMEFRAMES
+            }
+            for writer in rollup_writers.values():
+                await writer.start()
+                writers.append(writer)
+            sinks.append(RollupStage(rollup_writers, logger=logger))
+        if FEATURE_SERVER:
+            feature_rings[asset] = FeatureRing(buckets_per(FEATURE_RING_SECONDS, BUCKET_MS))
+            sinks.append(feature_rings[asset])
+        if SHM_PUBLISH:
+            publisher = ShmPublisher(f"{SHM_PREFIX}{asset}", logger=logger)
+            closeables.append(publisher)
+            sinks.append(publisher)
 
-    # polymarket runs in its own thread
-    threading.Thread(
-        target=polymarket_runner,
-        args=(polymarket_writer, loop, data_manager, logger),
-        daemon=True
-    ).start()
-
-    # run everything
-    await asyncio.gather(
-        l2_listener.start_listening(),
-        trade_listener.start_listening(),
+        data_managers[asset] = DataManager(data_manager_writer, bucket_ms=BUCKET_MS, sinks=sinks, metrics=metrics)
+
+        # ws=None: frames come from the combined listener
+        l2_listeners[symbol] = L2Listener(
+            None, LEVELS_USED, l2_writer, L2Aggregator(LEVELS_USED, BUCKET_MS), data_managers[asset], logger,
+            mode=L2_MODE, metrics=metrics
+        )
+        tape_listeners[symbol] = TapeListener(
+            None, tape_writer, TapeAggregator(BUCKET_MS), data_managers[asset], logger, metrics=metrics
+        )
+        # a quiet tape hands over its open bucket before L2 completes the second
+        data_managers[asset].add_closer(tape_listeners[symbol].close_until)
+
+    binance_listener = CombinedStreamListener(
+        BINANCE_WS, l2_listeners, tape_listeners, logger, capture=capture, metrics=metrics
     )
 
+    if FEATURE_SERVER:
+        feature_server = FeatureServer(FEATURE_SOCKET, feature_rings, logger)
+        await feature_server.start()
+        servers.append(feature_server)
+
+    coros = [
+        binance_listener.start_listening(),
+        polymarket_runner(
+            polymarket_writer, data_managers[ASSETS[0]], logger, capture, ASSETS, data_managers, bucket_ms=BUCKET_MS,
+            metrics=metrics
+        ),
+    ]
+
+    if METRICS:
+        metrics_server = MetricsServer(metrics, host=METRICS_HOST, port=METRICS_PORT, logger=logger)
+        await metrics_server.start()
+        servers.append(metrics_server)
+        coros.append(LoopLagMonitor(metrics).run())
+
+    if CHECKPOINT:
+        components = {}
+        for symbol, listener in l2_listeners.items():
+            components[f"{symbol}_l2"] = listener.aggregator
+        for symbol, listener in tape_listeners.items():
+            components[f"{symbol}_tape"] = listener.aggregator
+        checkpointer = Checkpointer(CHECKPOINT_PATH, components, logger=logger)
+        checkpointer.restore()
+        coros.append(checkpointer.run())
+
+    # run everything on one loop, one Polymarket subscription for all assets, until a
+    # signal arrives or a task fails (its exception propagates once main() has shut down);
+    # a writer task only ends by failing, its queue would otherwise fill up and stall the feeds
+    tasks.extend(asyncio.create_task(coro) for coro in coros)
+    stopped = asyncio.create_task(stop.wait())
+    tasks.append(stopped)
+    watched = tasks + [writer.task for writer in writers]
+    done, _ = await asyncio.wait(watched, return_when=asyncio.FIRST_COMPLETED)
+    if stopped in done:
+        logger.info("Stop signal received, shutting down...")
+    for task in done:
+        if task is not stopped:
+            task.result()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1 @@
+"""Local fake Binance / Polymarket servers and a load-test harness for collector.py."""
@@ -0,0 +1,234 @@
+"""
+Local stand-in for the Binance combined stream endpoint (`/stream?streams=...`).
+
+Every connection gets `depthUpdate` diffs and `trade` events for the symbols it asked for,
+wrapped in the combined-stream envelope, either synthetic (a random walk per symbol) or
+replayed from a capture recording. Rates are per connection and split over the symbols;
+trades can burst periodically, and connections can be dropped on a schedule.
+
+Usage:
+    PYTHONPATH=. python -m loadtest.fake_binance --port 9443 --trade-rate 200 --burst-rate 10000
+    BINANCE_WS_URL=ws://127.0.0.1:9443 python collector.py
+"""
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+from urllib.parse import urlsplit, parse_qs
+
+import websockets
+
+from app.core.replay import read_jsonl_recording, STREAM_DEPTH, STREAM_TRADE, STREAM_BINANCE_COMBINED
+from app.binance.listeners.combined_listener import depth_stream, trade_stream
+
+HOST = "127.0.0.1"
+PORT = 9443
+TICK = 0.01  # seconds between send rounds
+DEPTH_RATE = 10  # diffs/s per symbol, the @100ms stream
+TRADE_RATE = 200  # trades/s per connection outside bursts
+LEVELS_PER_DIFF = 10
+START_PRICES = {"btc": 95000.0, "eth": 3500.0, "sol": 180.0, "xrp": 2.5}
+
+
+class RateSchedule:
+    """
+    `rate` events/s, raised to `burst_rate` for `burst_seconds` out of every `burst_every`
+    seconds. due() returns how many events are owed since the last call, carrying fractions.
+    """
+    def __init__(self, rate, burst_rate=None, burst_every=None, burst_seconds=0.0):
+        self.rate = rate
+        self.burst_rate = burst_rate
+        self.burst_every = burst_every
+        self.burst_seconds = burst_seconds
+        self._start = self._last = time.monotonic()
+        self._carry = 0.0
+
+    def rate_at(self, elapsed):
+        if self.burst_rate and self.burst_every and elapsed % self.burst_every >= self.burst_every - self.burst_seconds:
+            return self.burst_rate
+        return self.rate
+
+    def due(self):
+        now = time.monotonic()
+        self._carry += self.rate_at(now - self._start) * (now - self._last)
+        self._last = now
+        n = int(self._carry)
+        self._carry -= n
+        return n
+
+
+class SyntheticBook:
+    """Random-walk mid with depth diffs around it, a quarter of the levels removed."""
+    def __init__(self, symbol, rng):
+        self.symbol = symbol
+        self.rng = rng
+        self.mid = next((p for asset, p in START_PRICES.items() if symbol.startswith(asset)), 100.0)
+        self.tick = self.mid * 1e-6
+        self.update_id = 0
+        self.depth_name = depth_stream(symbol)
+        self.trade_name = trade_stream(symbol)
+        self.upper = symbol.upper()
+
+    def _qty(self):
+        return "0.00000000" if self.rng.random() < 0.25 else f"{self.rng.random() * 3:.8f}"
+
+    def depth(self, now_ms):
+        rng, mid, tick = self.rng, self.mid, self.tick
+        self.mid += rng.gauss(0, tick * 20)
+        first = self.update_id + 1
+        self.update_id += LEVELS_PER_DIFF * 2
+        bids = [[f"{mid - rng.randint(1, 200) * tick:.8f}", self._qty()] for _ in range(LEVELS_PER_DIFF)]
+        asks = [[f"{mid + rng.randint(1, 200) * tick:.8f}", self._qty()] for _ in range(LEVELS_PER_DIFF)]
+        return json.dumps({"stream": self.depth_name, "data": {
+            "e": "depthUpdate", "E": now_ms, "s": self.upper, "U": first, "u": self.update_id, "b": bids, "a": asks,
+        }})
+
+    def trade(self, now_ms):
+        rng = self.rng
+        # compact f-string, a 10k/s burst has to be generated on the same core as the collector
+        return (f'{{"stream":"{self.trade_name}","data":{{"e":"trade","E":{now_ms},"s":"{self.upper}",'
+                f'"t":{now_ms},"p":"{self.mid + rng.gauss(0, self.tick * 5):.8f}","q":"{rng.random():.8f}",'
+                f'"T":{now_ms},"m":{"true" if rng.random() < 0.5 else "false"},"M":true}}}}')
+
+
+def _combined(stream, msg):
+    """A recorded frame as a combined-stream frame, or None if it is not a Binance one."""
+    if isinstance(msg, (bytes, memoryview)):
+        msg = str(msg, "utf-8")
+    if stream == STREAM_BINANCE_COMBINED:
+        return json.loads(msg)["stream"], msg
+    if stream not in (STREAM_DEPTH, STREAM_TRADE):
+        return None
+    data = json.loads(msg)
+    symbol = data["s"].lower()
+    name = depth_stream(symbol) if stream == STREAM_DEPTH else trade_stream(symbol)
+    return name, json.dumps({"stream": name, "data": data})
+
+
+class FakeBinance:
+    """
+    recording: capture file (JSONL, may be .zst) replayed at `speed` x real time instead of
+        synthetic data; event times are sent as recorded, only subscribed streams are sent.
+    disconnect_every: close every connection after this many seconds, None keeps them open.
+
+    stats: connections, frames, trades, depth, disconnects.
+    """
+    def __init__(self, host=HOST, port=PORT, depth_rate=DEPTH_RATE, trade_rate=TRADE_RATE, burst_rate=None,
+                 burst_every=60.0, burst_seconds=5.0, disconnect_every=None, recording=None, speed=1.0, loop=True,
+                 seed=0, logger: logging.Logger = None):
+        self.host = host
+        self.port = port
+        self.depth_rate = depth_rate
+        self.trade_rate = trade_rate
+        self.burst_rate = burst_rate
+        self.burst_every = burst_every
+        self.burst_seconds = burst_seconds
+        self.disconnect_every = disconnect_every
+        self.recording = recording
+        self.speed = speed
+        self.loop = loop
+        self.rng = random.Random(seed)
+        self.logger = logger or logging.getLogger(__name__)
+        self._server = None
+        self.stats = {"connections": 0, "frames": 0, "trades": 0, "depth": 0, "disconnects": 0}
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await websockets.serve(self._handle, self.host, self.port, compression=None)
+        self.logger.info(f"[FakeBinance] Listening on {self.url}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, ws):
+        streams = parse_qs(urlsplit(ws.request.path).query).get("streams", [""])[0].split("/")
+        self.stats["connections"] += 1
+        self.logger.info(f"[FakeBinance] Connection with {len(streams)} streams")
+        feed = self._replay(ws, set(streams)) if self.recording else self._synthetic(ws, streams)
+        try:
+            if self.disconnect_every:
+                try:
+                    await asyncio.wait_for(feed, self.disconnect_every)
+                except asyncio.TimeoutError:
+                    self.stats["disconnects"] += 1
+                    await ws.close(1001, "injected disconnect")
+            else:
+                await feed
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _synthetic(self, ws, streams):
+        books = {}
+        for name in streams:
+            symbol = name.split("@")[0]
+            books.setdefault(symbol, SyntheticBook(symbol, self.rng))
+        books = list(books.values())
+        depth = RateSchedule(self.depth_rate * len(books))
+        trades = RateSchedule(self.trade_rate, self.burst_rate, self.burst_every, self.burst_seconds)
+        i = 0
+        while True:
+            await asyncio.sleep(TICK)
+            now_ms = int(time.time() * 1000)
+            n_depth, n_trades = depth.due(), trades.due()
+            for _ in range(n_depth):
+                i += 1
+                await ws.send(books[i % len(books)].depth(now_ms))
+            for _ in range(n_trades):
+                i += 1
+                await ws.send(books[i % len(books)].trade(now_ms))
+            self.stats["depth"] += n_depth
+            self.stats["trades"] += n_trades
+            self.stats["frames"] += n_depth + n_trades
+
+    async def _replay(self, ws, streams):
+        while True:
+            first_ns = started = None
+            for recv_ns, stream, msg in read_jsonl_recording(self.recording):
+                frame = _combined(stream, msg)
+                if frame is None or frame[0] not in streams:
+                    continue
+                if first_ns is None:
+                    first_ns, started = recv_ns, time.monotonic()
+                delay = (recv_ns - first_ns) / 1e9 / self.speed - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await ws.send(frame[1])
+                self.stats["frames"] += 1
+                self.stats["trades" if frame[0].endswith("@trade") else "depth"] += 1
+            if not self.loop:
+                return
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Fake Binance combined stream server")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--depth-rate", type=float, default=DEPTH_RATE, help="diffs/s per symbol")
+    parser.add_argument("--trade-rate", type=float, default=TRADE_RATE, help="trades/s per connection")
+    parser.add_argument("--burst-rate", type=float, default=None, help="trades/s during bursts")
+    parser.add_argument("--burst-every", type=float, default=60.0)
+    parser.add_argument("--burst-seconds", type=float, default=5.0)
+    parser.add_argument("--disconnect-every", type=float, default=None)
+    parser.add_argument("--recording", default=None, help="capture file to replay instead of synthetic data")
+    parser.add_argument("--speed", type=float, default=1.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    server = FakeBinance(
+        args.host, args.port, args.depth_rate, args.trade_rate, args.burst_rate, args.burst_every,
+        args.burst_seconds, args.disconnect_every, args.recording, args.speed
+    )
+    await server.start()
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,217 @@
+"""
+Local stand-in for the Polymarket Gamma API and the CLOB market channel.
+
+HTTP: `GET /markets/slug/<asset>-updown-15m-<ts>` returns an Up/Down market with token IDs
+derived from the slug, so every candle gets new tokens and rollovers work as live.
+
+Websocket `/ws/market`: after the subscription message every token gets a `book` snapshot,
+then `price_change` and `best_bid_ask` events at `rate` messages/s around a random-walk
+probability. A text "PING" is answered with "PONG". Connections can be dropped on a schedule.
+
+Usage:
+    PYTHONPATH=. python -m loadtest.fake_polymarket --ws-port 9444 --http-port 9445
+    POLYMARKET_WS_URL=ws://127.0.0.1:9444 POLYMARKET_GAMMA_URL=http://127.0.0.1:9445 python collector.py
+"""
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import argparse
+
+import websockets
+
+from loadtest.fake_binance import RateSchedule, TICK
+
+HOST = "127.0.0.1"
+WS_PORT = 9444
+HTTP_PORT = 9445
+RATE = 50  # messages/s per connection
+BOOK_LEVELS = 20
+OUTCOMES = ["Up", "Down"]
+SLUG_PREFIX = "/markets/slug/"
+
+
+def token_ids(slug):
+    """Deterministic 77-digit token IDs, same shape as the real ones."""
+    return [str(int(hashlib.sha256(f"{slug}:{o}".encode()).hexdigest(), 16))[:77] for o in OUTCOMES]
+
+
+def market(slug):
+    return {
+        "slug": slug,
+        "outcomes": json.dumps(OUTCOMES),
+        "clobTokenIds": json.dumps(token_ids(slug)),
+    }
+
+
+class FakeMarket:
+    """Up/Down pair whose prices sum to one; each token keeps a small book."""
+    def __init__(self, up_id, down_id, rng):
+        self.up_id = up_id
+        self.down_id = down_id
+        self.rng = rng
+        self.p = 0.5
+
+    def _levels(self, token_id):
+        p = self.p if token_id == self.up_id else 1 - self.p
+        bids = [{"price": f"{max(0.01, p - 0.01 * (i + 1)):.2f}", "size": f"{self.rng.uniform(10, 500):.2f}"}
+                for i in range(BOOK_LEVELS)]
+        asks = [{"price": f"{min(0.99, p + 0.01 * (i + 1)):.2f}", "size": f"{self.rng.uniform(10, 500):.2f}"}
+                for i in range(BOOK_LEVELS)]
+        return p, bids, asks
+
+    def book(self, token_id, now_ms):
+        _, bids, asks = self._levels(token_id)
+        return {"event_type": "book", "asset_id": token_id, "market": self.up_id[:16], "bids": bids, "asks": asks,
+                "timestamp": str(now_ms)}
+
+    def update(self, now_ms):
+        """A price_change for both tokens or a best_bid_ask for one of them."""
+        rng = self.rng
+        self.p = min(0.97, max(0.03, self.p + rng.gauss(0, 0.005)))
+        if rng.random() < 0.5:
+            token_id = self.up_id if rng.random() < 0.5 else self.down_id
+            p = self.p if token_id == self.up_id else 1 - self.p
+            return {"event_type": "best_bid_ask", "asset_id": token_id, "market": self.up_id[:16],
+                    "best_bid": f"{max(0.01, p - 0.01):.2f}", "best_ask": f"{min(0.99, p + 0.01):.2f}",
+                    "spread": "0.02", "timestamp": str(now_ms)}
+        changes = []
+        for token_id in (self.up_id, self.down_id):
+            p = self.p if token_id == self.up_id else 1 - self.p
+            side = "BUY" if rng.random() < 0.5 else "SELL"
+            offset = rng.randint(1, 5) * 0.01
+            price = p - offset if side == "BUY" else p + offset
+            size = "0" if rng.random() < 0.2 else f"{rng.uniform(10, 500):.2f}"
+            changes.append({"asset_id": token_id, "price": f"{min(0.99, max(0.01, price)):.2f}", "size": size,
+                            "side": side, "best_bid": f"{max(0.01, p - 0.01):.2f}",
+                            "best_ask": f"{min(0.99, p + 0.01):.2f}"})
+        return {"event_type": "price_change", "market": self.up_id[:16], "price_changes": changes,
+                "timestamp": str(now_ms)}
+
+
+class FakePolymarket:
+    """
+    disconnect_every: close every websocket after this many seconds, None keeps them open.
+
+    stats: lookups, connections, messages, pings, disconnects.
+    """
+    def __init__(self, host=HOST, ws_port=WS_PORT, http_port=HTTP_PORT, rate=RATE, disconnect_every=None,
+                 seed=0, logger: logging.Logger = None):
+        self.host = host
+        self.ws_port = ws_port
+        self.http_port = http_port
+        self.rate = rate
+        self.disconnect_every = disconnect_every
+        self.rng = random.Random(seed)
+        self.logger = logger or logging.getLogger(__name__)
+        self._ws_server = None
+        self._http_server = None
+        self._markets = {}  # token_id: (up_id, down_id) of every market looked up
+        self.stats = {"lookups": 0, "connections": 0, "messages": 0, "pings": 0, "disconnects": 0}
+
+    @property
+    def ws_url(self):
+        return f"ws://{self.host}:{self.ws_port}"
+
+    @property
+    def gamma_url(self):
+        return f"http://{self.host}:{self.http_port}"
+
+    async def start(self):
+        self._ws_server = await websockets.serve(self._handle_ws, self.host, self.ws_port, compression=None)
+        self._http_server = await asyncio.start_server(self._handle_http, self.host, self.http_port)
+        self.logger.info(f"[FakePolymarket] Listening on {self.ws_url} and {self.gamma_url}")
+
+    async def stop(self):
+        for server in (self._ws_server, self._http_server):
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+        self._ws_server = self._http_server = None
+
+    async def _handle_http(self, reader, writer):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+            path = request.split(b" ", 2)[1].decode()
+            if path.startswith(SLUG_PREFIX):
+                slug = path[len(SLUG_PREFIX):]
+                ids = tuple(token_ids(slug))
+                self._markets.update(dict.fromkeys(ids, ids))
+                self.stats["lookups"] += 1
+                body, status = json.dumps(market(slug)).encode(), "200 OK"
+            else:
+                body, status = b'{"error": "not found"}', "404 Not Found"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, IndexError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_ws(self, ws):
+        self.stats["connections"] += 1
+        try:
+            subscription = json.loads(await ws.recv())
+            tokens = subscription.get("assets_ids", [])
+            # tokens that were never looked up get no events, as a real unknown asset_id
+            pairs = dict.fromkeys(self._markets[t] for t in tokens if t in self._markets)
+            markets = [FakeMarket(up_id, down_id, self.rng) for up_id, down_id in pairs]
+            self.logger.info(f"[FakePolymarket] Subscription to {len(tokens)} tokens, {len(markets)} markets")
+
+            now_ms = int(time.time() * 1000)
+            await ws.send(json.dumps([m.book(t, now_ms) for m in markets for t in (m.up_id, m.down_id)]))
+
+            tasks = [asyncio.create_task(self._feed(ws, markets)), asyncio.create_task(self._pong(ws))]
+            try:
+                done, _ = await asyncio.wait(tasks, timeout=self.disconnect_every,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.stats["disconnects"] += 1
+                    await ws.close(1001, "injected disconnect")
+            finally:
+                for task in tasks:
+                    task.cancel()
+        except (websockets.ConnectionClosed, ValueError):
+            pass
+
+    async def _pong(self, ws):
+        async for message in ws:
+            if message == "PING":
+                self.stats["pings"] += 1
+                await ws.send("PONG")
+
+    async def _feed(self, ws, markets):
+        if not markets:
+            await asyncio.Future()
+        schedule = RateSchedule(self.rate)
+        i = 0
+        while True:
+            await asyncio.sleep(TICK)
+            now_ms = int(time.time() * 1000)
+            for _ in range(schedule.due()):
+                i += 1
+                await ws.send(json.dumps(markets[i % len(markets)].update(now_ms)))
+                self.stats["messages"] += 1
+
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Fake Polymarket Gamma API and market channel")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--ws-port", type=int, default=WS_PORT)
+    parser.add_argument("--http-port", type=int, default=HTTP_PORT)
+    parser.add_argument("--rate", type=float, default=RATE, help="messages/s per connection")
+    parser.add_argument("--disconnect-every", type=float, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    server = FakePolymarket(args.host, args.ws_port, args.http_port, args.rate, args.disconnect_every)
+    await server.start()
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
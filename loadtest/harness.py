@@ -0,0 +1,266 @@
+"""
+Load test of collector.py against the local fake servers.
+
+Starts FakeBinance and FakePolymarket in this process, runs the unmodified collector in a
+subprocess (working directory: a temp folder, so data/, logs/ and the checkpoint stay out of
+the repo) pointed at them through BINANCE_WS_URL / POLYMARKET_WS_URL / POLYMARKET_GAMMA_URL,
+and every `--interval` seconds scrapes its metrics endpoint and reads its RSS:
+
+    rate      frames/s the collector processed (Binance combined + Polymarket)
+    backlog   frames sent by the fakes but not processed yet (socket buffers + loop backlog)
+    event p99 receive time minus event time of Binance frames, p99 over the interval
+    age       mean wall time minus bucket start when records were joined
+    loop p99  event loop wake-up delay, p99 over the interval
+    queue     records waiting in all writer queues
+    rss       collector resident memory
+
+Usage:
+    PYTHONPATH=. python -m loadtest.harness --duration 120 --trade-rate 500 --burst-rate 10000
+    PYTHONPATH=. python -m loadtest.harness --recording data/raw/capture.jsonl --speed 10 --out load.json
+"""
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import logging
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from collections import defaultdict
+
+from loadtest.fake_binance import FakeBinance, DEPTH_RATE, TRADE_RATE
+from loadtest.fake_polymarket import FakePolymarket, RATE as POLYMARKET_RATE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METRICS_PORT = 9118  # not the collector's default, a live collector can keep running
+SHM_PREFIX = "loadtest_pmc15m_"
+STARTUP_TIMEOUT = 30  # seconds for the metrics endpoint to come up
+STOP_TIMEOUT = 15  # seconds between SIGINT and SIGKILL
+
+
+def parse_metrics(text):
+    """{(name, ((label, value), ...)): value} from the Prometheus text format."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        series, value = line.rsplit(" ", 1)
+        name, _, labels = series.partition("{")
+        items = tuple(tuple(kv.split("=", 1)) for kv in labels.rstrip("}").split(",") if kv)
+        samples[(name, tuple((k, v.strip('"')) for k, v in items))] = float(value)
+    return samples
+
+
+def total(samples, name, **labels):
+    """Sum of every series of `name` whose labels include `labels`."""
+    return sum(v for (n, items), v in samples.items()
+               if n == name and all(dict(items).get(k) == str(v2) for k, v2 in labels.items()))
+
+
+def quantile(now, before, name, q, **labels):
+    """q-quantile (bucket upper bound) of a histogram over the samples' interval."""
+    counts = defaultdict(float)
+    for (n, items), v in now.items():
+        d = dict(items)
+        if n == f"{name}_bucket" and all(d.get(k) == str(v2) for k, v2 in labels.items()):
+            counts[d["le"]] += v - before.get((n, items), 0.0)
+    if not counts or not counts["+Inf"]:
+        return None
+    bounds = sorted((float(le), c) for le, c in counts.items())
+    for bound, c in bounds:
+        if c >= q * counts["+Inf"]:
+            return bound
+    return bounds[-1][0]
+
+
+def scrape(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+        return parse_metrics(response.read().decode())
+
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class Harness:
+    def __init__(self, binance: FakeBinance, polymarket: FakePolymarket, duration, interval, workdir,
+                 metrics_port=METRICS_PORT, logger: logging.Logger = None):
+        self.binance = binance
+        self.polymarket = polymarket
+        self.duration = duration
+        self.interval = interval
+        self.workdir = workdir
+        self.metrics_port = metrics_port
+        self.logger = logger or logging.getLogger(__name__)
+        self.rows = []
+
+    def _start_collector(self):
+        for folder in ("data", "logs"):
+            os.makedirs(os.path.join(self.workdir, folder), exist_ok=True)
+        env = dict(
+            os.environ,
+            PYTHONPATH=ROOT,
+            BINANCE_WS_URL=self.binance.url,
+            POLYMARKET_WS_URL=self.polymarket.ws_url,
+            POLYMARKET_GAMMA_URL=self.polymarket.gamma_url,
+            METRICS_PORT=str(self.metrics_port),
+            SHM_PREFIX=SHM_PREFIX,
+        )
+        self._output = open(os.path.join(self.workdir, "collector.out"), "w")
+        return subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "collector.py")], cwd=self.workdir, env=env,
+            stdout=self._output, stderr=subprocess.STDOUT
+        )
+
+    async def _wait_for_metrics(self, proc):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"collector exited with {proc.returncode}, see {self._output.name}")
+            try:
+                return await asyncio.to_thread(scrape, self.metrics_port)
+            except OSError:
+                await asyncio.sleep(0.5)
+        raise RuntimeError(f"collector metrics endpoint not up after {STARTUP_TIMEOUT}s")
+
+    def _sent(self):
+        return self.binance.stats["frames"] + self.polymarket.stats["messages"] + self.polymarket.stats["connections"]
+
+    def _row(self, elapsed, dt, now, before, pid):
+        received = (total(now, "collector_messages_total", stream="binance_combined")
+                    + total(now, "collector_messages_total", stream="polymarket"))
+        received_before = (total(before, "collector_messages_total", stream="binance_combined")
+                           + total(before, "collector_messages_total", stream="polymarket"))
+        age_count = total(now, "collector_record_age_seconds_count", stage="joined") - \
+            total(before, "collector_record_age_seconds_count", stage="joined")
+        age_sum = total(now, "collector_record_age_seconds_sum", stage="joined") - \
+            total(before, "collector_record_age_seconds_sum", stage="joined")
+        return {
+            "t": round(elapsed, 1),
+            "rate": (received - received_before) / dt,
+            "backlog": self._sent() - received,
+            "event_p99": quantile(now, before, "collector_event_latency_seconds", 0.99, stream="binance_trade"),
+            "age": age_sum / age_count if age_count else None,
+            "loop_p99": quantile(now, before, "collector_event_loop_lag_seconds", 0.99),
+            "queue": total(now, "collector_writer_queue_depth"),
+            "reconnects": total(now, "collector_reconnects_total"),
+            "rss_mb": rss_mb(pid),
+        }
+
+    def _print(self, row):
+        def ms(v):
+            return f"{v * 1000:>9.1f}" if v is not None else f"{'-':>9}"
+        rss = f"{row['rss_mb']:>7.1f}" if row["rss_mb"] is not None else f"{'-':>7}"
+        print(f"{row['t']:>6.0f} | {row['rate']:>8.0f} | {row['backlog']:>8.0f} | {ms(row['event_p99'])} | "
+              f"{ms(row['age'])} | {ms(row['loop_p99'])} | {row['queue']:>6.0f} | {row['reconnects']:>4.0f} | {rss}",
+              flush=True)
+
+    async def run(self):
+        await self.binance.start()
+        await self.polymarket.start()
+        proc = self._start_collector()
+        try:
+            before = await self._wait_for_metrics(proc)
+            print(f"{'t s':>6} | {'rate/s':>8} | {'backlog':>8} | {'event p99':>9} | {'age ms':>9} | "
+                  f"{'loop p99':>9} | {'queue':>6} | {'rc':>4} | {'rss MB':>7}")
+            start = last = time.monotonic()
+            while time.monotonic() - start < self.duration:
+                await asyncio.sleep(self.interval)
+                if proc.poll() is not None:
+                    raise RuntimeError(f"collector exited with {proc.returncode}, see {self._output.name}")
+                now = await asyncio.to_thread(scrape, self.metrics_port)
+                t = time.monotonic()
+                row = self._row(t - start, t - last, now, before, proc.pid)
+                self.rows.append(row)
+                self._print(row)
+                before, last = now, t
+        finally:
+            proc.send_signal(signal.SIGINT)
+            try:
+                await asyncio.to_thread(proc.wait, STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            self._output.close()
+            await self.binance.stop()
+            await self.polymarket.stop()
+        return self.summary()
+
+    def summary(self):
+        rows = self.rows
+        if not rows:
+            return {}
+        rss = [r["rss_mb"] for r in rows if r["rss_mb"] is not None]
+        loop = [r["loop_p99"] for r in rows if r["loop_p99"] is not None]
+        return {
+            "duration_s": rows[-1]["t"],
+            "mean_rate": sum(r["rate"] for r in rows) / len(rows),
+            "max_backlog": max(r["backlog"] for r in rows),
+            "max_loop_p99_s": max(loop) if loop else None,
+            "max_queue": max(r["queue"] for r in rows),
+            "reconnects": rows[-1]["reconnects"],
+            "rss_start_mb": rss[0] if rss else None,
+            "rss_end_mb": rss[-1] if rss else None,
+            "binance": dict(self.binance.stats),
+            "polymarket": dict(self.polymarket.stats),
+            "rows": rows,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test collector.py against local fake feeds")
+    parser.add_argument("--duration", type=float, default=120.0, help="seconds")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between reports")
+    parser.add_argument("--depth-rate", type=float, default=DEPTH_RATE, help="diffs/s per symbol")
+    parser.add_argument("--trade-rate", type=float, default=TRADE_RATE, help="trades/s")
+    parser.add_argument("--burst-rate", type=float, default=None, help="trades/s during bursts, e.g. 10000")
+    parser.add_argument("--burst-every", type=float, default=60.0)
+    parser.add_argument("--burst-seconds", type=float, default=5.0)
+    parser.add_argument("--polymarket-rate", type=float, default=POLYMARKET_RATE, help="messages/s")
+    parser.add_argument("--disconnect-every", type=float, default=None, help="seconds, drops both feeds")
+    parser.add_argument("--recording", default=None, help="capture file replayed instead of synthetic Binance data")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--binance-port", type=int, default=19443)
+    parser.add_argument("--polymarket-port", type=int, default=19444)
+    parser.add_argument("--gamma-port", type=int, default=19445)
+    parser.add_argument("--workdir", default=None, help="collector working directory, default a temp folder")
+    parser.add_argument("--out", default=None, help="write the summary and every row as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    binance = FakeBinance(
+        port=args.binance_port, depth_rate=args.depth_rate, trade_rate=args.trade_rate, burst_rate=args.burst_rate,
+        burst_every=args.burst_every, burst_seconds=args.burst_seconds, disconnect_every=args.disconnect_every,
+        recording=args.recording, speed=args.speed
+    )
+    polymarket = FakePolymarket(
+        ws_port=args.polymarket_port, http_port=args.gamma_port, rate=args.polymarket_rate,
+        disconnect_every=args.disconnect_every
+    )
+
+    with tempfile.TemporaryDirectory(prefix="loadtest_") as tmp:
+        workdir = args.workdir or tmp
+        summary = asyncio.run(Harness(binance, polymarket, args.duration, args.interval, workdir).run())
+
+    if not summary:
+        # e.g. --duration 0: the loop ends before the first scrape
+        sys.exit("no report collected, nothing to summarize")
+    print(f"mean {summary['mean_rate']:.0f} frames/s, max backlog {summary['max_backlog']:.0f}, "
+          f"max queue {summary['max_queue']:.0f}, reconnects {summary['reconnects']:.0f}, "
+          f"rss {summary['rss_start_mb']} -> {summary['rss_end_mb']} MB")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import asyncio
+import argparse
+
+from app.core.writer import JSONLWriter
+from app.core.logger import setup_logger
+from app.core.data_manager import DataManager
+from app.core.rollups import RollupStage, TIMEFRAMES
+from app.core.capture import read_capture
+from app.core.replay import ReplayClock, ReplayEngine, merge_recordings, read_jsonl_recording
+from app.polymarket.websocket_ob import WebSocketOrderBook, POLYMARKET_URL
+from app.binance.listeners.l2_listener import L2Listener, L2_MODES
+from app.binance.listeners.tape_listener import TapeListener
+from app.binance.listeners.combined_listener import CombinedStreamListener
+from app.binance.aggregators.l2_aggregator import L2Aggregator
+from app.binance.aggregators.tape_aggregator import TapeAggregator
+
+from collector import LEVELS_USED, LOGGING_FOLDER, QUOTE, BUCKET_MS, L2_MODE
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay recorded Binance/Polymarket feeds through the collector pipeline")
+    parser.add_argument("recordings", nargs="+", help="raw capture segments (.cap) or JSONL recordings, merged by receive time")
+    parser.add_argument("--out", default="data_replay", help="output folder for combined_data.jsonl")
+    parser.add_argument("--speed", type=float, default=None, help="N x real time (default: as fast as possible)")
+    parser.add_argument("--bucket-ms", type=int, default=BUCKET_MS, help="aggregation bucket width in milliseconds")
+    parser.add_argument(
+        "--assets", nargs="+", default=None,
+        help="assets of a multi-asset recording, e.g. btc eth; outputs go to <asset>_combined_data.jsonl"
+    )
+    parser.add_argument("--l2-mode", choices=L2_MODES, default=L2_MODE, help="how depth diffs become per-bucket liquidity")
+    parser.add_argument("--rollups", action="store_true", help="also write 5s / 60s / 15m bars, <prefix>rollup_<tf>.jsonl")
+    parser.add_argument(
+        "--partition", action="store_true",
+        help="route records to the candle file of their own timestamp instead of the replay clock at write time"
+    )
+    return parser.parse_args()
+
+
+def read_recording(path):
+    return read_capture(path) if path.endswith(".cap") else read_jsonl_recording(path)
+
+
+async def main():
+    args = parse_args()
+    logger = setup_logger(LOGGING_FOLDER)
+    logger.info(f"Starting replay of {args.recordings}...")
+
+    clock = ReplayClock()
+
+    # only the combined outputs are written, the listeners get no per-stream writer (writer=None)
+    partition_key = "timestamp" if args.partition else None
+
+    # single-asset recordings keep the original file names
+    assets = args.assets or [None]
+    data_managers = {}
+    l2_listeners = {}
+    tape_listeners = {}
+    writers = []
+    for asset in assets:
+        prefix = f"{asset}_" if asset else ""
+        data_manager_writer = JSONLWriter(
+            args.out, f"{prefix}combined_data.jsonl", logger=logger, clock=clock, partition_key=partition_key
+        )
+        await data_manager_writer.start()
+        writers.append(data_manager_writer)
+
+        sinks = []
+        if args.rollups:
+            rollup_writers = {
+                name: JSONLWriter(
+                    args.out, f"{prefix}rollup_{name}.jsonl", logger=logger, clock=clock, partition_key=partition_key
+                )
+                for name in TIMEFRAMES
+            }
+            for writer in rollup_writers.values():
+                await writer.start()
+                writers.append(writer)
+            sinks.append(RollupStage(rollup_writers, logger=logger))
+
+        data_managers[asset] = DataManager(data_manager_writer, bucket_ms=args.bucket_ms, sinks=sinks)
+        symbol = f"{asset}{QUOTE}"
+        l2_listeners[symbol] = L2Listener(
+            None, LEVELS_USED, None, L2Aggregator(LEVELS_USED, args.bucket_ms), data_managers[asset], logger,
+            mode=args.l2_mode
+        )
+        tape_listeners[symbol] = TapeListener(
+            None, None, TapeAggregator(args.bucket_ms), data_managers[asset], logger
+        )
+        data_managers[asset].add_closer(tape_listeners[symbol].close_until)
+
+    first = assets[0]
+    polymarket = WebSocketOrderBook(
+        "market", POLYMARKET_URL, {}, None, data_managers[first], logger, clock=clock,
+        data_managers=data_managers if args.assets else None, bucket_ms=args.bucket_ms
+    )
+
+    engine = ReplayEngine(
+        merge_recordings(*(read_recording(p) for p in args.recordings)),
+        clock,
+        # plain depth / trade streams belong to the first asset
+        l2_listener=l2_listeners[f"{first}{QUOTE}"],
+        tape_listener=tape_listeners[f"{first}{QUOTE}"],
+        polymarket=polymarket,
+        combined=CombinedStreamListener("", l2_listeners, tape_listeners, logger) if args.assets else None,
+        writers=writers,
+        data_managers=list(data_managers.values()),
+        speed=args.speed,
+        logger=logger,
+    )
+    stats = await engine.run()
+    print(
+        f"replayed {stats['events']} events ({stats['recorded_s']:.0f}s of feed) "
+        f"in {stats['elapsed_s']:.2f}s: {stats['events_per_sec']:.0f} events/s"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
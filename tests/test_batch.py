@@ -0,0 +1,76 @@
+"""Parity of the vectorized batch engine with the streaming aggregators (see benchmarks/bench_batch.py)."""
+import numpy as np
+import pytest
+
+from app.binance.aggregators.batch import l2_metrics, tape_metrics
+from app.binance.aggregators.l2_aggregator import L2Aggregator
+from app.binance.aggregators.tape_aggregator import TapeAggregator
+from app.core.time_utils import bucket_ts
+
+N_SECONDS = 2_000
+LEVELS = 10
+TOLERANCE = 1e-6
+START = 1_700_000_000
+
+
+def assert_parity(streamed, df):
+    assert len(streamed) == len(df)
+    for m, row in zip(streamed, df.itertuples(index=False)):
+        for k, v in row._asdict().items():
+            if k not in m:
+                assert np.isnan(v), f"{k} present in batch only at ts={m['ts']}"
+            else:
+                assert abs(m[k] - v) < TOLERANCE, f"{k} at ts={m['ts']}: {m[k]} vs {v}"
+
+
+@pytest.mark.parametrize("bucket_ms", [1000, 250])
+def test_tape_parity(bucket_ms):
+    rng = np.random.default_rng(7)
+    per_sec = rng.poisson(8, N_SECONDS)
+    # seconds without trades produce no bucket
+    per_sec[rng.random(N_SECONDS) < 0.05] = 0
+    sec = np.repeat(np.arange(START, START + N_SECONDS), per_sec)
+    event_ms = sec * 1000 + np.sort(rng.integers(0, 1000, len(sec)))
+    price = 95000 + np.cumsum(rng.normal(0, 1, len(sec)))
+    qty = rng.exponential(0.05, len(sec))
+    is_buyer_maker = rng.random(len(sec)) < 0.5
+
+    agg = TapeAggregator(bucket_ms=bucket_ms)
+    streamed = []
+    for t, p, q, m in zip(event_ms.tolist(), price.tolist(), qty.tolist(), is_buyer_maker.tolist()):
+        metrics = agg.update_trade(p, q, "sell" if m else "buy", bucket_ts(t, bucket_ms))
+        if metrics:
+            streamed.append(metrics)
+
+    assert_parity(streamed, tape_metrics(event_ms, price, qty, is_buyer_maker, bucket_ms=bucket_ms))
+
+
+@pytest.mark.parametrize("bucket_ms", [1000, 250])
+def test_l2_parity(bucket_ms):
+    rng = np.random.default_rng(7)
+    n = N_SECONDS * 10
+    event_ms = START * 1000 + np.arange(n) * 100
+    mid = 95000 + np.cumsum(rng.normal(0, 0.5, n))
+    offsets = 0.01 * np.arange(1, LEVELS + 1)
+    bid_px = mid[:, None] - offsets
+    ask_px = mid[:, None] + offsets
+    bid_qty = rng.uniform(0.01, 3, (n, LEVELS))
+    ask_qty = rng.uniform(0.01, 3, (n, LEVELS))
+    # thin books and empty snapshots
+    bid_px[rng.random(n) < 0.01, 5:] = np.nan
+    ask_px[rng.random(n) < 0.01, 0:] = np.nan
+    bid_qty[np.isnan(bid_px)] = np.nan
+    ask_qty[np.isnan(ask_px)] = np.nan
+
+    def levels(px, qty):
+        return [(p, q) for p, q in zip(px, qty) if not np.isnan(p)]
+
+    agg = L2Aggregator(bucket_ms=bucket_ms)
+    streamed = []
+    for i, t in enumerate(event_ms.tolist()):
+        metrics = agg.update_l2(levels(bid_px[i], bid_qty[i]), levels(ask_px[i], ask_qty[i]), bucket_ts(t, bucket_ms))
+        if metrics:
+            streamed.append(metrics)
+
+    df = l2_metrics(event_ms, bid_px, bid_qty, ask_px, ask_qty, levels_used=LEVELS, bucket_ms=bucket_ms)
+    assert_parity(streamed, df)
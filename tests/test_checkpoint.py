@@ -0,0 +1,74 @@
+"""Checkpoint restore is all or nothing per component."""
+import json
+import random
+
+import pytest
+
+from app.core.checkpoint import Checkpointer, save_checkpoint
+from app.binance.aggregators.l2_aggregator import L2Aggregator
+from app.binance.aggregators.tape_aggregator import TapeAggregator
+
+T0 = 1_700_000_000
+
+
+def warm_tape(seconds=300):
+    rng = random.Random(5)
+    tape = TapeAggregator()
+    for i in range(seconds):
+        for _ in range(5):
+            tape.update_trade(95000 + rng.gauss(0, 5), rng.random(), rng.choice(("buy", "sell")), T0 + i)
+    return tape
+
+
+def warm_l2(seconds=300):
+    rng = random.Random(6)
+    l2 = L2Aggregator()
+    for i in range(seconds):
+        bids = [(95000 - 0.01 * (k + 1), rng.random()) for k in range(10)]
+        asks = [(95000 + 0.01 * (k + 1), rng.random()) for k in range(10)]
+        l2.update_l2(bids, asks, T0 + i)
+    return l2
+
+
+@pytest.mark.parametrize("make, field", [
+    (TapeAggregator, "afi_hist"),
+    (TapeAggregator, "sell_hist"),
+    (L2Aggregator, "ask_liq_delta_hist"),
+])
+def test_rejected_state_leaves_aggregator_untouched(make, field):
+    source = warm_tape() if make is TapeAggregator else warm_l2()
+    state = source.state_dict()
+    # an older checkpoint without the last fields
+    del state[field]
+
+    target = make()
+    before = json.dumps(target.state_dict())
+    with pytest.raises(KeyError):
+        target.load_state(state)
+    assert json.dumps(target.state_dict()) == before
+
+
+def test_malformed_z_window_is_rejected():
+    state = warm_tape().state_dict()
+    state["z_hist"]["afi"]["mean"] = "n/a"
+
+    target = TapeAggregator()
+    before = json.dumps(target.state_dict())
+    with pytest.raises(ValueError):
+        target.load_state(state)
+    assert json.dumps(target.state_dict()) == before
+
+
+def test_restore_skips_only_the_rejected_component(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    tape, l2 = warm_tape(), warm_l2()
+    states = {"tape": tape.state_dict(), "l2": l2.state_dict()}
+    del states["tape"]["afi_hist"]
+    save_checkpoint(path, states, saved_at=T0)
+
+    restored_tape, restored_l2 = TapeAggregator(), L2Aggregator()
+    cold = json.dumps(restored_tape.state_dict())
+    checkpointer = Checkpointer(path, {"tape": restored_tape, "l2": restored_l2}, clock=lambda: T0 + 1)
+    assert checkpointer.restore() == ["l2"]
+    assert json.dumps(restored_tape.state_dict()) == cold
+    assert restored_l2.state_dict() == l2.state_dict()
@@ -0,0 +1,111 @@
+"""DataManager join: quiet tape periods and a soak run at reduced size (see benchmarks/soak_data_manager.py)."""
+import json
+import random
+import asyncio
+
+from app.core.data_manager import DataManager, MAX_BUFFERED
+from app.core.time_utils import CANDLE_SECONDS
+from app.binance.listeners.tape_listener import TapeListener
+from app.binance.aggregators.tape_aggregator import TapeAggregator
+
+T0 = 1_700_000_000
+SOAK_SECONDS = 50_000
+
+
+class ListWriter:
+    name = "test"
+
+    def __init__(self):
+        self.records = []
+
+    async def write(self, record):
+        self.records.append(record)
+
+
+def trade(ts, qty, buyer_maker=False):
+    return json.dumps({"e": "trade", "T": ts * 1000, "p": "95000.0", "q": str(qty), "m": buyer_maker})
+
+
+def test_quiet_tape_keeps_its_last_bucket():
+    async def run():
+        writer = ListWriter()
+        dm = DataManager(writer)
+        tape = TapeListener(None, ListWriter(), TapeAggregator(), dm)
+        dm.add_closer(tape.close_until)
+
+        # one trade, then only L2 for five seconds, then the next trade
+        await tape.handle_message(trade(T0, 5.0))
+        for ts in range(T0, T0 + 6):
+            await dm.get_l2_data({"ts": ts, "bid_liq": 1.0, "ask_liq": 1.0})
+        await tape.handle_message(trade(T0 + 5, 1.0))
+        await dm.flush()
+        return writer.records, dm.stats
+
+    records, stats = asyncio.run(run())
+    by_ts = {r["timestamp"]: r for r in records}
+    assert sorted(by_ts) == list(range(T0, T0 + 6))
+    assert by_ts[T0]["buy_vol"] == 5.0
+    assert by_ts[T0 + 5]["buy_vol"] == 1.0
+    assert stats["dropped"] == 0
+
+
+def test_soak_ordered_and_bounded():
+    async def run():
+        rng = random.Random(3)
+        writer = ListWriter()
+        dm = DataManager(writer)
+        tape_backlog = []
+        for ts in range(SOAK_SECONDS):
+            # L2 every second unless the feed stalls, tape only in seconds with trades and sometimes late
+            if rng.random() > 0.001:
+                await dm.get_l2_data({"ts": ts, "bid_liq": 1.0, "ask_liq": 1.0})
+            if rng.random() < 0.7:
+                tape_backlog.append(ts)
+            while tape_backlog and (rng.random() < 0.8 or len(tape_backlog) > 5):
+                await dm.get_tape_data({"ts": tape_backlog.pop(0), "price": 1.0, "total_vol": 1.0})
+            for _ in range(rng.randint(0, 3)):
+                dm.get_pm_data({"ts": ts + rng.randint(-2, 1), "data": {
+                    "outcome": rng.choice(("up", "down")), "best_bid": "0.5", "best_ask": "0.51"
+                }})
+            assert len(dm.data) <= MAX_BUFFERED + 1 and len(dm._pm_pending) <= MAX_BUFFERED
+        await dm.flush()
+        return writer.records, dm.stats
+
+    records, stats = asyncio.run(run())
+    timestamps = [r["timestamp"] for r in records]
+    assert timestamps == sorted(set(timestamps))
+    assert len(records) == stats["records"]
+    assert stats["records"] >= SOAK_SECONDS * 0.99
+
+
+def test_polymarket_values_do_not_outlive_their_candle():
+    async def run():
+        writer = ListWriter()
+        dm = DataManager(writer)
+        # last seconds of a candle with a quote, then the next candle's market is listed 3 s late
+        start = T0 - T0 % CANDLE_SECONDS + CANDLE_SECONDS
+        dm.get_pm_data({"ts": start - 3, "data": {"outcome": "up", "best_bid": "0.55", "best_ask": "0.56"}})
+        for ts in range(start - 3, start + 6):
+            if ts == start + 3:
+                dm.get_pm_data({"ts": ts, "data": {"outcome": "up", "best_bid": "0.40", "best_ask": "0.41"}})
+            await dm.get_l2_data({"ts": ts, "bid_liq": 1.0, "ask_liq": 1.0})
+            await dm.get_tape_data({"ts": ts, "buy_vol": 1.0})
+        await dm.flush()
+        return start, {r["timestamp"]: r.get("up_best_bid") for r in writer.records}
+
+    start, bids = asyncio.run(run())
+    assert [bids[ts] for ts in range(start - 3, start)] == ["0.55"] * 3
+    assert [bids[ts] for ts in range(start, start + 3)] == [None] * 3
+    assert [bids[ts] for ts in range(start + 3, start + 6)] == ["0.40"] * 3
+
+
+def test_per_stream_records_keep_their_ts():
+    async def run():
+        dm, stream = DataManager(ListWriter()), ListWriter()
+        tape = TapeListener(None, stream, TapeAggregator(), dm)
+        await tape.handle_message(trade(T0, 1.0))
+        await tape.handle_message(trade(T0 + 1, 1.0))
+        return stream.records
+
+    # the writer partitions per-stream outputs by "ts", the DataManager must not take it away
+    assert [r["ts"] for r in asyncio.run(run())] == [T0]
@@ -0,0 +1,38 @@
+"""RollupStage: open bars are written as partial ones when the DataManager is flushed at shutdown."""
+import asyncio
+
+from app.core.data_manager import DataManager
+from app.core.rollups import RollupStage, TIMEFRAMES
+
+T0 = 1_700_000_100  # start of a 15m candle
+
+
+class ListWriter:
+    name = "test"
+
+    def __init__(self):
+        self.records = []
+
+    async def write(self, record):
+        self.records.append(record)
+
+
+def test_flush_writes_open_bars_as_partial():
+    async def run():
+        bars = {name: ListWriter() for name in TIMEFRAMES}
+        dm = DataManager(ListWriter(), sinks=[RollupStage(bars)])
+        for ts in range(T0, T0 + 7):
+            await dm.get_l2_data({"ts": ts, "bid_liq": 1.0, "ask_liq": 1.0})
+            await dm.get_tape_data({"ts": ts, "price": 100.0 + ts - T0, "buy_vol": 1.0, "sell_vol": 0.0})
+        await dm.flush()
+        return {name: writer.records for name, writer in bars.items()}
+
+    bars = asyncio.run(run())
+    # the first 5s bar closed normally, the second one and the 60s / 15m bars are partial
+    five = bars["5s"]
+    assert [(b["timestamp"], b["seconds"], b.get("partial", False)) for b in five] == \
+        [(T0, 5, False), (T0 + 5, 2, True)]
+    assert five[1]["open"] == 105.0 and five[1]["close"] == 106.0
+    for name in ("60s", "15m"):
+        (bar,) = bars[name]
+        assert bar["partial"] and bar["timestamp"] == T0 and bar["seconds"] == 7 and bar["volume"] == 7.0